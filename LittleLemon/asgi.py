@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')
+# Persistent connections would pile up, one per request thread.
+os.environ.setdefault('LITTLELEMON_CONN_MAX_AGE', '0')
+
+# Django's handler, except that order event streams hold no thread (see handlers.py).
+from LittleLemonAPI.handlers import get_asgi_application  # noqa: E402
 
 application = get_asgi_application()
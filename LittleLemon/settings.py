@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'LittleLemonAPI.throttling.ThrottleMiddleware',
+    'LittleLemonAPI.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,12 +82,90 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# LITTLELEMON_DB picks the database profile:
+#   sqlite          (default) SQLite tuned for several concurrent workers: WAL, so
+#                   readers never wait for the writer; transactions that take the
+#                   write lock up front and wait up to 20s for it, instead of
+#                   failing with "database is locked" when a read upgrades to a
+#                   write; a larger page cache and memory-mapped reads.
+#   sqlite-default  Django's stock SQLite settings, for comparison (bench_concurrent_checkout).
+#   postgres        PostgreSQL through psycopg's connection pool (pip install
+#                   "psycopg[binary,pool]"), configured by the PG* variables.
+# LITTLELEMON_CONN_MAX_AGE keeps SQLite connections open between requests; asgi.py
+# sets it to 0 because each ASGI request runs its queries in a thread of its own.
+LITTLELEMON_DB = os.environ.get('LITTLELEMON_DB', 'sqlite')
+if LITTLELEMON_DB == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PGDATABASE', 'littlelemon'),
+            'USER': os.environ.get('PGUSER', ''),
+            'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            'HOST': os.environ.get('PGHOST', ''),
+            'PORT': os.environ.get('PGPORT', ''),
+            # The pool hands a connection to each request and takes it back at the
+            # end, so CONN_MAX_AGE must stay 0.
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('LITTLELEMON_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('LITTLELEMON_DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LITTLELEMON_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if LITTLELEMON_DB == 'sqlite':
+        DATABASES['default'].update({
+            'CONN_MAX_AGE': int(os.environ.get('LITTLELEMON_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'  # durable in WAL mode except on power loss
+                    'PRAGMA cache_size=-16000;'  # 16 MB per connection
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        })
+
+# Read replicas (LittleLemonAPI/replicas.py): GETs on the paths below read the
+# menu, cart, order and report tables from one of these aliases, except for a
+# user's reads within LITTLELEMON_REPLICA_STICKY seconds of their last write.
+# PostgreSQL: PGREPLICA_HOSTS=host1,host2 (streaming replicas of PGHOST).
+# SQLite stand-in: LITTLELEMON_SQLITE_REPLICA_PATH=replica.sqlite3, kept up to
+# date, with a lag, by `manage.py sync_replica --interval <seconds>`.
+if LITTLELEMON_DB == 'postgres':
+    for n, host in enumerate(filter(None, os.environ.get('PGREPLICA_HOSTS', '').split(',')), 1):
+        DATABASES[f'replica{n}'] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+elif os.environ.get('LITTLELEMON_SQLITE_REPLICA_PATH'):
+    LITTLELEMON_SQLITE_REPLICA_PATH = os.environ['LITTLELEMON_SQLITE_REPLICA_PATH']
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': f'file:{LITTLELEMON_SQLITE_REPLICA_PATH}?mode=ro',
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'OPTIONS': {'timeout': 20, 'init_command': 'PRAGMA cache_size=-16000;PRAGMA mmap_size=268435456;'},
+        'TEST': {'MIRROR': 'default'},
     }
-}
+LITTLELEMON_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+LITTLELEMON_REPLICA_PATHS = ['/api/menu-items/', '/api/cart/', '/api/orders/', '/api/reports/']
+LITTLELEMON_REPLICA_STICKY = 10
+DATABASE_ROUTERS = ['LittleLemonAPI.replicas.ReplicaRouter']
+
+# Write views retry this many times, with a randomized exponential backoff
+# starting at LITTLELEMON_DB_RETRY_BACKOFF seconds, when they fail on lock
+# contention or a PostgreSQL serialization failure (LittleLemonAPI/retry.py).
+LITTLELEMON_DB_RETRIES = int(os.environ.get('LITTLELEMON_DB_RETRIES', 3))
+LITTLELEMON_DB_RETRY_BACKOFF = 0.05
 
 
 # Password validation
@@ -128,14 +210,130 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+# The instrumentation middleware logs one JSON line per request at INFO; set
+# LITTLELEMON_INSTRUMENTATION_LOG_LEVEL=INFO to print them.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'LittleLemonAPI.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('LITTLELEMON_INSTRUMENTATION_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # settings.py
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # orjson when installed, byte-identical to rest_framework.renderers.JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'LittleLemonAPI.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 DJOSER = {
     'USER_ID_FIELD': 'username',
     'SEND_ACTIVATION_EMAIL': False,
 }
+
+# Menu catalog cache (LittleLemonAPI/catalog.py). LocMemCache is per process;
+# point this at Redis or Memcached when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+LITTLELEMON_CATALOG_CACHE = 'default'
+LITTLELEMON_CATALOG_LOCAL_SIZE = 512
+LITTLELEMON_CATALOG_TIMEOUT = 3600
+
+# Largest list accepted by the bulk menu writes on /api/menu-items/ and the
+# batch cart update; use `manage.py import_menu` for bigger menu imports.
+LITTLELEMON_BULK_MAX_ROWS = 1000
+
+# Delivery crew assignment (LittleLemonAPI/dispatch.py): new orders go to the
+# least loaded crew member; each process reloads its load index this often (seconds).
+LITTLELEMON_DISPATCH_AUTO_ASSIGN = True
+LITTLELEMON_DISPATCH_REFRESH = 30
+
+# Order events on /api/orders/events/ (LittleLemonAPI/events.py). LocalLayer
+# only reaches the subscribers of the publishing process; with several ASGI
+# workers use a layer on a shared bus. BUFFER events are kept for Last-Event-ID
+# resumes, a client QUEUE events behind is disconnected, and idle streams get a
+# comment every HEARTBEAT seconds. RETRY is the reconnect delay sent to clients (ms).
+LITTLELEMON_EVENTS_LAYER = 'LittleLemonAPI.events.LocalLayer'
+LITTLELEMON_EVENTS_BUFFER = 1000
+LITTLELEMON_EVENTS_QUEUE = 100
+LITTLELEMON_EVENTS_HEARTBEAT = 15
+LITTLELEMON_EVENTS_RETRY = 3000
+
+# Background jobs (LittleLemonAPI/jobs.py), run by `manage.py run_jobs`: the
+# sales rollup update of each new order. THREADS is the default pool size per
+# worker process; a claimed job is retried after LEASE seconds if its worker
+# dies. A failing job is retried after about BACKOFF * 2**(attempt - 1)
+# seconds, and moved to the dead jobs after MAX_ATTEMPTS attempts.
+LITTLELEMON_JOBS_THREADS = 4
+LITTLELEMON_JOBS_LEASE = 300
+LITTLELEMON_JOBS_BACKOFF = 2
+LITTLELEMON_JOBS_MAX_ATTEMPTS = 5
+
+# Rate limits (LittleLemonAPI/throttling.py): token buckets per user, or per
+# client IP before login, and per rule scope. The first rule matching the path
+# prefix and method that has a rate for the caller's role (manager, crew,
+# customer, anon) applies; each process remembers roles for ROLE_TTL seconds.
+# Buckets are kept in each process; LITTLELEMON_THROTTLE_BACKEND=cache shares
+# them through LITTLELEMON_THROTTLE_CACHE across workers. LITTLELEMON_THROTTLE=0
+# turns limits off. Behind a proxy set REST_FRAMEWORK['NUM_PROXIES'] so clients
+# are told apart by their own address.
+LITTLELEMON_THROTTLE = os.environ.get('LITTLELEMON_THROTTLE', '1') == '1'
+LITTLELEMON_THROTTLE_BACKEND = os.environ.get('LITTLELEMON_THROTTLE_BACKEND', 'local')
+LITTLELEMON_THROTTLE_CACHE = 'default'
+LITTLELEMON_THROTTLE_LOCAL_SIZE = 10000
+LITTLELEMON_THROTTLE_ROLE_TTL = 30
+LITTLELEMON_THROTTLE_RULES = [
+    # (scope, path prefix, methods, {role: rate})
+    ('login', '/auth/token/login/', 'POST', {'anon': '10/min'}),
+    ('auth', '/auth/', '*', {'anon': '60/min', 'customer': '120/min', 'crew': '120/min', 'manager': '120/min'}),
+    ('checkout', '/api/orders/', 'POST', {'customer': '10/min', 'crew': '10/min', 'manager': '60/min'}),
+    ('api-write', '/api/', 'POST PUT PATCH DELETE', {'anon': '30/min', 'customer': '120/min', 'crew': '240/min', 'manager': '600/min'}),
+    ('api', '/api/', '*', {'anon': '60/min', 'customer': '600/min', 'crew': '1200/min', 'manager': '3000/min'}),
+]
+
+# Stored Idempotency-Key responses are replayed for this long (seconds).
+# Run `manage.py clear_idempotency_keys` periodically to delete expired ones.
+LITTLELEMON_IDEMPOTENCY_TTL = 24 * 60 * 60
+# Seconds after which a key whose request never stored a response (its worker
+# died) is handed to the next retry. Keep it above the slowest POST.
+LITTLELEMON_IDEMPOTENCY_PROCESSING_TIMEOUT = 60
+
+# Seconds a user's group names stay cached between requests; 0 disables it.
+# Group membership changes invalidate the entry immediately.
+LITTLELEMON_ROLES_CACHE_TIMEOUT = 300
+
+# Token authentication cache (LittleLemonAPI/authentication.py).
+LITTLELEMON_TOKEN_CACHE_TIMEOUT = 300
+LITTLELEMON_TOKEN_CACHE_LOCAL_SIZE = 1024
+LITTLELEMON_TOKEN_CACHE_LOCAL_TTL = 30
+
+# Per-request query/DB/serialization timings (Server-Timing header, structured
+# logs on the LittleLemonAPI.instrumentation logger and /api/metrics/).
+# Set LITTLELEMON_INSTRUMENTATION=0 to remove the middleware entirely.
+LITTLELEMON_INSTRUMENTATION = os.environ.get('LITTLELEMON_INSTRUMENTATION', '1') == '1'
+
+# Serve the menu, cart and order GETs with the async views in
+# LittleLemonAPI/async_views.py, under ASGI only: under WSGI every async view
+# would need its own event loop. Off by default; on SQLite, bench_asgi measured
+# ASGI at about a third of WSGI's throughput, async views or not (see README).
+LITTLELEMON_ASYNC_VIEWS = os.environ.get('LITTLELEMON_ASYNC_VIEWS', '0') == '1'
@@ -1,10 +1,12 @@
 # LittleLemonAPI/admin.py
 from django.contrib import admin
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, Job, DeadJob
 
 # Register all models without customization
 admin.site.register(Category)
 admin.site.register(MenuItem)
 admin.site.register(Cart)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(Job)
+admin.site.register(DeadJob)
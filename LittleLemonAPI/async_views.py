@@ -0,0 +1,268 @@
+# LittleLemonAPI/async_views.py
+# Native async versions of the read-heavy GET endpoints, routed instead of
+# their views.py counterparts when LITTLELEMON_ASYNC_VIEWS is on (see urls.py).
+# Their queries, cache keys and validators come from reads.py, as the DRF
+# views' do, so they return the same bodies, status codes and validators.
+# Other methods, and browsable API (text/html) requests, are handed to the
+# sync DRF view.
+#
+# order_events streams order changes as Server-Sent Events (events.py). It is
+# routed whatever LITTLELEMON_ASYNC_VIEWS says but only streams under ASGI,
+# with the handler of handlers.py so that an open stream holds no thread.
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from . import catalog, events, fieldsets, instrumentation, reads, search, views
+from .authentication import aauthenticate
+from .conditional import not_modified, set_validators
+from .models import Order
+from .permissions import aget_roles, is_delivery_crew, is_manager
+from .renderers import FastJSONRenderer
+from .serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+
+
+def _render(data, status=200):
+    response = HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _handle_exception(exc, request):
+    # DRF's own exception -> response mapping, as APIView.handle_exception does.
+    response = exception_handler(exc, {'request': request, 'view': None})
+    if response is None:
+        raise exc
+    rendered = _render(response.data, response.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        rendered['WWW-Authenticate'] = TokenAuthentication.keyword
+    return rendered
+
+
+async def _authenticated(request, handler, *args, **kwargs):
+    # IsAuthenticated, then `handler` with a DRF Request.
+    drf_request = Request(request)
+    try:
+        user = await aauthenticate(request)
+        if user is None:
+            raise exceptions.NotAuthenticated()
+        drf_request.user = user
+        return await handler(drf_request, *args, **kwargs)
+    except (exceptions.APIException, Http404) as exc:
+        return _handle_exception(exc, drf_request)
+
+
+def read_view(sync_view):
+    """
+    Make an async GET handler a view of its own: the request is authenticated
+    (IsAuthenticated) and wrapped in a DRF Request for the handler, and anything
+    the handler does not serve goes to `sync_view` in a worker thread.
+    """
+    fallback = sync_to_async(sync_view)
+
+    def decorator(handler):
+        @csrf_exempt
+        @functools.wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET' or 'text/html' in request.headers.get('Accept', ''):
+                return await fallback(request, *args, **kwargs)
+            return await _authenticated(request, handler, *args, **kwargs)
+        return view
+    return decorator
+
+
+@read_view(views.menu_items)
+async def menu_items(request):
+    async def build():
+        paginator, rows, data = reads.menu_list(request)
+        page = await paginator.apaginate_queryset(rows, request)
+        with instrumentation.serializing(request):
+            return paginator.get_paginated_response(data(page)).data
+    url = request.build_absolute_uri()
+    etag = await catalog.aetag('list', url)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return set_validators(_render(await catalog.amenu_list(url, build)), etag)
+
+
+@read_view(views.single_menu_item)
+async def single_menu_item(request, menuItem):
+    selection = fieldsets.from_params(request.query_params, MenuItemSerializer)
+    key, queryset = reads.menu_item(menuItem, selection)
+    async def build():
+        item = await queryset.afirst()
+        if item is None:
+            return None
+        with instrumentation.serializing(request):
+            return MenuItemSerializer(item, context={'request': request, 'selection': selection}).data
+    etag = await catalog.aetag('item', key)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    data = await catalog.amenu_item(key, build)
+    if data is None:
+        raise Http404
+    return set_validators(_render(data), etag)
+
+
+@read_view(views.menu_item_search)
+async def menu_item_search(request):
+    try:
+        query, limit, selection, key = reads.search_params(request)
+    except ValueError:
+        return _render({'error': 'limit must be an integer'}, 400)
+    async def build():
+        ids = await sync_to_async(search.search)(query, limit)
+        rows, data = reads.search_rows(ids, selection)
+        rows = [row async for row in rows]
+        with instrumentation.serializing(request):
+            return reads.search_results(query, ids, rows, data)
+    etag = await catalog.aetag('search', key)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return set_validators(_render(await catalog.amenu_search(key, build)), etag)
+
+
+@read_view(views.cart_items)
+async def cart_items(request):
+    cart = reads.cart(request)
+    selection = fieldsets.from_params(request.query_params, CartSerializer)
+    summary = await cart.aaggregate(**reads.CART_SUMMARY)
+    etag = reads.cart_tag(request, summary, await catalog.aget_version(), selection)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    rows = [row async for row in cart.for_serializer(selection)]
+    serializer = CartSerializer(rows, many=True, context={'request': request, 'selection': selection})
+    with instrumentation.serializing(request):
+        data = serializer.data
+    return set_validators(_render(data), etag)
+
+
+@read_view(views.orders)
+async def orders(request):
+    await aget_roles(request)
+    paginator, rows, data = reads.order_list(request)
+    page = await paginator.apaginate_queryset(rows, request)
+    with instrumentation.serializing(request):
+        body = paginator.get_paginated_response(await data.acall(page)).data
+    return _render(body)
+
+
+@read_view(views.single_order)
+async def single_order(request, orderId):
+    header = await reads.order_header(orderId).afirst()
+    if header is None:
+        raise Http404
+    await aget_roles(request)
+    if not reads.can_read_order(request, header):
+        return _render({'error': 'Unauthorized'}, 403)
+    selection = fieldsets.from_params(request.query_params, OrderSerializer)
+    etag = reads.order_tag(orderId, header, await catalog.aget_version(), selection)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    order = await Order.objects.for_serializer(selection).filter(id=orderId).afirst()
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    serializer = OrderSerializer(order, context={'request': request, 'selection': selection})
+    with instrumentation.serializing(request):
+        data = serializer.data
+    return set_validators(_render(data), etag)
+
+
+async def _stream(keys, matches, last_event_id):
+    subscriber, backlog = events.hub.subscribe(keys, matches, last_event_id)
+    heartbeat = getattr(settings, 'LITTLELEMON_EVENTS_HEARTBEAT', 15)
+    try:
+        yield f'retry: {getattr(settings, "LITTLELEMON_EVENTS_RETRY", 3000)}\n\n'
+        if backlog is None:
+            # Events were missed for good: the client reloads its orders.
+            yield 'event: reset\ndata: {}\n\n'
+        else:
+            for event in backlog:
+                yield events.format_event(event)
+        while not subscriber.overflowed:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection and finds dead clients.
+                yield ': keepalive\n\n'
+                continue
+            yield events.format_event(event)
+        # Fell behind: close, and the client resumes from its Last-Event-ID.
+    finally:
+        events.hub.unsubscribe(subscriber)
+
+
+def _subscription(request):
+    """
+    Authenticate `request` (a DRF Request) and work out what its stream
+    subscribes to: (keys, matches, None), or (None, None, response) to send
+    instead. Runs in a worker thread of its own, see order_events.
+    """
+    try:
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        user_id = request.user.id
+        if is_manager(request):
+            keys = {events.MANAGERS}
+        else:
+            keys = {('user', user_id)}
+            if is_delivery_crew(request):
+                keys.add(('crew', user_id))
+        order_id = request.query_params.get('order')
+        if order_id is None:
+            return keys, None, None
+        if not order_id.isdigit():
+            return None, None, _render({'error': 'order must be an integer'}, 400)
+        order = Order.objects.filter(id=order_id).values('user_id', 'delivery_crew_id').first()
+        if order is None:
+            raise Http404
+        if user_id not in (order['user_id'], order['delivery_crew_id']) and not is_manager(request):
+            return None, None, _render({'error': 'Unauthorized'}, 403)
+        order_id = int(order_id)
+        return keys, lambda payload: payload['id'] == order_id, None
+    finally:
+        # The thread goes back to a shared pool: it keeps no connection.
+        connections.close_all()
+
+
+@csrf_exempt
+async def order_events(request):
+    """
+    GET orders/events: the changes to the orders the user can see, as
+    Server-Sent Events. ?order=<id> narrows the stream to one order.
+    """
+    if request.method != 'GET':
+        return _render({'detail': f'Method "{request.method}" not allowed.'}, 405)
+    if not isinstance(request, ASGIRequest):
+        return _render({'error': 'Order events need the ASGI server (asgi.py)'}, 501)
+    # Thread-sensitive sync code (the async ORM included) would start a worker
+    # thread that the request keeps until its response ends, hours for a
+    # stream. The checks run in the shared pool instead.
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        keys, matches, response = await sync_to_async(_subscription, thread_sensitive=False)(drf_request)
+    except (exceptions.APIException, Http404) as exc:
+        return _handle_exception(exc, drf_request)
+    if response is not None:
+        return response
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(_stream(keys, matches, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold the events back
+    return response
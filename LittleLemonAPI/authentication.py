@@ -0,0 +1,108 @@
+# LittleLemonAPI/authentication.py
+import copy
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .lru import LRUCache
+
+_local = LRUCache(
+    maxsize=getattr(settings, 'LITTLELEMON_TOKEN_CACHE_LOCAL_SIZE', 1024),
+    ttl=getattr(settings, 'LITTLELEMON_TOKEN_CACHE_LOCAL_TTL', 30),
+)
+
+
+def _cache_key(key):
+    # Never use the raw token as a cache key.
+    return 'littlelemon:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    cache_key = _cache_key(key)
+    _local.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def token_cache_stats():
+    return _local.stats()
+
+
+def _timeout():
+    return getattr(settings, 'LITTLELEMON_TOKEN_CACHE_TIMEOUT', 300)
+
+
+def _checked(cached):
+    user, token = cached
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    # The cached pair is shared by every request and thread of the process;
+    # each request gets its own copies to set attributes on.
+    user = copy.copy(user)
+    token = copy.copy(token)
+    token.user = user
+    return user, token
+
+
+def _token_key(request):
+    # Same header parsing as TokenAuthentication.authenticate.
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != TokenAuthentication.keyword.lower().encode():
+        return None
+    if len(auth) == 1:
+        raise exceptions.AuthenticationFailed('Invalid token header. No credentials provided.')
+    if len(auth) > 2:
+        raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain spaces.')
+    try:
+        return auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of the configured authentication classes for the async
+    views: a token through the same caches as CachedTokenAuthentication, else
+    the session user. Returns the user or None; raises AuthenticationFailed.
+    """
+    key = _token_key(request)
+    if key is None:
+        user = await request.auser()
+        return user if user.is_authenticated else None
+    cache_key = _cache_key(key)
+    cached = _local.get(cache_key)
+    if cached is None:
+        cached = await cache.aget(cache_key)
+        if cached is None:
+            try:
+                token = await Token.objects.select_related('user').aget(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            cached = (token.user, token)
+            await cache.aset(cache_key, cached, _timeout())
+        _local.set(cache_key, cached)
+    return _checked(cached)[0]
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that keeps token -> (user, token)
+    in a per-process TTL LRU and the shared Django cache, so the token/user join
+    runs once per token instead of once per request. Deleting a token (djoser's
+    logout) or saving its user (e.g. deactivation) drops the entry, see signals.py.
+    Other processes may keep a stale entry for up to LITTLELEMON_TOKEN_CACHE_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        cached = _local.get(cache_key)
+        if cached is None:
+            cached = cache.get(cache_key)
+            if cached is None:
+                cached = super().authenticate_credentials(key)
+                cache.set(cache_key, cached, _timeout())
+            _local.set(cache_key, cached)
+        return _checked(cached)
@@ -0,0 +1,206 @@
+# LittleLemonAPI/bulk.py
+# Batch writes: menu items for the list payloads of the menu_items view and
+# `manage.py import_menu`, cart lines for PATCH on the cart_items view.
+#
+# A batch is checked as a whole: every row against MenuItemBulkSerializer,
+# then the categories of all rows with one query. If any row is invalid
+# nothing is written and BulkError lists the problems by row index. Valid
+# batches are written in one transaction with bulk_create / bulk_update and
+# bump the catalog version once (see catalog.batch). The search index follows
+# through its triggers.
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import catalog
+from .models import Cart, Category, MenuItem
+from .serializers import CartLineSerializer, MenuItemBulkSerializer
+
+BATCH_SIZE = 1000
+# Largest value of the 6 digit, 2 decimal Cart.price column.
+MAX_LINE_PRICE = Decimal('9999.99')
+
+
+class BulkError(Exception):
+    def __init__(self, errors):
+        merged = {}
+        for error in errors:
+            merged.setdefault(error['index'], {}).update(error['errors'])
+        super().__init__(f'{len(merged)} invalid rows')
+        # [{'index': <row index>, 'errors': {<field>: [<message>, ...]}}, ...]
+        self.errors = [{'index': index, 'errors': fields} for index, fields in sorted(merged.items())]
+
+
+def _row_error(index, field, message):
+    return {'index': index, 'errors': {field: [message]}}
+
+
+def _resolve_slugs(rows, errors):
+    # Rows may name their category by slug ('category') instead of id.
+    slugs = {
+        row['category'] for row in rows
+        if isinstance(row, dict) and 'category_id' not in row and isinstance(row.get('category'), str)
+    }
+    if not slugs:
+        return rows
+    ids = {}
+    for slug, pk in Category.objects.filter(slug__in=slugs).values_list('slug', 'id'):
+        ids[slug] = None if slug in ids else pk  # None: the slug is ambiguous
+    resolved = []
+    for index, row in enumerate(rows):
+        slug = row.get('category') if isinstance(row, dict) and 'category_id' not in row else None
+        if isinstance(slug, str):
+            if ids.get(slug) is None:
+                problem = 'matches several categories' if slug in ids else 'does not exist'
+                errors.append(_row_error(index, 'category', f'Category slug "{slug}" {problem}.'))
+                row = None
+            else:
+                row = dict(row, category_id=ids[slug])
+        resolved.append(row)
+    return resolved
+
+
+def validate(rows, partial=False):
+    """
+    Validated data for every row of `rows` (a list of dicts), in order.
+    Raises BulkError.
+    """
+    errors = []
+    rows = _resolve_slugs(rows, errors)
+    child = MenuItemBulkSerializer(partial=partial)
+    validated = []
+    for index, row in enumerate(rows):
+        if row is None:
+            validated.append(None)
+            continue
+        try:
+            validated.append(child.run_validation(row))
+        except serializers.ValidationError as exc:
+            validated.append(None)
+            errors.append({'index': index, 'errors': exc.detail})
+    category_ids = {data['category_id'] for data in validated if data and 'category_id' in data}
+    known = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+    for index, data in enumerate(validated):
+        if data and 'category_id' in data and data['category_id'] not in known:
+            errors.append(_row_error(index, 'category_id', f'Invalid pk "{data["category_id"]}" - object does not exist.'))
+    if errors:
+        raise BulkError(errors)
+    return validated
+
+
+def _ids(rows):
+    # For PATCH rows ({'id': ..., <fields>}) and DELETE payloads (plain ids).
+    errors, ids, seen = [], [], set()
+    for index, pk in enumerate(rows):
+        if isinstance(pk, bool) or not isinstance(pk, int):
+            errors.append(_row_error(index, 'id', 'A valid integer is required.'))
+        elif pk in seen:
+            errors.append(_row_error(index, 'id', 'Duplicate id.'))
+        seen.add(pk)
+        ids.append(pk)
+    return ids, errors
+
+
+def create_items(rows, batch_size=BATCH_SIZE):
+    """Insert every row; returns the new MenuItems with their ids."""
+    validated = validate(rows)
+    with transaction.atomic(), catalog.batch():
+        return MenuItem.objects.bulk_create([MenuItem(**data) for data in validated], batch_size=batch_size)
+
+
+def update_items(rows, batch_size=BATCH_SIZE):
+    """
+    Partial update: each row is {'id': <menu item id>, <fields to change>}.
+    Returns the updated MenuItems.
+    """
+    ids, errors = _ids([row.get('id') if isinstance(row, dict) else None for row in rows])
+    changes = [
+        {name: value for name, value in row.items() if name != 'id'} if isinstance(row, dict) else row
+        for row in rows
+    ]
+    try:
+        validated = validate(changes, partial=True)
+    except BulkError as exc:
+        raise BulkError(errors + exc.errors)
+    if errors:
+        raise BulkError(errors)
+    with transaction.atomic(), catalog.batch():
+        items = MenuItem.objects.select_for_update().in_bulk(ids)
+        missing = [_row_error(index, 'id', 'Not found.') for index, pk in enumerate(ids) if pk not in items]
+        if missing:
+            raise BulkError(missing)
+        # bulk_update() skips auto_now, so updated_at is set here.
+        updated_at = timezone.now()
+        fields = {'updated_at'}
+        for pk, data in zip(ids, validated):
+            item = items[pk]
+            for name, value in data.items():
+                setattr(item, name, value)
+            item.updated_at = updated_at
+            fields.update(data)
+        updated = [items[pk] for pk in ids]
+        MenuItem.objects.bulk_update(updated, sorted(fields), batch_size=batch_size)
+    return updated
+
+
+def delete_items(ids):
+    """Delete the menu items with these ids, with their cart and order lines. Returns the count."""
+    ids, errors = _ids(ids)
+    if errors:
+        raise BulkError(errors)
+    with transaction.atomic(), catalog.batch():
+        found = set(MenuItem.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = [_row_error(index, 'id', 'Not found.') for index, pk in enumerate(ids) if pk not in found]
+        if missing:
+            raise BulkError(missing)
+        _, deleted = MenuItem.objects.filter(id__in=ids).delete()
+    return deleted.get(MenuItem._meta.label, 0)
+
+
+def update_cart(user, rows):
+    """
+    Set the quantity of each {'menuitem_id', 'quantity'} row in the user's cart,
+    adding the items that are not in it yet and removing those set to 0, in
+    one transaction: one price lookup for the whole batch, one upsert (a
+    bulk_create that updates on the (user, menuitem) unique constraint) and
+    one delete. Returns the new cart total. Raises BulkError.
+    """
+    child = CartLineSerializer()
+    lines, errors, seen = {}, [], set()
+    for index, row in enumerate(rows):
+        try:
+            data = child.run_validation(row)
+        except serializers.ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+            continue
+        if data['menuitem_id'] in seen:
+            errors.append(_row_error(index, 'menuitem_id', 'Duplicate menuitem_id.'))
+        seen.add(data['menuitem_id'])
+        lines[index] = data
+    prices = dict(MenuItem.objects.filter(id__in=seen).values_list('id', 'price'))
+    for index, data in lines.items():
+        price = prices.get(data['menuitem_id'])
+        if price is None:
+            errors.append(_row_error(index, 'menuitem_id', f'Invalid pk "{data["menuitem_id"]}" - object does not exist.'))
+        elif price * data['quantity'] > MAX_LINE_PRICE:
+            errors.append(_row_error(index, 'quantity', f'The line price may not exceed {MAX_LINE_PRICE}.'))
+    if errors:
+        raise BulkError(errors)
+    upserts = [
+        Cart(user=user, menuitem_id=data['menuitem_id'], quantity=data['quantity'],
+             unit_price=prices[data['menuitem_id']], price=prices[data['menuitem_id']] * data['quantity'])
+        for data in lines.values() if data['quantity']
+    ]
+    removed = [data['menuitem_id'] for data in lines.values() if not data['quantity']]
+    with transaction.atomic():
+        if upserts:
+            Cart.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['user', 'menuitem'],
+                update_fields=['quantity', 'unit_price', 'price', 'updated_at'],
+            )
+        if removed:
+            Cart.objects.filter(user=user, menuitem_id__in=removed).delete()
+        return Cart.objects.filter(user=user).aggregate(total=Sum('price'))['total'] or Decimal('0.00')
@@ -0,0 +1,195 @@
+# LittleLemonAPI/catalog.py
+# Cache of pre-serialized menu payloads.
+#
+# Entries live in a per-process LRU in front of a shared Django cache. Every key
+# embeds the global catalog version kept in the shared cache; saving or deleting
+# a MenuItem or Category bumps that version (see signals.py), so every worker
+# stops serving the old payloads at the same time without having to find them.
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .lru import LRUCache
+from .replicas import primary
+
+VERSION_KEY = 'littlelemon:catalog:version'
+KEY_PREFIX = 'littlelemon:catalog:'
+
+_local = LRUCache(maxsize=getattr(settings, 'LITTLELEMON_CATALOG_LOCAL_SIZE', 512))
+_shared_hits = 0
+_batched = ContextVar('littlelemon_catalog_batched', default=False)
+
+
+def _shared():
+    return caches[getattr(settings, 'LITTLELEMON_CATALOG_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'LITTLELEMON_CATALOG_TIMEOUT', 3600)
+
+
+def get_version():
+    shared = _shared()
+    version = shared.get(VERSION_KEY)
+    if version is None:
+        # Start from a timestamp rather than 1 so that a flushed shared cache
+        # never brings back a version number that old local entries still use.
+        shared.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = shared.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    shared = _shared()
+    version = await shared.aget(VERSION_KEY)
+    if version is None:
+        await shared.aadd(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await shared.aget(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    shared = _shared()
+    try:
+        return shared.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+        return shared.incr(VERSION_KEY)
+
+
+def bump_on_commit():
+    # After commit, so no worker can re-cache the pre-write rows under the new version.
+    if not _batched.get():
+        transaction.on_commit(bump_version)
+
+
+@contextmanager
+def batch():
+    """
+    Bump the version once for all the catalog writes made in the block, instead
+    of once per saved or deleted row. Use inside the writing transaction.
+    """
+    if _batched.get():
+        yield
+        return
+    token = _batched.set(True)
+    try:
+        yield
+    finally:
+        _batched.reset(token)
+    transaction.on_commit(bump_version)
+
+
+def _cache_key(kind, key, version):
+    digest = hashlib.md5(str(key).encode()).hexdigest()
+    return f'{KEY_PREFIX}{kind}:{digest}:v{version}'
+
+
+def get_or_build(kind, key, builder):
+    """
+    Return the cached payload for (kind, key) at the current catalog version,
+    calling builder() on a miss. A builder result of None is not cached.
+    """
+    global _shared_hits
+    cache_key = _cache_key(kind, key, get_version())
+    payload = _local.get(cache_key)
+    if payload is not None:
+        return payload
+    shared = _shared()
+    payload = shared.get(cache_key)
+    if payload is not None:
+        _shared_hits += 1
+    else:
+        # From the primary: a lagging replica could still have the rows this
+        # version replaced.
+        with primary():
+            payload = builder()
+        if payload is None:
+            return None
+        shared.set(cache_key, payload, _timeout())
+    _local.set(cache_key, payload)
+    return payload
+
+
+async def aget_or_build(kind, key, builder):
+    """get_or_build() for async views; `builder` is a coroutine function."""
+    global _shared_hits
+    cache_key = _cache_key(kind, key, await aget_version())
+    payload = _local.get(cache_key)
+    if payload is not None:
+        return payload
+    shared = _shared()
+    payload = await shared.aget(cache_key)
+    if payload is not None:
+        _shared_hits += 1
+    else:
+        with primary():
+            payload = await builder()
+        if payload is None:
+            return None
+        await shared.aset(cache_key, payload, _timeout())
+    _local.set(cache_key, payload)
+    return payload
+
+
+def _etag(kind, key, version):
+    digest = hashlib.md5(str(key).encode()).hexdigest()
+    return f'catalog-{kind}-{digest}-v{version}'
+
+
+def etag(kind, key):
+    # Changes whenever the catalog version does; cheap enough to check before building.
+    return _etag(kind, key, get_version())
+
+
+async def aetag(kind, key):
+    return _etag(kind, key, await aget_version())
+
+
+def menu_list(url, builder):
+    # Keyed by the full URL so every filter/ordering/cursor combination,
+    # including per-category pages, is cached on its own.
+    return get_or_build('list', url, builder)
+
+
+def menu_item(item_id, builder):
+    return get_or_build('item', item_id, builder)
+
+
+def menu_search(key, builder):
+    # Type-ahead sends the same short prefixes over and over.
+    return get_or_build('search', key, builder)
+
+
+async def amenu_list(url, builder):
+    return await aget_or_build('list', url, builder)
+
+
+async def amenu_item(item_id, builder):
+    return await aget_or_build('item', item_id, builder)
+
+
+async def amenu_search(key, builder):
+    return await aget_or_build('search', key, builder)
+
+
+def stats():
+    local = _local.stats()
+    return {
+        'version': get_version(),
+        'local_hits': local['hits'],
+        'shared_hits': _shared_hits,
+        'misses': local['misses'] - _shared_hits,
+        'evictions': local['evictions'],
+        'size': local['size'],
+        'maxsize': local['maxsize'],
+    }
+
+
+def clear_local():
+    _local.clear()
@@ -0,0 +1,27 @@
+# LittleLemonAPI/conditional.py
+# Conditional GET helpers. Validators are computed from a catalog version or an
+# updated_at timestamp *before* the full query and serialization run, so an
+# unchanged resource costs at most one small query and returns 304.
+#
+# Only ETags are sent. These responses are built from several rows (a cart, an
+# order with its menu items), and no single timestamp moves when one of them
+# is deleted or the catalog changes, so Last-Modified would yield stale 304s.
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the client's cached copy is still current, otherwise None."""
+    return get_conditional_response(request, etag=quote_etag(etag))
+
+
+def set_validators(response, etag):
+    response['ETag'] = quote_etag(etag)
+    return response
+
+
+def timestamp_tag(*parts):
+    return '-'.join(
+        str(part.timestamp()) if hasattr(part, 'timestamp') else str(part)
+        for part in parts
+    )
@@ -0,0 +1,220 @@
+# LittleLemonAPI/dispatch.py
+# Delivery crew assignment.
+#
+# Every process keeps a load index of the Delivery crew group: a min-heap of
+# (open orders, crew id). Stale heap entries are skipped when they reach the
+# top, so picking the least loaded member and recording a new load are both
+# O(log n). New orders are assigned at checkout (services.place_order).
+#
+# The index is only a hint across workers. The chosen member's row is locked
+# and their open orders recounted inside the checkout transaction; if another
+# worker got there first, the member goes back with the real count and the
+# next one is tried. The index is reloaded every LITTLELEMON_DISPATCH_REFRESH
+# seconds and when group membership changes in this process.
+# `manage.py rebalance_crew` evens out the open orders of the whole crew.
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import events
+from .models import Order
+from .permissions import DELIVERY_CREW
+
+# Candidates tried before taking the current one whatever its real load.
+MAX_ATTEMPTS = 5
+
+
+class LoadIndex:
+    def __init__(self):
+        self._heap = []
+        self._loads = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self, loads):
+        with self._lock:
+            self._loads = dict(loads)
+            self._heap = [(load, crew_id) for crew_id, load in self._loads.items()]
+            heapq.heapify(self._heap)
+            self._loaded_at = time.monotonic()
+
+    def stale(self, max_age):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > max_age
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def least_loaded(self):
+        """(crew id, open orders) of the least loaded member, or None."""
+        with self._lock:
+            heap = self._heap
+            while heap and self._loads.get(heap[0][1]) != heap[0][0]:
+                heapq.heappop(heap)
+            return (heap[0][1], heap[0][0]) if heap else None
+
+    def set(self, crew_id, load):
+        with self._lock:
+            self._loads[crew_id] = load
+            heapq.heappush(self._heap, (load, crew_id))
+            # Drop the skipped entries before they outnumber the live ones.
+            if len(self._heap) > 2 * len(self._loads) + 64:
+                self._heap = [(load, crew_id) for crew_id, load in self._loads.items()]
+                heapq.heapify(self._heap)
+
+    def add(self, crew_id, delta):
+        with self._lock:
+            load = self._loads.get(crew_id)
+        if load is not None:
+            self.set(crew_id, max(load + delta, 0))
+
+    def remove(self, crew_id):
+        with self._lock:
+            self._loads.pop(crew_id, None)
+
+    def loads(self):
+        with self._lock:
+            return dict(self._loads)
+
+
+index = LoadIndex()
+
+
+def _crew():
+    return User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+
+
+def _open_orders():
+    return Order.objects.filter(status=False)
+
+
+def current_loads():
+    """Open orders per active crew member, from the database."""
+    loads = dict.fromkeys(_crew().values_list('id', flat=True), 0)
+    counts = (
+        _open_orders().filter(delivery_crew__isnull=False)
+        .values('delivery_crew_id').annotate(open=Count('id')).values_list('delivery_crew_id', 'open')
+    )
+    for crew_id, count in counts:
+        if crew_id in loads:
+            loads[crew_id] = count
+    return loads
+
+
+def refresh(force=False):
+    if force or index.stale(getattr(settings, 'LITTLELEMON_DISPATCH_REFRESH', 30)):
+        index.load(current_loads())
+
+
+def pick():
+    """
+    Lock and return the id of the least loaded active crew member, or None if
+    there is no crew. Call inside the transaction that assigns the order.
+    """
+    refresh()
+    for attempt in range(MAX_ATTEMPTS):
+        candidate = index.least_loaded()
+        if candidate is None:
+            return None
+        crew_id, load = candidate
+        # Serializes assignments to this member across workers (a no-op on
+        # SQLite, where writers are serialized anyway).
+        if not _crew().select_for_update(of=('self',)).filter(id=crew_id).exists():
+            index.remove(crew_id)
+            continue
+        actual = _open_orders().filter(delivery_crew_id=crew_id).count()
+        if actual == load or attempt == MAX_ATTEMPTS - 1:
+            index.set(crew_id, actual + 1)
+            return crew_id
+        index.set(crew_id, actual)
+    return None
+
+
+def record_change(order):
+    """
+    Follow an order's (status, delivery_crew) change in the local index.
+    Applied at once rather than on commit: after a rollback a member looks
+    less loaded than they are, which pick() corrects with its recount, whereas
+    an overestimate would keep them from being picked until the next refresh.
+    """
+    loaded = getattr(order, '_loaded', None)
+    if not loaded:
+        return
+    before = loaded.get('delivery_crew_id') if not loaded.get('status') else None
+    after = order.delivery_crew_id if not order.status else None
+    if before != after:
+        if before:
+            index.add(before, -1)
+        if after:
+            index.add(after, 1)
+
+
+def rebalance(max_moves=None, dry_run=False):
+    """
+    Assign the open orders that have no active crew member and move open
+    orders, most recent first, from the most to the least loaded members until
+    their loads differ by at most one. Returns [(order id, from, to), ...].
+    """
+    with transaction.atomic():
+        crew = list(_crew().select_for_update(of=('self',)).order_by('id').values_list('id', flat=True))
+        if not crew:
+            return []
+        assigned = {crew_id: [] for crew_id in crew}
+        orphans = []
+        for order_id, crew_id in _open_orders().order_by('date', 'id').values_list('id', 'delivery_crew_id'):
+            (assigned[crew_id] if crew_id in assigned else orphans).append((order_id, crew_id))
+        lightest = [(len(orders), crew_id) for crew_id, orders in assigned.items()]
+        heaviest = [(-load, crew_id) for load, crew_id in lightest]
+        heapq.heapify(lightest)
+        heapq.heapify(heaviest)
+
+        def load(crew_id):
+            return len(assigned[crew_id])
+
+        def pop(heap, sign):
+            # Skip entries whose load has changed since they were pushed.
+            while sign * heap[0][0] != load(heap[0][1]):
+                heapq.heappop(heap)
+            return heap[0][1]
+
+        moves = {}  # order id -> (crew id before, crew id after)
+
+        def move(order, target):
+            order_id, before = order
+            assigned[target].append(order)
+            moves[order_id] = (moves.get(order_id, (before,))[0], target)
+            heapq.heappush(lightest, (load(target), target))
+            heapq.heappush(heaviest, (-load(target), target))
+
+        for order in orphans[:max_moves]:
+            move(order, pop(lightest, 1))
+        while max_moves is None or len(moves) < max_moves:
+            source, target = pop(heaviest, -1), pop(lightest, 1)
+            if load(source) - load(target) <= 1:
+                break
+            order = assigned[source].pop()
+            heapq.heappush(lightest, (load(source), source))
+            heapq.heappush(heaviest, (-load(source), source))
+            move(order, target)
+
+        if not dry_run and moves:
+            targets = {}
+            for order_id, (_, target) in moves.items():
+                targets.setdefault(target, []).append(order_id)
+            updated_at = timezone.now()
+            for target, order_ids in targets.items():
+                Order.objects.filter(id__in=order_ids).update(delivery_crew_id=target, updated_at=updated_at)
+            transaction.on_commit(index.invalidate)
+            # update() sends no post_save; tell the order event subscribers.
+            payloads = [
+                events.order_payload(order_id, user_id, moves[order_id][1], False, updated_at,
+                                     previous_crew_id=moves[order_id][0])
+                for order_id, user_id in Order.objects.filter(id__in=list(moves)).values_list('id', 'user_id')
+            ]
+            transaction.on_commit(lambda: [events.publish(payload) for payload in payloads])
+    return [(order_id, before, after) for order_id, (before, after) in moves.items()]
@@ -0,0 +1,178 @@
+# LittleLemonAPI/events.py
+# Order change events for the Server-Sent Events stream (async_views.order_events).
+#
+# Placing an order, or changing its status or delivery crew, publishes an event
+# after commit (signals.py, dispatch.rebalance) through the channel layer named
+# by LITTLELEMON_EVENTS_LAYER. The layer hands every event to this process's
+# Hub, which numbers it, keeps the last LITTLELEMON_EVENTS_BUFFER events for
+# Last-Event-ID resumes and queues it for the matching subscribers on their
+# event loop. Subscribers are indexed by routing key (the order's customer, its
+# delivery crew before and after, everything for managers), so an event costs
+# the same whatever the number of idle subscribers.
+#
+# LocalLayer connects the publishers and subscribers of one process. To fan out
+# across workers, point LITTLELEMON_EVENTS_LAYER at a class with the same
+# interface built on a shared bus (Redis pub/sub, PostgreSQL LISTEN/NOTIFY):
+# `__init__(receive)` starts delivering every bus message to `receive(payload)`,
+# `publish(payload)` sends a JSON-serializable payload to every process.
+#
+# A subscriber whose queue fills up is disconnected rather than buffered without
+# bound; its client reconnects with Last-Event-ID and catches up from the buffer.
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+MANAGERS = 'managers'
+
+
+class LocalLayer:
+    """Delivers the events published in this process to its own subscribers."""
+
+    def __init__(self, receive):
+        self.receive = receive
+
+    def publish(self, payload):
+        self.receive(payload)
+
+
+class Subscriber:
+    def __init__(self, keys, matches, maxsize):
+        self.keys = keys
+        self.matches = matches
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        # Runs on the subscriber's loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def routing_keys(payload):
+    keys = {MANAGERS, ('user', payload['user'])}
+    for crew_id in (payload['delivery_crew'], payload.get('previous_delivery_crew')):
+        if crew_id:
+            keys.add(('crew', crew_id))
+    return keys
+
+
+class Hub:
+    def __init__(self, size):
+        self.epoch = uuid.uuid4().hex[:8]  # event ids from another process or run cannot be resumed
+        self._seq = 0
+        self._buffer = deque(maxlen=size)
+        self._subscribers = {}  # routing key -> set of Subscriber
+        self._lock = threading.Lock()
+
+    def receive(self, payload):
+        keys = routing_keys(payload)
+        with self._lock:
+            self._seq += 1
+            event = (f'{self.epoch}-{self._seq}', payload)
+            self._buffer.append((self._seq, keys, event))
+            targets = set()
+            for key in keys:
+                targets.update(self._subscribers.get(key, ()))
+        for subscriber in targets:
+            if subscriber.matches is None or subscriber.matches(payload):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.put, event)
+                except RuntimeError:  # its loop is closed
+                    self.unsubscribe(subscriber)
+
+    def _backlog(self, subscriber, last_event_id):
+        # Buffered events after last_event_id, or None if some may be missing.
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq or (self._buffer and seq < self._buffer[0][0] - 1):
+            return None
+        return [
+            event for number, keys, event in self._buffer
+            if number > seq and keys & subscriber.keys
+            and (subscriber.matches is None or subscriber.matches(event[1]))
+        ]
+
+    def subscribe(self, keys, matches=None, last_event_id=None):
+        """
+        Register a subscriber on the running loop for events with any of `keys`
+        that pass `matches(payload)`. Returns (subscriber, backlog): the events
+        after `last_event_id`, or None if they can no longer all be replayed.
+        """
+        subscriber = Subscriber(frozenset(keys), matches, getattr(settings, 'LITTLELEMON_EVENTS_QUEUE', 100))
+        with self._lock:
+            for key in subscriber.keys:
+                self._subscribers.setdefault(key, set()).add(subscriber)
+            backlog = self._backlog(subscriber, last_event_id) if last_event_id else []
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for key in subscriber.keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscriber for subscribers in self._subscribers.values() for subscriber in subscribers})
+
+
+hub = Hub(getattr(settings, 'LITTLELEMON_EVENTS_BUFFER', 1000))
+_layer = None
+
+
+def layer():
+    global _layer
+    if _layer is None:
+        path = getattr(settings, 'LITTLELEMON_EVENTS_LAYER', 'LittleLemonAPI.events.LocalLayer')
+        _layer = import_string(path)(hub.receive)
+    return _layer
+
+
+def publish(payload):
+    layer().publish(payload)
+
+
+def order_payload(order_id, user_id, crew_id, status, updated_at, previous_crew_id=None):
+    return {
+        'id': order_id,
+        'user': user_id,
+        'delivery_crew': crew_id,
+        'previous_delivery_crew': previous_crew_id,
+        'status': bool(status),
+        'updated_at': updated_at.isoformat(),
+    }
+
+
+def order_saved(order, created):
+    """post_save: publish after commit if the order is new or its status or crew changed."""
+    loaded = getattr(order, '_loaded', None) or {}
+    before = (loaded.get('status'), loaded.get('delivery_crew_id'))
+    if not created and before == (bool(order.status), order.delivery_crew_id):
+        return
+    payload = order_payload(
+        order.id, order.user_id, order.delivery_crew_id, order.status, order.updated_at,
+        previous_crew_id=None if created else before[1],
+    )
+    transaction.on_commit(lambda: publish(payload))
+
+
+def format_event(event, name='order'):
+    event_id, payload = event
+    data = json.dumps(payload, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {name}\ndata: {data}\n\n'
@@ -0,0 +1,76 @@
+# LittleLemonAPI/exports.py
+# Streaming order exports. Rows come from a single ordered query read with
+# .iterator() (a server-side cursor where the backend supports it), and each
+# order is written out as soon as its last item has been read, so memory use
+# does not depend on the number of orders exported.
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+CHUNK_SIZE = 2000
+
+COLUMNS = (
+    'id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date',
+    'order_items__id', 'order_items__menuitem_id', 'order_items__quantity',
+    'order_items__unit_price', 'order_items__price',
+)
+
+CSV_HEADER = (
+    'order_id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date',
+    'item_id', 'menuitem_id', 'quantity', 'unit_price', 'price',
+)
+
+
+def _rows(orders):
+    # LEFT JOIN on the items, so orders without items still appear once.
+    return orders.order_by('id', 'order_items__id').values_list(*COLUMNS).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _order(row):
+    return {
+        'id': row[0],
+        'user': row[1],
+        'delivery_crew': row[2],
+        'status': row[3],
+        'total': row[4],
+        'date': row[5],
+        'order_items': [],
+    }
+
+
+def ndjson(orders):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    current = None
+    for row in _rows(orders):
+        if current is None or current['id'] != row[0]:
+            if current is not None:
+                yield encoder.encode(current) + '\n'
+            current = _order(row)
+        if row[6] is not None:
+            current['order_items'].append({
+                'id': row[6],
+                'menuitem': row[7],
+                'quantity': row[8],
+                'unit_price': row[9],
+                'price': row[10],
+            })
+    if current is not None:
+        yield encoder.encode(current) + '\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in _rows(orders):
+        yield writer.writerow(row)
+
+
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
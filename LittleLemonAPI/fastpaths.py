@@ -0,0 +1,154 @@
+# LittleLemonAPI/fastpaths.py
+# Read-only list representations built straight from values_list() rows.
+# They return exactly what MenuItemSerializer and OrderSerializer return for the
+# same rows and fieldsets.Selection, without building a DRF field tree per
+# object. Writes and validation still go through the serializers.
+#
+# Each builder below appends the columns it needs to a shared list and returns
+# a function turning one row of those columns into the response dict, so only
+# the columns and joins of the requested fields are ever selected.
+from decimal import Context, Decimal
+from operator import itemgetter
+
+from .fieldsets import ALL
+from .models import MenuItem, Order, OrderItem
+
+
+def decimal_string(field):
+    # Same as serializers.DecimalField.to_representation for this model field.
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+    context = Context(prec=field.max_digits)
+
+    def convert(value):
+        return f'{value.quantize(exponent, context=context):f}'
+    return convert
+
+
+_menu_price = decimal_string(MenuItem._meta.get_field('price'))
+_order_total = decimal_string(Order._meta.get_field('total'))
+_item_unit_price = decimal_string(OrderItem._meta.get_field('unit_price'))
+_item_price = decimal_string(OrderItem._meta.get_field('price'))
+
+
+def _date(value):
+    return value.isoformat()
+
+
+def _column(columns, name, convert=None):
+    columns.append(name)
+    get = itemgetter(len(columns) - 1)
+    if convert is None:
+        return get
+    return lambda row: convert(get(row))
+
+
+def _object(getters):
+    def build(row):
+        return {name: get(row) for name, get in getters}
+    return build
+
+
+def _scalars(columns, selection, prefix, spec):
+    return [
+        (name, _column(columns, prefix + name, convert))
+        for name, convert in spec if selection.includes(name)
+    ]
+
+
+def _category(columns, selection, prefix):
+    return _object(_scalars(columns, selection, prefix, (('id', None), ('slug', None), ('title', None))))
+
+
+def _menu_item(columns, selection, prefix=''):
+    getters = _scalars(columns, selection, prefix, (
+        ('id', None), ('title', None), ('price', _menu_price), ('featured', None),
+    ))
+    if selection.includes('category'):
+        if selection.expands('category'):
+            getters.append(('category', _category(columns, selection.child('category'), prefix + 'category__')))
+        else:
+            getters.append(('category', _column(columns, prefix + 'category_id')))
+    return _object(getters)
+
+
+def _order_item(columns, selection):
+    # columns[0] is always order_id, used to group the items by order.
+    getters = _scalars(columns, selection, '', (('id', None),))
+    if selection.includes('order'):
+        getters.append(('order', itemgetter(0)))
+    if selection.includes('menuitem'):
+        if selection.expands('menuitem'):
+            getters.append(('menuitem', _menu_item(columns, selection.child('menuitem'), 'menuitem__')))
+        else:
+            getters.append(('menuitem', _column(columns, 'menuitem_id')))
+    getters += _scalars(columns, selection, '', (
+        ('quantity', None), ('unit_price', _item_unit_price), ('price', _item_price),
+    ))
+    return _object(getters)
+
+
+def menu_items(queryset, selection=None):
+    """
+    Return (rows, data): `rows` is the queryset as named values_list() rows for
+    filtering and KeysetPagination, `data(page)` the response list for a page.
+    """
+    columns = []
+    build = _menu_item(columns, selection or ALL)
+    # The paginator reads its cursor off the rows.
+    extra = [name for name in ('id', 'price') if name not in columns]
+    rows = queryset.values_list(*columns, *extra, named=True)
+    return rows, lambda page: [build(row) for row in page]
+
+
+class _OrderData:
+    """data(page) for orders(); `await data.acall(page)` in async views."""
+
+    def __init__(self, build, item_columns=None, build_item=None):
+        self.build = build
+        self.item_columns = item_columns
+        self.build_item = build_item
+
+    def _lines(self, page):
+        return OrderItem.objects.filter(order_id__in=[row.id for row in page]).values_list(*self.item_columns)
+
+    def _assemble(self, page, lines):
+        if self.item_columns is None:
+            return [self.build(row) for row in page]
+        items = {row.id: [] for row in page}
+        for line in lines:
+            items[line[0]].append(self.build_item(line))
+        return [dict(self.build(row), order_items=items[row.id]) for row in page]
+
+    def __call__(self, page):
+        lines = self._lines(page) if page and self.item_columns else ()
+        return self._assemble(page, lines)
+
+    async def acall(self, page):
+        lines = [line async for line in self._lines(page)] if page and self.item_columns else ()
+        return self._assemble(page, lines)
+
+
+def orders(queryset, selection=None):
+    """Like menu_items(); data(page) costs one more query for the order items."""
+    selection = selection or ALL
+    columns = []
+    getters = [
+        (name, _column(columns, column, convert))
+        for name, column, convert in (
+            ('id', 'id', None), ('user', 'user_id', None), ('delivery_crew', 'delivery_crew_id', None),
+            ('status', 'status', None), ('total', 'total', _order_total), ('date', 'date', _date),
+        )
+        if selection.includes(name)
+    ]
+    build = _object(getters)
+    extra = [name for name in ('id', 'date') if name not in columns]
+    rows = queryset.values_list(*columns, *extra, named=True)
+    if not selection.includes('order_items'):
+        return rows, _OrderData(build)
+
+    item_columns = ['order_id']
+    if selection.expands('order_items'):
+        build_item = _order_item(item_columns, selection.child('order_items'))
+    else:
+        build_item = _column(item_columns, 'id')
+    return rows, _OrderData(build, item_columns, build_item)
@@ -0,0 +1,102 @@
+# LittleLemonAPI/fieldsets.py
+# ?fields= and ?expand= on menu, cart and order responses.
+#
+#   ?fields=id,total,order_items.quantity   only these fields; a dotted name
+#                                           selects fields of a nested object
+#   ?expand=order_items.menuitem            only these relations are nested
+#                                           objects, the others are ids
+#
+# Without either parameter every field is returned and every relation is
+# expanded, as before. Naming a nested field in ?fields= expands its parents.
+# A name the serializer does not return, or an ?expand= of something that is
+# not a nested object, is a 400.
+# The serializers (serializers.SelectableFieldsMixin), the fast list path
+# (fastpaths.py) and the querysets' for_serializer() all read the same
+# Selection, so a relation that is not returned is not queried either.
+import functools
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer
+
+
+def _paths(raw):
+    if raw is None:
+        return None
+    return frozenset(tuple(part.strip().split('.')) for part in raw.split(',') if part.strip())
+
+
+class Selection:
+    def __init__(self, fields=None, expand=None):
+        # Sets of name tuples relative to this level, or None for "everything".
+        self.fields = fields
+        self.expand = expand
+
+    def includes(self, name):
+        return self.fields is None or any(path[0] == name for path in self.fields)
+
+    def expands(self, name):
+        if self.expand is None or any(path[0] == name for path in self.expand):
+            return True
+        return self.fields is not None and any(path[0] == name and len(path) > 1 for path in self.fields)
+
+    def loads(self, name):
+        """The relation is returned as a nested object, so its row is needed."""
+        return self.includes(name) and self.expands(name)
+
+    def child(self, name):
+        fields = None
+        if self.fields is not None:
+            tails = {path[1:] for path in self.fields if path[0] == name}
+            # `order_items` on its own means all of its fields.
+            fields = None if () in tails else frozenset(tails)
+        expand = None
+        if self.expand is not None:
+            expand = frozenset(path[1:] for path in self.expand if path[0] == name and len(path) > 1)
+        return Selection(fields, expand)
+
+    @property
+    def key(self):
+        # Stable across parameter order, for cache keys and ETags.
+        def text(paths):
+            return '*' if paths is None else ','.join(sorted('.'.join(path) for path in paths))
+        return f'fields={text(self.fields)};expand={text(self.expand)}'
+
+
+ALL = Selection()
+
+
+@functools.cache
+def _schema(serializer_class):
+    # {name: schema of the nested serializer, or None} for the readable fields.
+    schema = {}
+    for name, field in serializer_class().fields.items():
+        if not field.write_only:
+            nested = getattr(field, 'child', field)
+            schema[name] = _schema(type(nested)) if isinstance(nested, BaseSerializer) else None
+    return schema
+
+
+def _check(param, paths, schema):
+    for path in paths:
+        level = schema
+        for name in path:
+            if level is None or name not in level:
+                raise ValidationError({param: [f'Unknown field: {".".join(path)!r}.']})
+            level = level[name]
+        if param == 'expand' and level is None:
+            raise ValidationError({param: [f'Not a nested object: {".".join(path)!r}.']})
+
+
+def from_params(params, serializer_class):
+    """
+    The Selection requested by ?fields=/?expand= for `serializer_class`, or None
+    if neither is given. ValidationError if either names an unknown field.
+    """
+    fields, expand = params.get('fields'), params.get('expand')
+    if fields is None and expand is None:
+        return None
+    selection = Selection(_paths(fields), _paths(expand))
+    schema = _schema(serializer_class)
+    for param, paths in (('fields', selection.fields), ('expand', selection.expand)):
+        _check(param, paths or (), schema)
+    return selection
@@ -0,0 +1,90 @@
+# LittleLemonAPI/filters.py
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+
+TRUE_VALUES = ('1', 'true', 'True')
+FALSE_VALUES = ('0', 'false', 'False')
+
+
+def _param(params, name, parse):
+    raw = params.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        value = parse(raw)
+    except (ValueError, InvalidOperation):
+        value = None
+    # Decimal() also parses 'nan' and 'Infinity', which the ORM cannot compare.
+    if value is None or isinstance(value, Decimal) and not value.is_finite():
+        raise ValidationError({name: [f'Invalid value: {raw!r}.']})
+    return value
+
+
+def _boolean(raw):
+    if raw in TRUE_VALUES:
+        return True
+    if raw in FALSE_VALUES:
+        return False
+    raise ValueError(raw)
+
+
+def filter_menu_items(queryset, params):
+    # ?category=<id>&featured=<bool>&price_min=<decimal>&price_max=<decimal>
+    category = _param(params, 'category', int)
+    featured = _param(params, 'featured', _boolean)
+    price_min = _param(params, 'price_min', Decimal)
+    price_max = _param(params, 'price_max', Decimal)
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    if featured is not None:
+        queryset = queryset.filter(featured=featured)
+    if price_min is not None:
+        queryset = queryset.filter(price__gte=price_min)
+    if price_max is not None:
+        queryset = queryset.filter(price__lte=price_max)
+    return queryset
+
+
+def filter_orders(queryset, params):
+    # ?status=<0|1>&date_from=<YYYY-MM-DD>&date_to=<YYYY-MM-DD>&delivery_crew=<id|none>
+    order_status = _param(params, 'status', _boolean)
+    date_from = _param(params, 'date_from', date.fromisoformat)
+    date_to = _param(params, 'date_to', date.fromisoformat)
+    if order_status is not None:
+        queryset = queryset.filter(status=order_status)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    if params.get('delivery_crew') == 'none':
+        queryset = queryset.filter(delivery_crew__isnull=True)
+    else:
+        delivery_crew = _param(params, 'delivery_crew', int)
+        if delivery_crew is not None:
+            queryset = queryset.filter(delivery_crew_id=delivery_crew)
+    return queryset
+
+
+def filter_report_dates(queryset, params):
+    # ?date_from=<YYYY-MM-DD>&date_to=<YYYY-MM-DD> on a rollup table
+    date_from = _param(params, 'date_from', date.fromisoformat)
+    date_to = _param(params, 'date_to', date.fromisoformat)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+def filter_sales(queryset, params):
+    # filter_report_dates plus ?category=<id>&menuitem=<id> on DailySales
+    queryset = filter_report_dates(queryset, params)
+    category = _param(params, 'category', int)
+    menuitem = _param(params, 'menuitem', int)
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    if menuitem is not None:
+        queryset = queryset.filter(menuitem_id=menuitem)
+    return queryset
@@ -0,0 +1,31 @@
+# LittleLemonAPI/handlers.py
+# The ASGI handler of asgi.py. Django runs each request in a
+# ThreadSensitiveContext, and the first thread-sensitive sync call made in it
+# (the request_started receivers, sync middleware, the async ORM) starts a
+# worker thread that the request keeps until its response ends. For an order
+# event stream that is as long as the client stays connected, so those requests
+# run outside such a context: their few thread-sensitive calls share asgiref's
+# process-wide sync thread, and order_events does its checks in the shared pool.
+import django
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+
+
+class StreamingASGIHandler(ASGIHandler):
+    def __init__(self):
+        from . import async_views  # needs the app registry
+        super().__init__()
+        self.stream_paths = {reverse(async_views.order_events)}
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '').removeprefix(scope.get('root_path', ''))
+        if scope['type'] == 'http' and path in self.stream_paths:
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+def get_asgi_application():
+    """django.core.asgi.get_asgi_application with StreamingASGIHandler."""
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
@@ -0,0 +1,108 @@
+# LittleLemonAPI/idempotency.py
+# Honors the Idempotency-Key header on POST endpoints: the first response for a
+# key is stored and replayed for retries instead of running the write again.
+# A key whose first request has been running for longer than
+# LITTLELEMON_IDEMPOTENCY_PROCESSING_TIMEOUT is taken to be abandoned by a
+# worker that died, and the next retry runs the request again.
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def ttl():
+    return timedelta(seconds=getattr(settings, 'LITTLELEMON_IDEMPOTENCY_TTL', 24 * 60 * 60))
+
+
+def processing_timeout():
+    return timedelta(seconds=getattr(settings, 'LITTLELEMON_IDEMPOTENCY_PROCESSING_TIMEOUT', 60))
+
+
+def expired():
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - ttl())
+
+
+def _reserve(request, key, fingerprint):
+    """
+    Insert the key before running the view so that a concurrent retry with the
+    same key sees it. Returns (record, created).
+    """
+    fields = {'method': request.method, 'path': request.path, 'fingerprint': fingerprint}
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=request.user, key=key, **fields), True
+    except IntegrityError:
+        pass
+    record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if record is None or record.created_at < timezone.now() - ttl():
+        IdempotencyKey.objects.filter(user=request.user, key=key).delete()
+        return _reserve(request, key, fingerprint)
+    if record.status_code is None and record.created_at < timezone.now() - processing_timeout():
+        # Matching created_at lets only one of several concurrent retries take it over.
+        now = timezone.now()
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status_code=None, created_at=record.created_at
+        ).update(created_at=now, **fields)
+        if taken:
+            for name, value in fields.items():
+                setattr(record, name, value)
+            record.created_at = now
+            return record, True
+    return record, False
+
+
+def _replay(request, record, fingerprint):
+    if (record.method, record.path, record.fingerprint) != (request.method, request.path, fingerprint):
+        return Response(
+            {'error': f'{HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        return Response(
+            {'error': f'A request with this {HEADER} is still being processed'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view):
+    """
+    View decorator, placed under @api_view/@permission_classes. Responses with
+    a status below 500 are stored; server errors release the key so the client
+    can retry.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        record, created = _reserve(request, key, fingerprint)
+        if not created:
+            return _replay(request, record, fingerprint)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response'])
+        return response
+    return wrapper
@@ -0,0 +1,248 @@
+# LittleLemonAPI/instrumentation.py
+# Per-request hot-path metrics: query count, DB time, repeated-query (N+1)
+# fingerprints, serialization and render time and response size. Emitted as a
+# Server-Timing header and a structured log line, and aggregated into per-route
+# histograms served in Prometheus text format by views.metrics.
+#
+# Serialization is what views time with serializing(): building the response
+# data, less any queries that runs. Responses built without it have no
+# serialize figure.
+#
+# Enabled by settings.LITTLELEMON_INSTRUMENTATION; when it is off the middleware
+# removes itself at startup and costs nothing.
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    # Parameters are already placeholders; only IN lists vary in length.
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper that counts, times and fingerprints queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return sum(n - 1 for n in self.fingerprints.values() if n > 1)
+
+    def worst(self):
+        if not self.fingerprints:
+            return None
+        sql, n = self.fingerprints.most_common(1)[0]
+        return {'sql': sql[:200], 'count': n} if n > 1 else None
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Per-(route, method) aggregates for the metrics endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.db_seconds = Counter()
+        self.duplicate_queries = Counter()
+        self.response_bytes = Counter()
+        self.overhead_seconds = 0.0
+
+    def record(self, labels, record, overhead):
+        with self._lock:
+            self.latency[labels].observe(record['total_ms'] / 1000)
+            self.queries[labels].observe(record['queries'])
+            self.db_seconds[labels] += record['db_ms'] / 1000
+            self.duplicate_queries[labels] += record['duplicate_queries']
+            self.response_bytes[labels] += record['bytes'] or 0
+            self.overhead_seconds += overhead
+
+    def render(self):
+        lines = []
+
+        def label_str(labels, **extra):
+            pairs = [('route', labels[0]), ('method', labels[1])] + list(extra.items())
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+        def histogram(name, help_text, data):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in sorted(data.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{label_str(labels, le=bound)} {count}')
+                lines.append(f'{name}_bucket{label_str(labels, le="+Inf")} {hist.total}')
+                lines.append(f'{name}_sum{label_str(labels)} {hist.sum}')
+                lines.append(f'{name}_count{label_str(labels)} {hist.total}')
+
+        def counter(name, help_text, data):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(data.items()):
+                lines.append(f'{name}{label_str(labels)} {value}')
+
+        with self._lock:
+            histogram('littlelemon_request_duration_seconds', 'Request latency.', self.latency)
+            histogram('littlelemon_db_queries', 'Database queries per request.', self.queries)
+            counter('littlelemon_db_duration_seconds_total', 'Time spent in the database.', self.db_seconds)
+            counter('littlelemon_duplicate_queries_total', 'Queries repeating an earlier fingerprint '
+                    'in the same request (N+1 candidates).', self.duplicate_queries)
+            counter('littlelemon_response_bytes_total', 'Response body bytes.', self.response_bytes)
+            lines.append('# HELP littlelemon_instrumentation_overhead_seconds_total '
+                         'Time spent aggregating and logging these metrics.')
+            lines.append('# TYPE littlelemon_instrumentation_overhead_seconds_total counter')
+            lines.append(f'littlelemon_instrumentation_overhead_seconds_total {self.overhead_seconds}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+@contextmanager
+def serializing(request):
+    """Time the block as the request's serialization; a no-op when instrumentation is off."""
+    state = getattr(request, '_instrumentation', None)
+    if state is None:
+        yield
+        return
+    recorder = state['recorder']
+    start, db = time.perf_counter(), recorder.duration
+    try:
+        yield
+    finally:
+        # Lazy querysets and prefetches run inside the block; they count as DB time.
+        spent = time.perf_counter() - start - (recorder.duration - db)
+        state['serialize'] = state.get('serialize', 0.0) + spent
+
+
+def _wrap_connections(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'LITTLELEMON_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # A coroutine hook, so Django does not hop to a thread to call it.
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        request._instrumentation = state = {'recorder': recorder}
+        with ExitStack() as stack:
+            _wrap_connections(stack, recorder)
+            response = self.get_response(request)
+        return self._finish(request, response, start, state)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        request._instrumentation = state = {'recorder': recorder}
+        stack = ExitStack()
+        # Connections are per thread, and the async ORM runs every query of a
+        # request in that request's thread-sensitive worker thread.
+        await sync_to_async(_wrap_connections)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._finish(request, response, start, state)
+
+    def _finish(self, request, response, start, state):
+        recorder = state['recorder']
+        end = time.perf_counter()
+
+        view_end = state.get('view_end', end)
+        render_end = state.get('render_end', view_end)
+        serialize = state.get('serialize')
+        record = {
+            'method': request.method,
+            'route': getattr(request.resolver_match, 'route', None) or 'unmatched',
+            'status': response.status_code,
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates(),
+            'db_ms': _ms(recorder.duration),
+            'serialize_ms': None if serialize is None else _ms(serialize),
+            'render_ms': _ms(render_end - view_end),
+            'total_ms': _ms(end - start),
+            'bytes': None if response.streaming else len(response.content),
+        }
+        timings = [f'db;dur={record["db_ms"]};desc="{recorder.count} queries, {record["duplicate_queries"]} repeated"']
+        if serialize is not None:
+            timings.append(f'serialize;dur={record["serialize_ms"]}')
+        timings += [f'render;dur={record["render_ms"]}', f'total;dur={record["total_ms"]}']
+        response['Server-Timing'] = ', '.join(timings)
+        worst = recorder.worst()
+        if worst:
+            record['worst_repeated_query'] = worst
+        logger.info(json.dumps(record))
+        registry.record((record['route'], record['method']), record, time.perf_counter() - end)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF Responses come through here after the view, before rendering.
+        state = request._instrumentation
+        state['view_end'] = time.perf_counter()
+        response.add_post_render_callback(lambda r: state.__setitem__('render_end', time.perf_counter()))
+        return response
+
+    async def _aprocess_template_response(self, request, response):
+        return InstrumentationMiddleware.process_template_response(self, request, response)
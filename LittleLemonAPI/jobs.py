@@ -0,0 +1,215 @@
+# LittleLemonAPI/jobs.py
+# A database-backed queue for work that need not hold up a response.
+#
+# enqueue() inserts a Job row in the caller's transaction, so the job exists if
+# and only if the work that asked for it was committed. `manage.py run_jobs`
+# claims due jobs in batches and runs them on a thread pool; several run_jobs
+# processes can share the queue. On PostgreSQL a claim skips rows another
+# worker is claiming (SELECT ... FOR UPDATE SKIP LOCKED); SQLite has one writer
+# at a time, so claims simply take turns.
+#
+# A claimed job is leased to its worker for LITTLELEMON_JOBS_LEASE seconds, then
+# becomes due again, which is how the jobs of a crashed worker are recovered.
+# By default a job is removed in the same transaction as the handler's writes,
+# so those take effect exactly once. That transaction holds SQLite's write lock,
+# so handlers that mostly wait on something else (mail, HTTP) should be
+# registered with atomic=False: they run outside a transaction, in parallel,
+# and their job is removed afterwards, so after a crash they may run twice.
+# A job that raises is retried after a
+# randomized exponential backoff and moved to DeadJob after
+# LITTLELEMON_JOBS_MAX_ATTEMPTS attempts; `run_jobs --retry-dead` queues those again.
+import logging
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import DeadJob, Job
+from .retry import retryable
+
+logger = logging.getLogger(__name__)
+
+# Longest delay between two attempts of a failing job (seconds).
+MAX_BACKOFF = 3600
+
+_handlers = {}
+
+
+def handler(name, atomic=True):
+    """
+    Register the decorated function as the handler of jobs called `name`. With
+    atomic=False it does not run in the transaction that completes the job.
+    """
+    def register(func):
+        _handlers[name] = (func, atomic)
+        return func
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, f'LITTLELEMON_JOBS_{name}', default)
+
+
+def enqueue(name, payload=None, key='', delay=0):
+    """
+    Queue `name`, to be called with the JSON-serializable `payload` as keyword
+    arguments, in `delay` seconds or as soon as a worker is free. `key`
+    identifies the job for cancel().
+    """
+    if name not in _handlers:
+        raise LookupError(f'No job handler named {name!r}')
+    return Job.objects.create(
+        name=name, payload=payload or {}, key=key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def cancel(name, key):
+    """Delete the queued jobs `name` with `key`; returns how many there were."""
+    return Job.objects.filter(name=name, key=key).delete()[0]
+
+
+def claim(batch_size, names=None):
+    """Lease up to `batch_size` due jobs to this worker, oldest first."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=_setting('LEASE', 300))
+    with transaction.atomic():
+        due = (
+            Job.objects.filter(run_at__lte=now)
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+            .order_by('run_at', 'id')
+        )
+        if names:
+            due = due.filter(name__in=names)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        jobs = list(due[:batch_size])
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                locked_until=lease, attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.locked_until = lease
+        job.attempts += 1
+    return jobs
+
+
+def _leased(job):
+    # Rows still held by this worker's lease; empty once the job was cancelled,
+    # or claimed again by another worker after the lease ran out.
+    return Job.objects.filter(id=job.id, locked_until=job.locked_until)
+
+
+def backoff(attempts):
+    base = _setting('BACKOFF', 2) * 2 ** (attempts - 1)
+    return min(base, MAX_BACKOFF) * random.uniform(0.5, 1.5)
+
+
+def run(job):
+    """Run one claimed job. Returns 'done', 'retry', 'dead' or 'skipped'."""
+    close_old_connections()
+    try:
+        func, atomic = _handlers.get(job.name, (None, True))
+        if func is None:
+            raise LookupError(f'No job handler named {job.name!r}')
+        if not atomic:
+            func(**job.payload)
+            _leased(job).delete()
+            return 'done'
+        with transaction.atomic():
+            if not _leased(job).delete()[0]:
+                return 'skipped'
+            func(**job.payload)
+        return 'done'
+    except Exception as exc:
+        try:
+            return _failed(job, exc)
+        except Exception:
+            # The job stays leased and is retried once the lease runs out.
+            logger.exception('Could not record the failure of job %s #%s', job.name, job.id)
+            return 'retry'
+    finally:
+        close_old_connections()
+
+
+def _failed(job, exc):
+    error = ''.join(traceback.format_exception(exc))
+    with transaction.atomic():
+        if job.attempts < _setting('MAX_ATTEMPTS', 5):
+            delay = backoff(job.attempts)
+            _leased(job).update(
+                run_at=timezone.now() + timedelta(seconds=delay), locked_until=None, last_error=error,
+            )
+            logger.warning('Job %s #%s failed (attempt %s), retrying in %.0fs: %s', job.name, job.id, job.attempts, delay, exc)
+            return 'retry'
+        if _leased(job).delete()[0]:
+            DeadJob.objects.create(
+                name=job.name, payload=job.payload, key=job.key, attempts=job.attempts,
+                error=error, created_at=job.created_at,
+            )
+    logger.error('Job %s #%s failed %s times, moved to DeadJob: %s', job.name, job.id, job.attempts, exc)
+    return 'dead'
+
+
+def retry_dead(ids=None):
+    """Queue dead jobs (all, or those with `ids`) again, with fresh attempts."""
+    with transaction.atomic():
+        dead = DeadJob.objects.select_for_update()
+        if ids is not None:
+            dead = dead.filter(id__in=ids)
+        dead = list(dead)
+        now = timezone.now()
+        Job.objects.bulk_create([
+            Job(name=job.name, payload=job.payload, key=job.key, run_at=now) for job in dead
+        ])
+        DeadJob.objects.filter(id__in=[job.id for job in dead]).delete()
+    return len(dead)
+
+
+class Worker:
+    """
+    Claims batches of due jobs and runs them on `threads` threads until stop()
+    is called, or, with once=True, until no job is due.
+    """
+
+    def __init__(self, threads=4, batch_size=None, poll=1.0, names=None):
+        self.threads = threads
+        self.batch_size = batch_size or threads * 10
+        self.poll = poll
+        self.names = names
+        self.counts = {'done': 0, 'retry': 0, 'dead': 0, 'skipped': 0}
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, once=False):
+        # One thread runs jobs itself; a pool of one would only add a hand-off.
+        pool = ThreadPoolExecutor(self.threads, thread_name_prefix='job') if self.threads > 1 else None
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim(self.batch_size, self.names)
+                except Exception as exc:
+                    if not retryable(exc):
+                        raise
+                    logger.warning('Claiming jobs failed, retrying: %s', exc)
+                    self._stop.wait(self.poll)
+                    continue
+                for outcome in (pool.map(run, jobs) if pool else map(run, jobs)):
+                    self.counts[outcome] += 1
+                if once and not jobs:
+                    break
+                if len(jobs) < self.batch_size and not once:
+                    self._stop.wait(self.poll)
+        finally:
+            if pool:
+                pool.shutdown()
+        return self.counts
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI import seeding
+from LittleLemonAPI.bench import summarize
+
+PATHS = (
+    '/api/menu-items/',
+    '/api/menu-items/?ordering=-price&page_size=50',
+    '/api/cart/menu-items/',
+    '/api/orders/',
+    '/api/orders/?fields=id,total,status',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync views under WSGI with the async views under ASGI at increasing '
+        'concurrency, driving each application in-process. Each mode runs in its own '
+        'process. Needs committed data: run seed_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,16,64,256', help='Comma separated client counts.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per concurrency level.')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads (e.g. gunicorn --threads).')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Sleep added to every query, to model a database across the network.')
+        parser.add_argument('--mode', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        if options['mode']:
+            self.run_mode(options['mode'], levels, options)
+            return
+        user = (
+            User.objects.filter(username__startswith=f'{seeding.USERNAME_PREFIX}-customer-', order__isnull=False)
+            .order_by('id').first()
+        )
+        if user is None:
+            raise CommandError('No seeded customer with orders; run `manage.py seed_data` first.')
+        token, created = Token.objects.get_or_create(user=user)
+        try:
+            self.stdout.write(
+                f'requests={options["requests"]} wsgi_threads={options["threads"]} '
+                f'db_latency={options["db_latency_ms"]}ms paths={len(PATHS)}'
+            )
+            self.stdout.write(f'{"mode":<5} {"clients":>7} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"errors":>6}')
+            for mode in ('wsgi', 'asgi'):
+                for result in self.spawn(mode, token.key, options):
+                    self.stdout.write(
+                        f'{mode:<5} {result["clients"]:>7} {result["rps"]:>8.0f} {result["p50"]:>6.1f}ms '
+                        f'{result["p95"]:>6.1f}ms {result["p99"]:>6.1f}ms {result["errors"]:>6}'
+                    )
+        finally:
+            if created:
+                token.delete()
+
+    def spawn(self, mode, token, options):
+        env = dict(os.environ, LITTLELEMON_ASYNC_VIEWS='1' if mode == 'asgi' else '0',
+                   LITTLELEMON_BENCH_TOKEN=token, LITTLELEMON_INSTRUMENTATION='0',
+                   LITTLELEMON_THROTTLE='0')
+        command = [
+            sys.executable, sys.argv[0], 'bench_asgi', '--mode', mode,
+            '--concurrency', options['concurrency'], '--requests', str(options['requests']),
+            '--threads', str(options['threads']), '--db-latency-ms', str(options['db_latency_ms']),
+        ]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        return [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+    # Child process side.
+
+    def run_mode(self, mode, levels, options):
+        if settings.LITTLELEMON_ASYNC_VIEWS != (mode == 'asgi'):
+            raise CommandError('LITTLELEMON_ASYNC_VIEWS does not match --mode')
+        latency = options['db_latency_ms'] / 1000
+        if latency:
+            def slow(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+            def install(sender, connection, **kwargs):
+                if slow not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(slow)
+            connection_created.connect(install, weak=False)
+        token = os.environ['LITTLELEMON_BENCH_TOKEN']
+        run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+        run(self.requests(options['requests'] // 10), token, options)  # warm up
+        for clients in levels:
+            started = time.perf_counter()
+            samples, errors = run(self.requests(options['requests']), token, options, clients)
+            elapsed = time.perf_counter() - started
+            summary = summarize(samples)
+            self.stdout.write(json.dumps({
+                'clients': clients, 'rps': len(samples) / elapsed, 'errors': errors,
+                'p50': summary['p50'], 'p95': summary['p95'], 'p99': summary['p99'],
+            }))
+
+    def requests(self, count):
+        return [PATHS[i % len(PATHS)] for i in range(count)]
+
+    def run_wsgi(self, paths, token, options, clients=1):
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+        pool = ThreadPoolExecutor(max_workers=options['threads'])
+        pending = iter(paths)
+        lock = threading.Lock()
+        samples, errors = [], []
+
+        def call(path):
+            status = []
+            path, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_AUTHORIZATION': f'Token {token}', 'HTTP_ACCEPT': 'application/json',
+                'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            body = application(environ, lambda s, headers: status.append(s))
+            b''.join(body)
+            body.close()
+            return status[0]
+
+        def client():
+            # Each client sends its next request once the previous one is answered.
+            while True:
+                with lock:
+                    path = next(pending, None)
+                if path is None:
+                    return
+                start = time.perf_counter()
+                status = pool.submit(call, path).result()
+                samples.append(time.perf_counter() - start)
+                if not status.startswith('200'):
+                    errors.append(status)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.shutdown()
+        return samples, len(errors)
+
+    def run_asgi(self, paths, token, options, clients=1):
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+        samples, errors = [], []
+
+        async def call(path):
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+                'headers': [(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode()),
+                            (b'accept', b'application/json')],
+            }
+            status = []
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client stays connected until the response is sent.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+            await application(scope, receive, send)
+            return status[0]
+
+        async def client(pending):
+            for path in pending:
+                start = time.perf_counter()
+                status = await call(path)
+                samples.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(status)
+
+        async def main():
+            await asyncio.gather(*(client(paths[i::clients]) for i in range(clients)))
+        asyncio.run(main())
+        return samples, len(errors)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.bench import rolled_back, summarize, timed
+from LittleLemonAPI.models import Cart, Category, MenuItem
+from LittleLemonAPI.services import place_order
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout latency for carts of different sizes. All writes are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,100', help='Comma separated cart sizes.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with rolled_back():
+            category = Category.objects.create(slug='bench', title='Bench')
+            items = MenuItem.objects.bulk_create([
+                MenuItem(title=f'Bench item {i}', price=Decimal('1.00'), featured=False, category=category)
+                for i in range(max(sizes))
+            ])
+            user = User.objects.create(username='bench-checkout')
+            for size in sizes:
+                samples = []
+                for _ in range(options['repeat']):
+                    Cart.objects.bulk_create([
+                        Cart(user=user, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+                        for item in items[:size]
+                    ])
+                    elapsed, _ = timed(place_order, user)
+                    samples.append(elapsed)
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"cart={size:<4} n={stats['n']} mean={stats['mean']:.2f}ms "
+                    f"p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms p99={stats['p99']:.2f}ms"
+                )
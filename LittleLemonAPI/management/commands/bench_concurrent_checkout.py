@@ -0,0 +1,161 @@
+import argparse
+import binascii
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI import seeding
+from LittleLemonAPI.bench import summarize
+from LittleLemonAPI.models import MenuItem
+
+PROFILES = ('sqlite-default', 'sqlite')
+
+
+class Command(BaseCommand):
+    help = (
+        'Run simultaneous checkouts (cart adds, then POST /api/orders/) from several worker '
+        'processes under each SQLite profile of settings.LITTLELEMON_DB, each against its own '
+        'copy of the database. Needs committed data: run seed_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Processes checking out at the same time.')
+        parser.add_argument('--checkouts', type=int, default=50, help='Checkouts per worker.')
+        parser.add_argument('--items', type=int, default=3, help='Cart lines per checkout.')
+        parser.add_argument('--profiles', default=','.join(PROFILES))
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--token', help=argparse.SUPPRESS)
+        parser.add_argument('--menu-items', help=argparse.SUPPRESS)
+        parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.run_worker(options)
+            return
+        database = settings.DATABASES['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('bench_concurrent_checkout compares the SQLite profiles; run it with LITTLELEMON_DB=sqlite.')
+        customers = list(
+            User.objects.filter(username__startswith=f'{seeding.USERNAME_PREFIX}-customer-')
+            .order_by('id').values_list('id', flat=True)[:options['workers']]
+        )
+        menu_items = list(MenuItem.objects.order_by('id').values_list('id', flat=True)[:options['items']])
+        if len(customers) < options['workers'] or not menu_items:
+            raise CommandError('Not enough seeded customers or menu items; run `manage.py seed_data` first.')
+
+        self.stdout.write(
+            f'workers={options["workers"]} checkouts/worker={options["checkouts"]} items/checkout={len(menu_items)}'
+        )
+        self.stdout.write(
+            f'{"profile":<15} {"orders/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"ok":>6} {"errors":>6}'
+        )
+        for profile in options['profiles'].split(','):
+            if profile not in PROFILES:
+                raise CommandError(f'Unknown profile {profile!r}; choose from {", ".join(PROFILES)}')
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                tokens = self.copy_database(str(database['NAME']), path, profile, customers)
+                results = self.spawn(profile, path, tokens, menu_items, options)
+            samples = [sample for result in results for sample in result['samples']]
+            errors = sum((Counter(result['errors']) for result in results), Counter())
+            elapsed = max(result['end'] for result in results) - min(result['start'] for result in results)
+            stats = summarize(samples)
+            self.stdout.write(
+                f'{profile:<15} {len(samples) / elapsed:>8.1f} {stats["p50"]:>6.1f}ms {stats["p95"]:>6.1f}ms '
+                f'{stats["p99"]:>6.1f}ms {len(samples):>6} {sum(errors.values()):>6}'
+                + (f'  {dict(errors)}' if errors else '')
+            )
+
+    def copy_database(self, source, path, profile, customers):
+        # The copy takes the writes; tokens are inserted directly since no
+        # Django connection points at it in this process.
+        with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+            src.backup(dst)
+        connection = sqlite3.connect(path, isolation_level=None)
+        try:
+            # WAL is a property of the file; the untuned profile uses the default journal.
+            connection.execute('PRAGMA journal_mode=%s' % ('WAL' if profile == 'sqlite' else 'DELETE'))
+            connection.execute('DELETE FROM authtoken_token WHERE user_id IN (%s)' % ','.join('?' * len(customers)), customers)
+            tokens = [binascii.hexlify(os.urandom(20)).decode() for _ in customers]
+            connection.executemany(
+                "INSERT INTO authtoken_token (key, created, user_id) VALUES (?, datetime('now'), ?)",
+                zip(tokens, customers),
+            )
+        finally:
+            connection.close()
+        return tokens
+
+    def spawn(self, profile, path, tokens, menu_items, options):
+        env = dict(
+            os.environ, LITTLELEMON_DB=profile, LITTLELEMON_SQLITE_PATH=path, LITTLELEMON_INSTRUMENTATION='0',
+            LITTLELEMON_THROTTLE='0',
+            # Stock Django has no retries either.
+            LITTLELEMON_DB_RETRIES='3' if profile == 'sqlite' else '0',
+        )
+        # Every worker starts at the same moment, once all have loaded Django.
+        start_at = time.time() + 2 + options['workers'] * 0.2
+        workers = [
+            subprocess.Popen(
+                [sys.executable, sys.argv[0], 'bench_concurrent_checkout', '--worker', '--token', token,
+                 '--menu-items', ','.join(map(str, menu_items)), '--checkouts', str(options['checkouts']),
+                 '--start-at', str(start_at)],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+            )
+            for token in tokens
+        ]
+        results = []
+        for worker in workers:
+            output, _ = worker.communicate()
+            if worker.returncode:
+                raise CommandError(f'A {profile} worker exited with {worker.returncode}')
+            results.extend(json.loads(line) for line in output.splitlines() if line.startswith('{'))
+        return results
+
+    # Worker process side.
+
+    def run_worker(self, options):
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+        token = options['token']
+
+        def call(method, path, data=None):
+            body = json.dumps(data).encode() if data is not None else b''
+            status = []
+            environ = {
+                'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_AUTHORIZATION': f'Token {token}', 'HTTP_ACCEPT': 'application/json',
+                'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+                'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+            }
+            response = application(environ, lambda s, headers: status.append(s))
+            b''.join(response)
+            response.close()
+            return int(status[0].split()[0])
+
+        menu_items = [int(pk) for pk in options['menu_items'].split(',')]
+        time.sleep(max(0.0, options['start_at'] - time.time()))
+        samples, errors = [], Counter()
+        start = time.time()
+        for _ in range(options['checkouts']):
+            begun = time.perf_counter()
+            statuses = [call('POST', '/api/cart/menu-items/', {'menuitem_id': pk, 'quantity': 1}) for pk in menu_items]
+            statuses.append(call('POST', '/api/orders/'))
+            failed = [code for code in statuses if code >= 300]
+            if failed:
+                errors[str(failed[0])] += 1
+                call('DELETE', '/api/cart/menu-items/')
+            else:
+                samples.append(time.perf_counter() - begun)
+        self.stdout.write(json.dumps({'samples': samples, 'errors': errors, 'start': start, 'end': time.time()}))
@@ -0,0 +1,108 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import dispatch
+from LittleLemonAPI.bench import rolled_back, summarize, timed
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order
+from LittleLemonAPI.permissions import DELIVERY_CREW
+from LittleLemonAPI.services import place_order
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate delivery crew assignment: the in-memory load index against a linear scan, '
+        'then checkouts and deliveries through the database followed by a rebalance. '
+        'All writes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crew', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=5000, help='Checkouts placed through the database.')
+        parser.add_argument('--ops', type=int, default=200000, help='Assignments in the in-memory simulation.')
+        parser.add_argument('--delivery-rate', type=float, default=0.8,
+                            help='Chance that an open order is delivered after each new order.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        self.simulate(rng, options)
+        try:
+            with rolled_back():
+                self.checkouts(rng, options)
+        finally:
+            dispatch.index.invalidate()
+
+    def simulate(self, rng, options):
+        crew = list(range(options['crew']))
+        index = dispatch.LoadIndex()
+        index.load(dict.fromkeys(crew, 0))
+        loads = dict.fromkeys(crew, 0)
+        open_orders = []
+        heap_time = scan_time = 0.0
+        for _ in range(options['ops']):
+            start = time.perf_counter()
+            crew_id, load = index.least_loaded()
+            index.set(crew_id, load + 1)
+            heap_time += time.perf_counter() - start
+            start = time.perf_counter()
+            chosen = min(loads, key=loads.get)
+            scan_time += time.perf_counter() - start
+            loads[chosen] += 1
+            open_orders.append(crew_id)
+            if open_orders and rng.random() < options['delivery_rate']:
+                delivered = open_orders.pop(rng.randrange(len(open_orders)))
+                index.add(delivered, -1)
+                loads[delivered] -= 1
+        final = index.loads()
+        ops = options['ops']
+        self.stdout.write(
+            f'in-memory: crew={len(crew)} assignments={ops} '
+            f'heap={heap_time / ops * 1e6:.2f}us/op scan={scan_time / ops * 1e6:.2f}us/op '
+            f'open per member {min(final.values())}-{max(final.values())}'
+        )
+
+    def checkouts(self, rng, options):
+        # Only the bench crew is active, so the spread below is theirs alone.
+        User.objects.filter(groups__name=DELIVERY_CREW).update(is_active=False)
+        group, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+        crew = User.objects.bulk_create([
+            User(username=f'bench-dispatch-crew-{n}') for n in range(options['crew'])
+        ])
+        group.user_set.add(*crew)
+        customer = User.objects.create(username='bench-dispatch-customer')
+        category = Category.objects.create(slug='bench-dispatch', title='Bench dispatch')
+        item = MenuItem.objects.create(title='Bench dispatch item', price=Decimal('10.00'), featured=False, category=category)
+        dispatch.refresh(force=True)
+
+        samples, open_orders = [], []
+        for _ in range(options['orders']):
+            Cart.objects.create(user=customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            elapsed, order = timed(place_order, customer)
+            samples.append(elapsed)
+            open_orders.append(order.id)
+            if rng.random() < options['delivery_rate']:
+                # Delivered through save(), as single_order does, so the index follows.
+                delivered = Order.objects.get(id=open_orders.pop(rng.randrange(len(open_orders))))
+                delivered.status = True
+                delivered.save()
+        stats = summarize(samples)
+        loads = dispatch.current_loads()
+        self.stdout.write(
+            f'checkout: orders={stats["n"]} p50={stats["p50"]:.2f}ms p95={stats["p95"]:.2f}ms '
+            f'p99={stats["p99"]:.2f}ms; open per member {min(loads.values())}-{max(loads.values())} '
+            f'(index says {min(dispatch.index.loads().values())}-{max(dispatch.index.loads().values())})'
+        )
+
+        # Skew: hand half of the open orders to one member, then rebalance. The
+        # open orders of the deactivated crew are reassigned too.
+        Order.objects.filter(id__in=open_orders[::2]).update(delivery_crew=crew[0])
+        skewed = dispatch.current_loads()
+        elapsed, moves = timed(dispatch.rebalance)
+        loads = dispatch.current_loads()
+        self.stdout.write(
+            f'rebalance: open orders={sum(loads.values())} per member {min(skewed.values())}-{max(skewed.values())} '
+            f'-> {min(loads.values())}-{max(loads.values())}, {len(moves)} moves in {elapsed * 1000:.1f}ms'
+        )
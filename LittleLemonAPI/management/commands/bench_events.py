@@ -0,0 +1,151 @@
+import asyncio
+import collections
+import gc
+import json
+import os
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI import events, seeding
+from LittleLemonAPI.bench import summarize
+
+# Streams opened at a time. Opening thousands at once measures the peak of
+# their requests in flight rather than what idle streams hold.
+CONNECT_BATCH = 50
+
+
+def rss_kb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many idle order event streams against the ASGI application in-process, '
+        'report the memory each one costs, then publish order events and report how long '
+        'they take to reach their subscribers. Needs seeded users: run seed_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000, help='Customer streams to open.')
+        parser.add_argument('--managers', type=int, default=10, help='Manager streams, which see every event.')
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--rate', type=int, default=500, help='Events published per second.')
+
+    def handle(self, *args, **options):
+        prefix = seeding.USERNAME_PREFIX
+        customers = list(User.objects.filter(username__startswith=f'{prefix}-customer-').order_by('id')[:options['subscribers']])
+        manager = User.objects.filter(username__startswith=f'{prefix}-manager-').order_by('id').first()
+        if not customers or manager is None:
+            raise CommandError('No seeded customers or managers; run `manage.py seed_data` first.')
+        tokens, created = {}, []
+        for user in customers + [manager]:
+            token, new = Token.objects.get_or_create(user=user)
+            tokens[user.id] = token.key
+            if new:
+                created.append(token.pk)
+        try:
+            asyncio.run(self.run(customers, manager, tokens, options))
+        finally:
+            Token.objects.filter(pk__in=created).delete()
+
+    async def run(self, customers, manager, tokens, options):
+        from LittleLemonAPI.handlers import get_asgi_application
+        application = get_asgi_application()
+        loop = asyncio.get_running_loop()
+        latencies, streams = [], []
+        received = {'events': 0, 'bytes': 0}
+
+        async def connect(user_id):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/api/orders/events/', 'raw_path': b'/api/orders/events/',
+                'query_string': b'', 'root_path': '', 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+                'headers': [(b'host', b'localhost'), (b'authorization', f'Token {tokens[user_id]}'.encode()),
+                            (b'accept', b'text/event-stream')],
+            }
+            started, gone = asyncio.Event(), asyncio.Event()
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await gone.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    if message['status'] != 200:
+                        raise CommandError(f'stream answered {message["status"]}')
+                    return
+                body = message.get('body', b'')
+                received['bytes'] += len(body)
+                if body.startswith(b'retry:'):
+                    started.set()
+                elif body.startswith(b'id:'):
+                    now = time.perf_counter()
+                    payload = json.loads(body.split(b'data: ', 1)[1])
+                    received['events'] += 1
+                    latencies.append(now - payload['sent'])
+
+            task = loop.create_task(application(scope, receive, send))
+            await started.wait()
+            streams.append((gone, task))
+
+        # Warm up the auth and role caches, then measure the streams alone.
+        await connect(manager.id)
+        gc.collect()
+        before, threads = rss_kb(), threading.active_count()
+        users = [customers[i % len(customers)].id for i in range(options['subscribers'])]
+        opened = time.perf_counter()
+        for batch in range(0, len(users), CONNECT_BATCH):
+            await asyncio.gather(*(connect(user_id) for user_id in users[batch:batch + CONNECT_BATCH]))
+        for _ in range(options['managers'] - 1):
+            await connect(manager.id)
+        elapsed = time.perf_counter() - opened
+        gc.collect()
+        after = rss_kb()
+        count = events.hub.subscriber_count()
+        self.stdout.write(
+            f'streams={count} opened in {elapsed:.1f}s; rss {before / 1024:.0f} -> {after / 1024:.0f} MB, '
+            f'{(after - before) / max(count - 1, 1):.1f} KB per stream, '
+            f'threads {threads} -> {threading.active_count()}'
+        )
+
+        per_user = collections.Counter(users)
+        expected = []
+
+        def publish():
+            # From another thread, as a sync view's on_commit callback would.
+            rng = random.Random(42)
+            now = timezone.now()
+            interval = 1 / options['rate']
+            for order_id in range(options['events']):
+                user_id = rng.choice(customers).id
+                expected.append(per_user[user_id] + options['managers'])
+                payload = events.order_payload(order_id, user_id, None, False, now)
+                payload['sent'] = time.perf_counter()
+                events.publish(payload)
+                time.sleep(interval)
+        await loop.run_in_executor(None, publish)
+        await asyncio.sleep(0.5)
+        stats = summarize(latencies)
+        self.stdout.write(
+            f'events={options["events"]} deliveries={received["events"]}/{sum(expected)} '
+            f'publish->send p50={stats["p50"]:.2f}ms p95={stats["p95"]:.2f}ms p99={stats["p99"]:.2f}ms'
+        )
+
+        closing = time.perf_counter()
+        for gone, _ in streams:
+            gone.set()
+        await asyncio.gather(*(task for _, task in streams))
+        self.stdout.write(
+            f'closed {len(streams)} streams in {time.perf_counter() - closing:.1f}s; '
+            f'{events.hub.subscriber_count()} subscribers left'
+        )
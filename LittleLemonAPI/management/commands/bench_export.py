@@ -0,0 +1,65 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import exports
+from LittleLemonAPI.bench import rolled_back
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure peak memory and throughput of the streaming order export. Rows are the records '
+        'written: one per order in ndjson, one per order item in csv. All writes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help='Comma separated order counts, e.g. 10000,100000,1000000.')
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--output', choices=sorted(exports.FORMATS), default='ndjson')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        per_order = options['items_per_order']
+        generate, _ = exports.FORMATS[options['output']]
+        with rolled_back():
+            category = Category.objects.create(slug='bench', title='Bench')
+            items = MenuItem.objects.bulk_create([
+                MenuItem(title=f'Bench item {i}', price=Decimal('2.50'), featured=False, category=category)
+                for i in range(per_order)
+            ])
+            user = User.objects.create(username='bench-export')
+            seeded = 0
+            for size in sizes:
+                while seeded < size:
+                    count = min(BATCH, size - seeded)
+                    orders = Order.objects.bulk_create([
+                        Order(user=user, total=Decimal('2.50') * per_order, status=False) for _ in range(count)
+                    ])
+                    OrderItem.objects.bulk_create([
+                        OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+                        for order in orders for item in items
+                    ])
+                    seeded += count
+                self.measure(Order.objects.filter(user=user), generate, 1 if options['output'] == 'csv' else 0)
+
+    def measure(self, orders, generate, header_rows):
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = rows = 0
+        for chunk in generate(orders):
+            written += len(chunk)
+            rows += 1
+        rows -= header_rows
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'rows={rows:<8} bytes={written:<11} time={elapsed:.2f}s '
+            f'rate={rows / elapsed:,.0f} rows/s peak_memory={peak / 1024:,.0f} KiB'
+        )
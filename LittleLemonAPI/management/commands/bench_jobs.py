@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from LittleLemonAPI import jobs
+from LittleLemonAPI.bench import rolled_back, summarize, timed
+from LittleLemonAPI.models import DeadJob, Job
+
+NAMES = ('bench.noop', 'bench.io')
+
+
+@jobs.handler('bench.noop')
+def noop():
+    pass
+
+
+@jobs.handler('bench.io', atomic=False)
+def io(seconds):
+    # Stands in for a job that waits on another service (mail, HTTP).
+    time.sleep(seconds)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the job queue: enqueue() latency inside a transaction, then how fast run_jobs '
+        'workers drain jobs that do nothing and jobs that wait --io-ms, per thread count. Queued '
+        'bench jobs are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000, help='Jobs queued for each run.')
+        parser.add_argument('--threads', default='1,4,8', help='Comma separated worker pool sizes.')
+        parser.add_argument('--io-ms', type=float, default=20)
+        parser.add_argument('--repeat', type=int, default=500, help='enqueue() calls timed.')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            samples = [timed(jobs.enqueue, 'bench.noop')[0] for _ in range(options['repeat'])]
+        stats = summarize(samples)
+        self.stdout.write(
+            f"enqueue n={stats['n']} mean={stats['mean']:.3f}ms p50={stats['p50']:.3f}ms "
+            f"p95={stats['p95']:.3f}ms p99={stats['p99']:.3f}ms"
+        )
+        self.stdout.write(f'{"job":<10} {"threads":>7} {"jobs":>6} {"jobs/s":>9} {"seconds":>8}')
+        try:
+            for name, payload in (('bench.noop', {}), ('bench.io', {'seconds': options['io_ms'] / 1000})):
+                for threads in [int(t) for t in options['threads'].split(',')]:
+                    # The slow job gets fewer jobs so that one thread finishes in a few seconds.
+                    count = options['jobs'] if name == 'bench.noop' else min(options['jobs'], 200 * threads)
+                    Job.objects.bulk_create(
+                        [Job(name=name, payload=payload, run_at=timezone.now()) for _ in range(count)],
+                        batch_size=500,
+                    )
+                    worker = jobs.Worker(threads=threads, names=[name])
+                    started = time.perf_counter()
+                    counts = worker.run(once=True)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{name:<10} {threads:>7} {counts["done"]:>6} {counts["done"] / elapsed:>9.0f} {elapsed:>8.2f}'
+                    )
+        finally:
+            Job.objects.filter(name__in=NAMES).delete()
+            DeadJob.objects.filter(name__in=NAMES).delete()
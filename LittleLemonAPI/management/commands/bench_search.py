@@ -0,0 +1,61 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI import search
+from LittleLemonAPI.bench import rolled_back, summarize, timed
+from LittleLemonAPI.models import Category, MenuItem
+
+WORDS = (
+    'lemon', 'greek', 'salad', 'grilled', 'chicken', 'lamb', 'souvlaki', 'feta', 'olive', 'bruschetta',
+    'tomato', 'basil', 'garlic', 'bread', 'hummus', 'falafel', 'pita', 'moussaka', 'spinach', 'pie',
+    'baklava', 'honey', 'yogurt', 'orange', 'cake', 'octopus', 'shrimp', 'saganaki', 'rice', 'pilaf',
+)
+QUERIES = ('le', 'lem', 'lemon', 'greek sal', 'grilled chicken', 'ch', 'baklava honey', 'fal', 'desserts', 'zzz')
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Measure menu search latency over a synthetic menu. All writes are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild the index after loading, instead of searching the trigger-built segments.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with rolled_back():
+            categories = Category.objects.bulk_create([
+                Category(slug=f'bench-search-{name}', title=name.title())
+                for name in ('starters', 'mains', 'desserts', 'drinks', 'sides')
+            ])
+            for start in range(0, options['items'], BATCH):
+                MenuItem.objects.bulk_create([
+                    MenuItem(title=' '.join(rng.sample(WORDS, 3)).title() + f' {start + n}',
+                             price=Decimal(rng.randint(100, 4000)) / 100, featured=False,
+                             category=rng.choice(categories))
+                    for n in range(min(BATCH, options['items'] - start))
+                ])
+            if options['rebuild']:
+                elapsed, _ = timed(search.rebuild)
+                self.stdout.write(f'rebuilt and optimized the index in {elapsed:.2f}s')
+            self.stdout.write(f'items={options["items"]} iterations={options["iterations"]} limit={options["limit"]}')
+            worst = 0.0
+            for query in QUERIES:
+                samples = []
+                for _ in range(options['iterations']):
+                    elapsed, ids = timed(search.search, query, options['limit'])
+                    samples.append(elapsed)
+                summary = summarize(samples)
+                worst = max(worst, summary['p95'])
+                self.stdout.write(
+                    f'{query!r:<18} hits={len(ids):<3} p50={summary["p50"]:.2f}ms '
+                    f'p95={summary["p95"]:.2f}ms p99={summary["p99"]:.2f}ms'
+                )
+            if not MenuItem.objects.filter(id__in=search.search('lemon', 1), title__icontains='lemon').exists():
+                raise CommandError('search index is not in sync with the inserted items')
+        self.stdout.write(self.style.SUCCESS(f'worst p95 {worst:.2f}ms'))
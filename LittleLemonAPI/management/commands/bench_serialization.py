@@ -0,0 +1,87 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from LittleLemonAPI import fastpaths
+from LittleLemonAPI.bench import rolled_back, summarize, timed
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+from LittleLemonAPI.renderers import FastJSONRenderer, orjson
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderSerializer
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare DRF serializers with the fast read path on large menu item and order '
+        'lists, checking that both produce the same bytes. All writes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        self.stdout.write(f'rows={rows} repeat={repeat} orjson={"yes" if orjson else "no"}')
+        with rolled_back():
+            user = self.seed(rows)
+            menu = MenuItem.objects.filter(category__slug__startswith='bench-serialization-').order_by('id')
+            orders = Order.objects.filter(user=user).order_by('-date', '-id')
+            self.compare(
+                'menu items', repeat,
+                lambda: JSONRenderer().render(MenuItemSerializer(menu.for_serializer(), many=True).data),
+                lambda: FastJSONRenderer().render(self.fast(fastpaths.menu_items, menu)),
+            )
+            self.compare(
+                'orders', repeat,
+                lambda: JSONRenderer().render(OrderSerializer(orders.for_serializer(), many=True).data),
+                lambda: FastJSONRenderer().render(self.fast(fastpaths.orders, orders)),
+            )
+
+    def seed(self, rows):
+        rng = random.Random(42)
+        categories = Category.objects.bulk_create([
+            Category(slug=f'bench-serialization-{n}', title=f'Bench \u00e9 {n}') for n in range(20)
+        ])
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Bench item {n}', price=Decimal(rng.randint(100, 4000)) / 100,
+                     featured=rng.random() < 0.1, category=rng.choice(categories))
+            for n in range(rows)
+        ], batch_size=BATCH)
+        user = User.objects.create(username='bench-serialization')
+        orders = Order.objects.bulk_create([
+            Order(user=user, total=Decimal('0'), status=rng.random() < 0.5) for _ in range(rows)
+        ], batch_size=BATCH)
+        lines = []
+        for order in orders:
+            for item in rng.sample(items, 3):
+                quantity = rng.randint(1, 4)
+                lines.append(OrderItem(order=order, menuitem=item, quantity=quantity,
+                                       unit_price=item.price, price=item.price * quantity))
+        OrderItem.objects.bulk_create(lines, batch_size=BATCH)
+        return user
+
+    def fast(self, path, queryset):
+        rows, data = path(queryset)
+        return data(list(rows))
+
+    def compare(self, label, repeat, drf, fast):
+        results = {}
+        for name, build in (('drf', drf), ('fast', fast)):
+            samples = []
+            for _ in range(repeat):
+                elapsed, body = timed(build)
+                samples.append(elapsed)
+            results[name] = (summarize(samples), body)
+        if results['drf'][1] != results['fast'][1]:
+            raise CommandError(f'{label}: fast path output differs from the DRF serializers')
+        for name, (summary, body) in results.items():
+            self.stdout.write(
+                f'{label:<10} {name:<4} p50={summary["p50"]:8.1f}ms mean={summary["mean"]:8.1f}ms bytes={len(body)}'
+            )
+        speedup = results['drf'][0]['p50'] / results['fast'][0]['p50']
+        self.stdout.write(self.style.SUCCESS(f'{label:<10} identical output, {speedup:.1f}x faster'))
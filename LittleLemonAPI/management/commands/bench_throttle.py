@@ -0,0 +1,96 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI.bench import rolled_back, summarize
+from LittleLemonAPI.permissions import MANAGER
+from LittleLemonAPI.throttling import ThrottleMiddleware
+
+RULES = [('api', '/api/', '*', {'anon': '1000000/s', 'customer': '1000000/s', 'manager': '1000000/s'})]
+
+
+def respond(request):
+    return HttpResponse()
+
+
+async def arespond(request):
+    return HttpResponse()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the time ThrottleMiddleware adds to a request, in microseconds, for each '
+        'bucket backend, sync and async, and kind of caller. Limits are set high enough that '
+        'nothing is refused. The cache backend uses the default cache, LocMemCache unless '
+        'configured otherwise; a networked cache adds its round trips.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with rolled_back():
+            customer = User.objects.create(username='bench-throttle-customer')
+            manager = User.objects.create(username='bench-throttle-manager')
+            manager.groups.add(Group.objects.get_or_create(name=MANAGER)[0])
+            requests = {
+                'not limited': factory.get('/static/app.css'),
+                'anonymous': factory.get('/api/menu-items/'),
+                'customer token': factory.get(
+                    '/api/menu-items/', HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=customer).key,
+                ),
+                'manager token': factory.get(
+                    '/api/menu-items/', HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=manager).key,
+                ),
+            }
+            # As AuthenticationMiddleware would set them, without a session.
+            for request in requests.values():
+                request.user = AnonymousUser()
+                request.auser = self.anonymous
+            self.stdout.write(f'{"backend":<7} {"mode":<5} {"caller":<15} {"mean":>8} {"p50":>8} {"p99":>8}')
+            self.report('-', 'sync', 'no middleware', self.measure(respond, requests['anonymous'], options['repeat']))
+            for backend in ('local', 'cache'):
+                with override_settings(LITTLELEMON_THROTTLE_RULES=RULES, LITTLELEMON_THROTTLE_BACKEND=backend):
+                    cache.clear()
+                    middleware = ThrottleMiddleware(respond)
+                    amiddleware = ThrottleMiddleware(arespond)
+                    for caller, request in requests.items():
+                        self.report(backend, 'sync', caller, self.measure(middleware, request, options['repeat']))
+                        self.report(backend, 'async', caller, self.ameasure(amiddleware, request, options['repeat']))
+
+    async def anonymous(self):
+        return AnonymousUser()
+
+    def measure(self, middleware, request, repeat):
+        middleware(request)  # warm the token and role caches
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            middleware(request)
+            samples.append(time.perf_counter() - started)
+        return summarize(samples)
+
+    @async_to_sync
+    async def ameasure(self, middleware, request, repeat):
+        await middleware(request)
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await middleware(request)
+            samples.append(time.perf_counter() - started)
+        return summarize(samples)
+
+    def report(self, backend, mode, caller, stats):
+        # summarize() is in milliseconds.
+        self.stdout.write(
+            f'{backend:<7} {mode:<5} {caller:<15} {stats["mean"] * 1000:>6.1f}us '
+            f'{stats["p50"] * 1000:>6.1f}us {stats["p99"] * 1000:>6.1f}us'
+        )
@@ -0,0 +1,269 @@
+import json
+import platform
+import subprocess
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from LittleLemonAPI import seeding
+from LittleLemonAPI.bench import rolled_back, summarize
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order
+from LittleLemonAPI.permissions import DELIVERY_CREW, MANAGER
+
+
+class Scenario:
+    """One route + method, driven as `role`. `setup(context)` runs untimed before each request."""
+
+    def __init__(self, name, role, method, url, data=None, setup=None, expect=(200,)):
+        self.name = name
+        self.role = role
+        self.method = method
+        self.url = url
+        self.data = data
+        self.setup = setup
+        self.expect = expect
+
+
+def _fill_cart(context, size=3):
+    Cart.objects.filter(user=context['customer']).delete()
+    Cart.objects.bulk_create([
+        Cart(user=context['customer'], menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        for item in context['menu'][:size]
+    ])
+
+
+def _new_menu_item(context):
+    item = MenuItem.objects.create(title='Benchmark item', price=Decimal('1.00'), featured=False,
+                                   category=context['category'])
+    context['menuitem'] = item.id
+
+
+def _new_order(context):
+    order = Order.objects.create(user=context['customer'], total=Decimal('1.00'))
+    context['doomed_order'] = order.id
+
+
+def _clear_cart(context):
+    Cart.objects.filter(user=context['customer']).delete()
+
+
+def _add_to_group(group_name):
+    def setup(context):
+        context['groups'][group_name].user_set.add(context['spare'])
+    return setup
+
+
+SCENARIOS = [
+    Scenario('auth.token_login', None, 'post', '/auth/token/login/',
+             data=lambda c: {'username': c['customer'].username, 'password': seeding.PASSWORD}),
+    Scenario('auth.users_me', 'customer', 'get', '/auth/users/me/'),
+    Scenario('menu.list', 'customer', 'get', '/api/menu-items/'),
+    Scenario('menu.list_filtered', 'customer', 'get',
+             lambda c: f"/api/menu-items/?category={c['category'].id}&ordering=-price&page_size=50"),
+    Scenario('menu.detail', 'customer', 'get', lambda c: f"/api/menu-items/{c['menu'][0].id}/"),
+    Scenario('menu.create', 'manager', 'post', '/api/menu-items/', expect=(201,),
+             data=lambda c: {'title': 'Benchmark item', 'price': '4.50', 'category_id': c['category'].id}),
+    Scenario('menu.update', 'manager', 'patch', lambda c: f"/api/menu-items/{c['menu'][1].id}/",
+             data={'featured': True}),
+    Scenario('menu.delete', 'manager', 'delete', lambda c: f"/api/menu-items/{c['menuitem']}/",
+             setup=_new_menu_item),
+    Scenario('catalog.cache_stats', 'manager', 'get', '/api/catalog/cache-stats/'),
+    Scenario('groups.managers', 'manager', 'get', '/api/groups/manager/users/'),
+    Scenario('groups.manager_add', 'manager', 'post', '/api/groups/manager/users/', expect=(201,),
+             data=lambda c: {'username': c['spare'].username}),
+    Scenario('groups.manager_remove', 'manager', 'delete', lambda c: f"/api/groups/manager/users/{c['spare'].id}/",
+             setup=_add_to_group(MANAGER)),
+    Scenario('groups.crew', 'manager', 'get', '/api/groups/delivery-crew/users/'),
+    Scenario('groups.crew_add', 'manager', 'post', '/api/groups/delivery-crew/users/', expect=(201,),
+             data=lambda c: {'username': c['spare'].username}),
+    Scenario('groups.crew_remove', 'manager', 'delete',
+             lambda c: f"/api/groups/delivery-crew/users/{c['spare'].id}/", setup=_add_to_group(DELIVERY_CREW)),
+    Scenario('cart.list', 'customer', 'get', '/api/cart/menu-items/', setup=_fill_cart),
+    Scenario('cart.add', 'customer', 'post', '/api/cart/menu-items/', expect=(201,), setup=_clear_cart,
+             data=lambda c: {'menuitem_id': c['menu'][0].id, 'quantity': 2}),
+    Scenario('cart.clear', 'customer', 'delete', '/api/cart/menu-items/', setup=_fill_cart),
+    Scenario('orders.list_customer', 'customer', 'get', '/api/orders/'),
+    Scenario('orders.list_crew', 'crew', 'get', '/api/orders/'),
+    Scenario('orders.list_manager', 'manager', 'get', '/api/orders/'),
+    Scenario('orders.list_manager_filtered', 'manager', 'get', '/api/orders/?status=0&page_size=50'),
+    Scenario('orders.checkout', 'customer', 'post', '/api/orders/', expect=(201,), setup=_fill_cart),
+    Scenario('orders.detail', 'customer', 'get', lambda c: f"/api/orders/{c['order'].id}/"),
+    Scenario('orders.assign_crew', 'manager', 'patch', lambda c: f"/api/orders/{c['order'].id}/",
+             data=lambda c: {'delivery_crew': c['crew'].id}),
+    Scenario('orders.delete', 'manager', 'delete', lambda c: f"/api/orders/{c['doomed_order']}/",
+             setup=_new_order),
+    Scenario('orders.export_month', 'manager', 'get',
+             lambda c: f"/api/orders/export/?date_from={c['month_ago']}"),
+    Scenario('reports.revenue_by_day', 'manager', 'get', '/api/reports/revenue-by-day/'),
+    Scenario('reports.top_items', 'manager', 'get', '/api/reports/top-items/'),
+    Scenario('reports.crew_deliveries', 'manager', 'get', '/api/reports/crew-deliveries/'),
+    Scenario('auth.token_logout', 'throwaway', 'post', '/auth/token/logout/', expect=(204,)),
+]
+
+
+def _resolve(value, context):
+    return value(context) if callable(value) else value
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every API route and djoser auth in-process through the test client and report '
+        'p50/p95/p99 latency, queries per request and throughput. Run `seed_data` first; '
+        'all writes made by the benchmark are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--only', help='Comma separated scenario name prefixes.')
+        parser.add_argument('--save', help='Write results as a JSON baseline to this path.')
+        parser.add_argument('--compare', help='Diff results against a JSON baseline at this path.')
+        parser.add_argument('--instrumentation', choices=['on', 'off'],
+                            help='Force the instrumentation middleware on or off, to measure its overhead.')
+        parser.add_argument('--fail-over', type=float, default=None,
+                            help='Exit non-zero if any p50 is this many percent slower than the baseline '
+                                 'or any route runs more queries.')
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['only']:
+            prefixes = tuple(options['only'].split(','))
+            scenarios = [scenario for scenario in scenarios if scenario.name.startswith(prefixes)]
+        results = {}
+        # Every request of a scenario comes from the same few users; bench_throttle
+        # measures the rate limits on their own.
+        overrides = {'LITTLELEMON_THROTTLE': False}
+        if options['instrumentation']:
+            overrides['LITTLELEMON_INSTRUMENTATION'] = options['instrumentation'] == 'on'
+        with rolled_back(), override_settings(**overrides):
+            context = self.context()
+            clients = {role: self.login(context[role]) for role in ('customer', 'crew', 'manager')}
+            clients[None] = APIClient(SERVER_NAME='localhost')
+            for scenario in scenarios:
+                results[scenario.name] = self.run(scenario, context, clients, options)
+                self.report(scenario.name, results[scenario.name])
+
+        report = {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'instrumentation': options['instrumentation'],
+            'results': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline written to {options['save']}")
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+            regressions = self.compare(baseline, results, options['fail_over'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+
+    def context(self):
+        prefix = seeding.USERNAME_PREFIX
+        customer = (
+            User.objects.filter(username__startswith=f'{prefix}-customer-', order__isnull=False)
+            .order_by('id').first()
+        )
+        crew = User.objects.filter(username__startswith=f'{prefix}-crew-').order_by('id').first()
+        manager = User.objects.filter(username__startswith=f'{prefix}-manager-').order_by('id').first()
+        if not (customer and crew and manager):
+            raise CommandError('No seeded users found, run `manage.py seed_data` first.')
+        category = Category.objects.filter(menuitem__isnull=False).first()
+        return {
+            'customer': customer,
+            'crew': crew,
+            'manager': manager,
+            'throwaway': User.objects.create_user('benchmark-throwaway', password=seeding.PASSWORD),
+            'spare': User.objects.create_user('benchmark-spare'),
+            'groups': {group.name: group for group in Group.objects.filter(name__in=[MANAGER, DELIVERY_CREW])},
+            'category': category,
+            'menu': list(MenuItem.objects.filter(category=category).order_by('id')[:10]),
+            'order': Order.objects.filter(user=customer).order_by('-id').first(),
+            'month_ago': (date.today() - timedelta(days=30)).isoformat(),
+        }
+
+    def login(self, user):
+        client = APIClient(SERVER_NAME='localhost')
+        response = client.post('/auth/token/login/', {'username': user.username, 'password': seeding.PASSWORD},
+                               format='json')
+        if response.status_code != 200:
+            raise CommandError(f'Could not log in as {user.username}: {response.content!r}')
+        client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['auth_token'])
+        return client
+
+    def request(self, scenario, context, clients):
+        if scenario.setup:
+            scenario.setup(context)
+        if scenario.role == 'throwaway':
+            client = self.login(context['throwaway'])
+        else:
+            client = clients[scenario.role]
+        url = _resolve(scenario.url, context)
+        data = _resolve(scenario.data, context)
+        start = time.perf_counter()
+        response = getattr(client, scenario.method)(url, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+        if response.status_code not in scenario.expect:
+            raise CommandError(f'{scenario.name}: {scenario.method.upper()} {url} returned '
+                               f'{response.status_code}: {response.content[:200]!r}')
+        return elapsed, response
+
+    def run(self, scenario, context, clients, options):
+        for _ in range(options['warmup']):
+            self.request(scenario, context, clients)
+        with CaptureQueriesContext(connection) as captured:
+            self.request(scenario, context, clients)
+        queries = len(captured.captured_queries)
+        samples = []
+        sizes = []
+        for _ in range(options['iterations']):
+            elapsed, response = self.request(scenario, context, clients)
+            samples.append(elapsed)
+            sizes.append(len(b''.join(response.streaming_content)) if response.streaming else len(response.content))
+        stats = summarize(samples)
+        stats['queries'] = queries
+        stats['throughput'] = len(samples) / sum(samples) if samples else 0.0
+        stats['bytes'] = max(sizes) if sizes else 0
+        return stats
+
+    def report(self, name, stats):
+        self.stdout.write(
+            f"{name:<32} p50={stats['p50']:7.2f}ms p95={stats['p95']:7.2f}ms p99={stats['p99']:7.2f}ms "
+            f"queries={stats['queries']:<3} {stats['throughput']:8.1f} req/s"
+        )
+
+    def compare(self, baseline, results, fail_over):
+        regressions = []
+        self.stdout.write(f"\nCompared with baseline {baseline.get('revision')}:")
+        for name, stats in results.items():
+            before = baseline['results'].get(name)
+            if before is None:
+                self.stdout.write(f'{name:<32} (new)')
+                continue
+            change = (stats['p50'] - before['p50']) / before['p50'] * 100 if before['p50'] else 0.0
+            queries = stats['queries'] - before['queries']
+            self.stdout.write(f'{name:<32} p50 {change:+6.1f}%  queries {queries:+d}')
+            if fail_over is not None and (change > fail_over or queries > 0):
+                regressions.append(f'{name}: p50 {change:+.1f}%, queries {queries:+d}')
+        return regressions
@@ -0,0 +1,12 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the query plan tests (LittleLemonAPI.test_query_plans): seed a test database, '
+        'EXPLAIN every endpoint query and fail if a hot table is fully scanned.'
+    )
+
+    def handle(self, *args, **options):
+        call_command('test', 'LittleLemonAPI.test_query_plans', verbosity=options['verbosity'])
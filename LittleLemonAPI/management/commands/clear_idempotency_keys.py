@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.idempotency import expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than LITTLELEMON_IDEMPOTENCY_TTL.'
+
+    def handle(self, *args, **options):
+        deleted, _ = expired().delete()
+        self.stdout.write(f'Deleted {deleted} expired idempotency keys.')
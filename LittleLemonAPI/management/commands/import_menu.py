@@ -0,0 +1,69 @@
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Create menu items from a CSV file (header: title,price,featured,category_id or category) '
+        'or a JSON list of objects with the same keys. `category` is a category slug. The whole '
+        'file is validated first; nothing is imported if any row is invalid.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file, '-' for stdin.")
+        parser.add_argument('--format', choices=('csv', 'json'), help='Default: from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE, help='Rows per INSERT.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only.')
+        parser.add_argument('--max-errors', type=int, default=20, help='Invalid rows to list.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.endswith('.json') else 'csv')
+        started = time.perf_counter()
+        rows = self.read(path, fmt)
+        try:
+            if options['dry_run']:
+                bulk.validate(rows)
+                count = 0
+            else:
+                count = len(bulk.create_items(rows, batch_size=options['batch_size']))
+        except bulk.BulkError as exc:
+            # CSV line numbers count the header.
+            offset = 2 if fmt == 'csv' else 0
+            label = 'line' if fmt == 'csv' else 'item'
+            for error in exc.errors[:options['max_errors']]:
+                messages = '; '.join(
+                    f'{field}: {" ".join(str(message) for message in problems)}'
+                    for field, problems in error['errors'].items()
+                )
+                self.stderr.write(f'{label} {error["index"] + offset}: {messages}')
+            raise CommandError(f'{len(exc.errors)} of {len(rows)} rows are invalid; nothing was imported.')
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            self.stdout.write(f'{len(rows)} rows are valid ({elapsed:.2f}s).')
+        else:
+            self.stdout.write(f'Imported {count} menu items in {elapsed:.2f}s.')
+
+    def read(self, path, fmt):
+        try:
+            source = sys.stdin if path == '-' else Path(path).open(newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        with source:
+            if fmt == 'csv':
+                # Empty cells are treated as missing, so that defaults apply.
+                return [{key: value for key, value in row.items() if value != ''} for row in csv.DictReader(source)]
+            try:
+                rows = json.load(source)
+            except ValueError as exc:
+                raise CommandError(f'Invalid JSON: {exc}')
+        if not isinstance(rows, list):
+            raise CommandError('The JSON file must hold a list of menu items.')
+        return rows
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        'Give every open order without an active delivery crew member to the least loaded '
+        'member, then move open orders from the most to the least loaded members until their '
+        'loads differ by at most one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-moves', type=int, help='Stop after reassigning this many orders.')
+        parser.add_argument('--dry-run', action='store_true', help='Report the moves without saving them.')
+
+    def handle(self, *args, **options):
+        before = dispatch.current_loads()
+        moves = dispatch.rebalance(max_moves=options['max_moves'], dry_run=options['dry_run'])
+        if not before:
+            self.stdout.write('There is no active delivery crew.')
+            return
+        after = dict(before)
+        for _, source, target in moves:
+            if source in after:
+                after[source] -= 1
+            after[target] += 1
+        unassigned = sum(1 for _, source, _ in moves if source not in before)
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(
+            f'{verb} {len(moves)} open orders ({unassigned} without active crew) across {len(before)} '
+            f'crew members; open orders per member {min(before.values())}-{max(before.values())} '
+            f'-> {min(after.values())}-{max(after.values())}.'
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import rollups
+from LittleLemonAPI.models import DailyCrewDeliveries, DailySales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DailySales and DailyCrewDeliveries reporting rollups from scratch.'
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        self.stdout.write(
+            f'Rebuilt {DailySales.objects.count()} sales rows and '
+            f'{DailyCrewDeliveries.objects.count()} crew delivery rows.'
+        )
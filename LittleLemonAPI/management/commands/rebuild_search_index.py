@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from LittleLemonAPI import catalog, search
+
+
+class Command(BaseCommand):
+    help = 'Reinstall the menu search index and its triggers and reindex every menu item.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = search.rebuild()
+            transaction.on_commit(catalog.bump_version)
+        self.stdout.write(f'Reindexed {count} menu items.')
@@ -0,0 +1,35 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (LittleLemonAPI/jobs.py) until stopped. Start several to '
+        'use more processes; each claims its own batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'LITTLELEMON_JOBS_THREADS', 4))
+        parser.add_argument('--batch-size', type=int, help='Jobs claimed at a time; default 10 per thread.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when no job is due.')
+        parser.add_argument('--only', help='Comma separated job names to run; default all.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--retry-dead', action='store_true', help='Queue every dead job again and exit.')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f'Queued {jobs.retry_dead()} dead jobs again.')
+            return
+        worker = jobs.Worker(
+            threads=options['threads'], batch_size=options['batch_size'], poll=options['poll'],
+            names=options['only'].split(',') if options['only'] else None,
+        )
+        # Finish the jobs already claimed, then exit.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        counts = worker.run(once=options['once'])
+        self.stdout.write(', '.join(f'{count} {outcome}' for outcome, count in counts.items()))
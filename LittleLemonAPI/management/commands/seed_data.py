@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from LittleLemonAPI import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic categories, menu items, users, crew, orders and carts '
+        f'using bulk inserts. Seeded users log in with the password "{seeding.PASSWORD}". '
+        'Refuses to run twice unless --reset deletes the earlier seeded data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--menu-items', type=int, default=2000)
+        parser.add_argument('--customers', type=int, default=100000)
+        parser.add_argument('--crew', type=int, default=200)
+        parser.add_argument('--managers', type=int, default=5)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--max-items-per-order', type=int, default=5)
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=730, help='Spread order dates over this many days.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reset', action='store_true', help='Delete previously seeded data first.')
+
+    def check_options(self, options):
+        for name in ('categories', 'menu_items', 'customers', 'crew', 'managers', 'orders', 'carts'):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if options['max_items_per_order'] < 1 or options['days'] < 1:
+            raise CommandError('--max-items-per-order and --days must be at least 1.')
+        if options['menu_items'] and not options['categories']:
+            raise CommandError('Menu items need at least one category.')
+        if (options['orders'] or options['carts']) and not (options['customers'] and options['menu_items']):
+            raise CommandError('Orders and carts need at least one customer and one menu item.')
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+        with transaction.atomic():
+            if options['reset']:
+                seeding.clear(log=self.stdout.write)
+            elif seeding.seeded_users().exists():
+                raise CommandError('The database already holds seeded data; pass --reset to replace it.')
+            counts = seeding.seed(
+                categories=options['categories'],
+                menu_items=options['menu_items'],
+                customers=options['customers'],
+                crew=options['crew'],
+                managers=options['managers'],
+                orders=options['orders'],
+                max_items_per_order=options['max_items_per_order'],
+                carts=options['carts'],
+                days=options['days'],
+                seed=options['seed'],
+                log=self.stdout.write,
+            )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
@@ -0,0 +1,37 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite database to the stand-in read replica at LITTLELEMON_SQLITE_REPLICA_PATH, '
+        'once or every --interval seconds, which is then the replica\'s lag. For local testing of '
+        'replica routing; real replicas are kept up to date by the database server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Seconds between copies; 0 copies once.')
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES['default']
+        replica = getattr(settings, 'LITTLELEMON_SQLITE_REPLICA_PATH', None)
+        if database['ENGINE'] != 'django.db.backends.sqlite3' or not replica:
+            raise CommandError('Set LITTLELEMON_SQLITE_REPLICA_PATH and use an SQLite primary.')
+        while True:
+            started = time.perf_counter()
+            # The backup API copies a consistent snapshot while the primary is
+            # in use; readers of the replica keep theirs until it is replaced.
+            source = sqlite3.connect(str(database['NAME']))
+            target = sqlite3.connect(replica, timeout=20)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(f'{time.strftime("%H:%M:%S")} copied to {replica} in {(time.perf_counter() - started) * 1000:.0f}ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,103 @@
+from django.db import migrations
+
+# The search index as of this migration: an FTS5 table kept in sync by triggers
+# on SQLite, GIN indexes on PostgreSQL. Frozen here rather than imported from
+# search.py, which may change after this migration has run. {menu} and
+# {category} are the quoted tables of the historical models.
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS littlelemonapi_menuitem_search USING fts5(
+        title, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO littlelemonapi_menuitem_search (littlelemonapi_menuitem_search, rank)
+    VALUES ('rank', 'bm25(10.0, 2.0)')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_insert AFTER INSERT ON {menu} BEGIN
+        INSERT INTO littlelemonapi_menuitem_search (rowid, title, category)
+        SELECT new.id, new.title, title FROM {category} WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_update
+    AFTER UPDATE OF title, category_id ON {menu} BEGIN
+        DELETE FROM littlelemonapi_menuitem_search WHERE rowid = old.id;
+        INSERT INTO littlelemonapi_menuitem_search (rowid, title, category)
+        SELECT new.id, new.title, title FROM {category} WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_delete AFTER DELETE ON {menu} BEGIN
+        DELETE FROM littlelemonapi_menuitem_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_category_search_update
+    AFTER UPDATE OF title ON {category} BEGIN
+        UPDATE littlelemonapi_menuitem_search SET category = new.title
+        WHERE rowid IN (SELECT id FROM {menu} WHERE category_id = new.id);
+    END
+    """,
+    # Index the menu items that already exist.
+    """
+    INSERT INTO littlelemonapi_menuitem_search (rowid, title, category)
+    SELECT m.id, m.title, c.title FROM {menu} m
+    INNER JOIN {category} c ON c.id = m.category_id
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS littlelemonapi_category_search_update',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_delete',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_update',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_insert',
+    'DROP TABLE IF EXISTS littlelemonapi_menuitem_search',
+]
+
+POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS menuitem_title_search_idx ON {menu} "
+    "USING gin (to_tsvector('simple', title))",
+    "CREATE INDEX IF NOT EXISTS category_title_search_idx ON {category} "
+    "USING gin (to_tsvector('simple', title))",
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS category_title_search_idx',
+    'DROP INDEX IF EXISTS menuitem_title_search_idx',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_UNINSTALL),
+}
+
+
+def _execute(apps, schema_editor, index):
+    names = {
+        'menu': schema_editor.quote_name(apps.get_model('LittleLemonAPI', 'MenuItem')._meta.db_table),
+        'category': schema_editor.quote_name(apps.get_model('LittleLemonAPI', 'Category')._meta.db_table),
+    }
+    # Other backends have no index; search.py falls back to LIKE there.
+    for sql in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[index]:
+        schema_editor.execute(sql.format(**names))
+
+
+def install(apps, schema_editor):
+    _execute(apps, schema_editor, 0)
+
+
+def uninstall(apps, schema_editor):
+    _execute(apps, schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
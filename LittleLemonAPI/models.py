@@ -1,6 +1,42 @@
 # LittleLemonAPI/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+
+# QuerySets used by the views so that serializing a list costs a constant
+# number of queries, whatever the number of rows. `selection` is a
+# fieldsets.Selection; relations it does not return as objects are not loaded.
+class MenuItemQuerySet(models.QuerySet):
+    def for_serializer(self, selection=None):
+        if selection is None or selection.loads('category'):
+            return self.select_related('category')
+        return self
+
+def _with_menuitem(queryset, selection):
+    # Cart and OrderItem rows both nest menuitem -> category.
+    if selection is None:
+        return queryset.select_related('menuitem__category')
+    if not selection.loads('menuitem'):
+        return queryset
+    if selection.child('menuitem').loads('category'):
+        return queryset.select_related('menuitem__category')
+    return queryset.select_related('menuitem')
+
+class CartQuerySet(models.QuerySet):
+    def for_serializer(self, selection=None):
+        return _with_menuitem(self, selection)
+
+class OrderQuerySet(models.QuerySet):
+    def for_serializer(self, selection=None):
+        if selection is None or selection.loads('order_items'):
+            items = selection.child('order_items') if selection else None
+            return self.prefetch_related(
+                models.Prefetch('order_items', queryset=_with_menuitem(OrderItem.objects.all(), items))
+            )
+        if selection.includes('order_items'):
+            # Collapsed to a list of ids.
+            return self.prefetch_related(models.Prefetch('order_items', queryset=OrderItem.objects.only('id', 'order')))
+        return self
 
 class Category(models.Model):
     slug = models.SlugField()
@@ -14,6 +50,15 @@ class MenuItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MenuItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # ?category=...&ordering=price keyset pages
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} ID: ({self.id})'
@@ -24,9 +69,13 @@ class Cart(models.Model):
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price = models.DecimalField(max_digits=6, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
 
     class Meta:
-        unique_together = ('menuitem', 'user')
+        # user first: carts are always looked up by user
+        unique_together = ('user', 'menuitem')
 
     def __str__(self):
         return f"{self.quantity} x {self.menuitem.title} by {self.user}"
@@ -37,12 +86,40 @@ class Order(models.Model):
     status = models.BooleanField(db_index=True, default=0)  # 0: Out for delivery, 1: Delivered
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True, auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # customer order list: user=..., ordered by -date, -id
+            models.Index(fields=['user', 'date', 'id'], name='order_user_date_idx'),
+            # crew order list: delivery_crew=..., ordered by -date, -id
+            models.Index(fields=['delivery_crew', 'date', 'id'], name='order_crew_date_idx'),
+            # open orders in a date range: the manager list with ?status=0,
+            # ordered by -date, -id. Partial, like order_open_crew_idx, so that
+            # SQLite can use it for NOT "status" and delivered orders cost nothing.
+            models.Index(fields=['date', 'id'], condition=models.Q(status=False), name='order_open_date_idx'),
+            # open orders per crew member: dispatch.py load counts and the
+            # crew list with ?status=0, ordered by -date, -id
+            models.Index(fields=['delivery_crew', 'date', 'id'], condition=models.Q(status=False), name='order_open_crew_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so post_save can tell a status/crew change.
+        instance._loaded = {
+            name: getattr(instance, name) for name in ('status', 'delivery_crew_id')
+            if name in instance.__dict__
+        }
+        return instance
 
     def __str__(self):
         return f"Order {self.id} by {self.user}"
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -53,3 +130,74 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.menuitem.title} in Order {self.order.id}"
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    status_code = models.PositiveSmallIntegerField(null=True)  # null while the first request is running
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.method} {self.path} [{self.key}] by {self.user_id}"
+
+# Reporting rollups, maintained by rollups.py as orders are placed, delivered
+# and deleted. Rebuild with `manage.py rebuild_rollups`.
+class DailySales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+    def __str__(self):
+        return f"{self.date} {self.menuitem_id}: {self.quantity} sold"
+
+class DailyCrewDeliveries(models.Model):
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.CASCADE)
+    delivered = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'delivery_crew')
+
+    def __str__(self):
+        return f"{self.date} {self.delivery_crew_id}: {self.delivered} delivered"
+
+# Background jobs (LittleLemonAPI/jobs.py). A job is claimed by setting
+# locked_until; one still locked after that time belongs to a worker that died
+# and is claimed again. Jobs that fail max_attempts times move to DeadJob.
+class Job(models.Model):
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    key = models.CharField(max_length=100, blank=True, db_index=True)  # for jobs.cancel()
+    run_at = models.DateTimeField(db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_until = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.attempts} attempts)"
+
+class DeadJob(models.Model):
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    key = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveSmallIntegerField()
+    error = models.TextField()
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id} failed at {self.failed_at}"
@@ -0,0 +1,164 @@
+# LittleLemonAPI/pagination.py
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    Every page is a range scan on an indexed column starting right after the
+    last row of the previous page, so the cost of a page does not depend on how
+    deep into the table it is. Ties on the ordering field are broken by `id`,
+    which keeps the cursor stable for non-unique columns such as price or date.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    page_size = 20
+    max_page_size = 100
+    # Allowed values for ?ordering=, the first one is the default.
+    ordering_fields = ('id', '-id')
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page([row async for row in queryset[:self.page_size + 1]])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+
+        self.cursor = cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor['r']
+        # Walking backwards means scanning the index the other way round.
+        scan_descending = descending != self.reverse
+        if cursor is not None:
+            value = None if field == 'id' else self._cursor_value(queryset.model, field, cursor['v'])
+            queryset = queryset.filter(self._after(field, value, cursor['i'], scan_descending))
+        prefix = '-' if scan_descending else ''
+        return queryset.order_by(prefix + field, prefix + 'id')
+
+    def _set_page(self, results):
+        has_more = len(results) > self.page_size
+        page = results[:self.page_size]
+        if self.reverse:
+            page.reverse()
+
+        self.page = page
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering is None:
+            return self.ordering_fields[0]
+        if ordering not in self.ordering_fields:
+            raise ValidationError({
+                self.ordering_query_param: [f'Must be one of: {", ".join(self.ordering_fields)}.']
+            })
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(urlsafe_b64decode(padded.encode('ascii')))
+            if cursor['o'] != self.ordering:
+                raise ValueError
+            return {'v': cursor['v'], 'i': int(cursor['i']), 'r': bool(cursor['r'])}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _cursor_value(self, model, field, value):
+        # The cursor comes from the client: a value of the wrong type would
+        # reach the query (a 500) instead of being refused.
+        try:
+            value = model._meta.get_field(field).to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def encode_cursor(self, value, pk, reverse):
+        payload = json.dumps({'o': self.ordering, 'v': value, 'i': pk, 'r': int(reverse)}, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode('ascii')).decode('ascii').rstrip('=')
+
+    def _link(self, row, reverse):
+        field = self.ordering.lstrip('-')
+        value = self._value(row, field)
+        if value is not None and not isinstance(value, (int, str)):
+            value = str(value)
+        cursor = self.encode_cursor(value, self._value(row, 'id'), reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def _value(row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    @staticmethod
+    def _after(field, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        if field == 'id':
+            return Q(**{f'id__{op}': pk})
+        return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+
+
+class MenuItemPagination(KeysetPagination):
+    ordering_fields = ('id', '-id', 'price', '-price')
+
+
+class OrderPagination(KeysetPagination):
+    ordering_fields = ('-date', 'date', '-id', 'id')
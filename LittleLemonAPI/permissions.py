@@ -0,0 +1,101 @@
+# LittleLemonAPI/permissions.py
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import BasePermission
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+_REQUEST_ATTR = '_littlelemon_roles'
+
+
+def _cache_key(user_id):
+    return f'littlelemon:roles:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'LITTLELEMON_ROLES_CACHE_TIMEOUT', 300)
+
+
+def load_roles(user):
+    """Group names of `user`, from the shared cache or one query."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    timeout = _timeout()
+    if timeout:
+        names = cache.get(_cache_key(user.id))
+        if names is not None:
+            return frozenset(names)
+    names = list(user.groups.values_list('name', flat=True))
+    if timeout:
+        cache.set(_cache_key(user.id), names, timeout)
+    return frozenset(names)
+
+
+async def aload_roles(user):
+    """load_roles() for async views."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    timeout = _timeout()
+    if timeout:
+        names = await cache.aget(_cache_key(user.id))
+        if names is not None:
+            return frozenset(names)
+    names = [name async for name in user.groups.values_list('name', flat=True)]
+    if timeout:
+        await cache.aset(_cache_key(user.id), names, timeout)
+    return frozenset(names)
+
+
+def get_roles(request):
+    # Resolved once per request, whatever number of checks the view makes.
+    roles = getattr(request, _REQUEST_ATTR, None)
+    if roles is None:
+        roles = load_roles(request.user)
+        setattr(request, _REQUEST_ATTR, roles)
+    return roles
+
+
+async def aget_roles(request):
+    roles = getattr(request, _REQUEST_ATTR, None)
+    if roles is None:
+        roles = await aload_roles(request.user)
+        setattr(request, _REQUEST_ATTR, roles)
+    return roles
+
+
+def invalidate_roles(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def is_manager(request):
+    return MANAGER in get_roles(request)
+
+
+def is_delivery_crew(request):
+    return DELIVERY_CREW in get_roles(request)
+
+
+def is_customer(request):
+    return not get_roles(request) & {MANAGER, DELIVERY_CREW}
+
+
+class IsManager(BasePermission):
+    message = 'Unauthorized'
+
+    def has_permission(self, request, view):
+        return is_manager(request)
+
+
+class IsDeliveryCrew(BasePermission):
+    message = 'Unauthorized'
+
+    def has_permission(self, request, view):
+        return is_delivery_crew(request)
+
+
+class IsCustomer(BasePermission):
+    message = 'Unauthorized'
+
+    def has_permission(self, request, view):
+        return is_customer(request)
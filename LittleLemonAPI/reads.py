@@ -0,0 +1,93 @@
+# LittleLemonAPI/reads.py
+# The querysets, cache keys and validators of the read-heavy GETs, shared by
+# the DRF views (views.py) and their async versions (async_views.py), which
+# differ only in how they run the queries and render the response.
+from django.db.models import Count, Max
+
+from . import fastpaths, fieldsets, search
+from .conditional import timestamp_tag
+from .filters import filter_menu_items, filter_orders
+from .models import Cart, MenuItem, Order
+from .pagination import MenuItemPagination, OrderPagination
+from .permissions import is_delivery_crew, is_manager
+from .serializers import MenuItemSerializer, OrderSerializer
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+
+CART_SUMMARY = {'count': Count('id'), 'last': Max('updated_at')}
+ORDER_HEADER = ('user_id', 'updated_at')
+
+
+def _with_selection(tag, selection):
+    return tag if selection is None else timestamp_tag(tag, selection.key)
+
+
+def menu_list(request):
+    """(paginator, filtered rows, data) for the menu item list."""
+    selection = fieldsets.from_params(request.query_params, MenuItemSerializer)
+    rows, data = fastpaths.menu_items(MenuItem.objects.all(), selection)
+    return MenuItemPagination(), filter_menu_items(rows, request.query_params), data
+
+
+def menu_item(menu_item_id, selection):
+    """(catalog key, queryset) for one menu item."""
+    key = menu_item_id if selection is None else f'{menu_item_id}:{selection.key}'
+    return key, MenuItem.objects.for_serializer(selection).filter(id=menu_item_id)
+
+
+def search_params(request):
+    """(query, limit, selection, catalog key); ValueError if limit is not an integer."""
+    query = ' '.join(search.terms(request.query_params.get('q', '')))
+    limit = max(1, min(int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+    selection = fieldsets.from_params(request.query_params, MenuItemSerializer)
+    return query, limit, selection, (query, limit, selection.key if selection else None)
+
+
+def search_rows(ids, selection):
+    return fastpaths.menu_items(MenuItem.objects.filter(id__in=ids), selection)
+
+
+def search_results(query, ids, rows, data):
+    # In the ranked order of `ids`.
+    found = {row.id: row for row in rows}
+    return {'query': query, 'results': data([found[pk] for pk in ids if pk in found])}
+
+
+def cart(request):
+    return Cart.objects.filter(user=request.user)
+
+
+def cart_tag(request, summary, version, selection):
+    # Nested menu items come from the catalog, so its version is part of the tag.
+    tag = timestamp_tag('cart', request.user.id, summary['count'], summary['last'] or 0, version)
+    return _with_selection(tag, selection)
+
+
+def visible_orders(request):
+    """The orders the user may list. Async callers load the roles first (aget_roles)."""
+    if is_manager(request):
+        return Order.objects.all()
+    elif is_delivery_crew(request):
+        return Order.objects.filter(delivery_crew=request.user)
+    return Order.objects.filter(user=request.user)
+
+
+def order_list(request):
+    """(paginator, filtered rows, data) for the order list."""
+    selection = fieldsets.from_params(request.query_params, OrderSerializer)
+    rows, data = fastpaths.orders(visible_orders(request), selection)
+    return OrderPagination(), filter_orders(rows, request.query_params), data
+
+
+def order_header(order_id):
+    # The bare row, enough to check access and freshness before loading the items.
+    return Order.objects.filter(id=order_id).values(*ORDER_HEADER)
+
+
+def can_read_order(request, header):
+    return header['user_id'] == request.user.id or is_manager(request)
+
+
+def order_tag(order_id, header, version, selection):
+    return _with_selection(timestamp_tag('order', order_id, header['updated_at'], version), selection)
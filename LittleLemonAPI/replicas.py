@@ -0,0 +1,140 @@
+# LittleLemonAPI/replicas.py
+# Read replica routing.
+#
+# settings.LITTLELEMON_READ_REPLICAS names database aliases that are read-only
+# copies of `default`. ReplicaMiddleware lets GET/HEAD requests to the paths in
+# LITTLELEMON_REPLICA_PATHS read this app's tables from one of them. Everything
+# else stays on the primary: writes, reads inside a transaction, users, groups
+# and tokens (a token created at login must authenticate the next request),
+# and catalog cache builds, which would otherwise cache replica rows under the
+# version a write just bumped.
+#
+# Replicas lag. After a successful write a user reads from the primary for
+# LITTLELEMON_REPLICA_STICKY seconds, so they see their own changes: a customer
+# their new order, a manager their menu edit. The window is kept in the default
+# cache, which must be shared (Redis, Memcached) for it to hold across workers.
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+APP_LABEL = 'LittleLemonAPI'
+STICKY_PREFIX = 'littlelemon:replica:sticky:'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_route = ContextVar('littlelemon_replica_route', default=None)
+
+
+def replicas():
+    return getattr(settings, 'LITTLELEMON_READ_REPLICAS', [])
+
+
+def _sticky_key(user_id):
+    return f'{STICKY_PREFIX}{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'LITTLELEMON_REPLICA_STICKY', 10)
+
+
+class _Route:
+    """The database a request reads from, decided at its first routed query."""
+
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+
+    def resolve(self):
+        # Not in the middleware: token users are only known once DRF has
+        # authenticated the request, which happens before the view's queries.
+        if self.alias is None:
+            user = getattr(self.request, 'user', None)
+            if user is not None and user.is_authenticated and cache.get(_sticky_key(user.id)):
+                self.alias = DEFAULT_DB_ALIAS
+            else:
+                self.alias = random.choice(replicas())
+        return self.alias
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, whatever the request allows."""
+    token = _route.set(None)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or model._meta.app_label != APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return route.resolve()
+
+    def db_for_write(self, model, **hints):
+        # Explicit: Django would otherwise save an instance read from a replica back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db not in replicas()
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, 'LITTLELEMON_REPLICA_PATHS', ()))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        # Left set when the view returns, so that a streamed body (orders/export)
+        # reads from the same database; the next request replaces it.
+        routed = request.method in SAFE_METHODS and request.path.startswith(self.paths)
+        _route.set(_Route(request) if routed else None)
+
+    def _write_succeeded(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+    def _writer(self, request):
+        # DRF sets request.user to the authenticated user; otherwise it may be
+        # the lazy session user, which costs a query.
+        user = getattr(request, 'user', None)
+        return user.id if user is not None and user.is_authenticated else None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._start(request)
+        response = self.get_response(request)
+        if self._write_succeeded(request, response):
+            user_id = self._writer(request)
+            if user_id is not None:
+                cache.set(_sticky_key(user_id), True, _timeout())
+        return response
+
+    async def __acall__(self, request):
+        self._start(request)
+        response = await self.get_response(request)
+        if self._write_succeeded(request, response):
+            user_id = await sync_to_async(self._writer)(request)
+            if user_id is not None:
+                await cache.aset(_sticky_key(user_id), True, _timeout())
+        return response
@@ -0,0 +1,49 @@
+# LittleLemonAPI/retry.py
+# Retries write views that lost a race for the database.
+#
+# SQLite allows one writer at a time. The settings open every transaction with
+# BEGIN IMMEDIATE and wait up to the connection timeout for the write lock, so
+# "database is locked" only reaches a view when that wait runs out. PostgreSQL
+# reports serialization failures and deadlocks instead; both are safe to retry
+# because the failed transaction was rolled back.
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL serialization_failure, deadlock_detected.
+RETRYABLE_SQLSTATES = frozenset({'40001', '40P01'})
+
+
+def retryable(exc):
+    if isinstance(exc, OperationalError) and 'locked' in str(exc):
+        return True
+    return getattr(exc.__cause__, 'sqlstate', None) in RETRYABLE_SQLSTATES
+
+
+def retry_on_lock(view):
+    """
+    View decorator, placed under @api_view/@permission_classes and above
+    @idempotent. Runs the view again, after a short randomized backoff, when it
+    fails on lock contention, up to LITTLELEMON_DB_RETRIES times. Views running
+    inside an outer transaction (ATOMIC_REQUESTS) are never retried.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        retries = getattr(settings, 'LITTLELEMON_DB_RETRIES', 3)
+        backoff = getattr(settings, 'LITTLELEMON_DB_RETRY_BACKOFF', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return view(request, *args, **kwargs)
+            except Exception as exc:
+                if attempt == retries or connection.in_atomic_block or not retryable(exc):
+                    raise
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning('%s %s: %s, retrying in %.0fms', request.method, request.path, exc, delay * 1000)
+                time.sleep(delay)
+    return wrapper
@@ -0,0 +1,134 @@
+# LittleLemonAPI/rollups.py
+# Incremental maintenance of the DailySales / DailyCrewDeliveries rollups.
+#
+# Each change is a single INSERT ... ON CONFLICT DO UPDATE statement that adds
+# (or, on delete, subtracts) the order's contribution, so placing an order costs
+# one extra query however many items it has. SQLite >= 3.24 and PostgreSQL
+# both support this syntax.
+#
+# New orders are added by a background job (jobs.py), after checkout has
+# responded, so reports can trail the orders placed in the last few seconds.
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from . import jobs
+from .models import DailyCrewDeliveries, DailySales, Job, MenuItem, Order, OrderItem
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _apply_order(order_id, date, sign):
+    sales = _table(DailySales)
+    items = _table(OrderItem)
+    menu = _table(MenuItem)
+    sql = f"""
+        INSERT INTO {sales} (date, menuitem_id, category_id, quantity, revenue, order_count)
+        SELECT %s, oi.menuitem_id, mi.category_id, %s * SUM(oi.quantity), %s * SUM(oi.price), %s
+        FROM {items} oi INNER JOIN {menu} mi ON mi.id = oi.menuitem_id
+        WHERE oi.order_id = %s
+        GROUP BY oi.menuitem_id, mi.category_id
+        ON CONFLICT (date, menuitem_id) DO UPDATE SET
+            quantity = {sales}.quantity + excluded.quantity,
+            revenue = {sales}.revenue + excluded.revenue,
+            order_count = {sales}.order_count + excluded.order_count
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [date, sign, sign, sign, order_id])
+
+
+def _apply_delivery(date, crew_id, delta):
+    crew = _table(DailyCrewDeliveries)
+    sql = f"""
+        INSERT INTO {crew} (date, delivery_crew_id, delivered) VALUES (%s, %s, %s)
+        ON CONFLICT (date, delivery_crew_id) DO UPDATE SET
+            delivered = {crew}.delivered + excluded.delivered
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [date, crew_id, delta])
+
+
+RECORD_ORDER = 'rollups.record_order'
+
+
+def _order_key(order_id):
+    return f'order:{order_id}'
+
+
+def record_order(order):
+    """Queue the job adding a newly placed order's items to the sales rollup."""
+    jobs.enqueue(RECORD_ORDER, {'order_id': order.id, 'date': order.date}, key=_order_key(order.id))
+
+
+@jobs.handler(RECORD_ORDER)
+def _record_order(order_id, date):
+    _apply_order(order_id, datetime.date.fromisoformat(date), 1)
+
+
+def forget_order(order):
+    """Remove an order's contribution; called before the order is deleted."""
+    # An order whose job has not run yet was never added.
+    if not jobs.cancel(RECORD_ORDER, _order_key(order.id)):
+        _apply_order(order.id, order.date, -1)
+    if order.status and order.delivery_crew_id:
+        _apply_delivery(order.date, order.delivery_crew_id, -1)
+
+
+def record_delivery_change(order):
+    """
+    Keep DailyCrewDeliveries in step with an order's (status, delivery_crew)
+    after a save, comparing against the values it was loaded with.
+    """
+    loaded = getattr(order, '_loaded', None)
+    if loaded is None:
+        return
+    before = (loaded.get('status'), loaded.get('delivery_crew_id'))
+    after = (bool(order.status), order.delivery_crew_id)
+    if before == after:
+        return
+    if before[0] and before[1]:
+        _apply_delivery(order.date, before[1], -1)
+    if after[0] and after[1]:
+        _apply_delivery(order.date, after[1], 1)
+    order._loaded = {'status': after[0], 'delivery_crew_id': after[1]}
+
+
+BATCH_SIZE = 2000
+
+
+def rebuild():
+    """Recompute both rollups from Order/OrderItem."""
+    with transaction.atomic():
+        # The rebuild counts the orders these jobs would add.
+        Job.objects.filter(name=RECORD_ORDER).delete()
+        DailySales.objects.all().delete()
+        DailyCrewDeliveries.objects.all().delete()
+        sales = (
+            OrderItem.objects
+            .values('order__date', 'menuitem_id', 'menuitem__category_id')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('price'), order_count=Count('order_id'))
+            .order_by()
+        )
+        batch = []
+        for row in sales.iterator(chunk_size=BATCH_SIZE):
+            batch.append(DailySales(
+                date=row['order__date'], menuitem_id=row['menuitem_id'],
+                category_id=row['menuitem__category_id'], quantity=row['quantity'],
+                revenue=row['revenue'], order_count=row['order_count'],
+            ))
+            if len(batch) >= BATCH_SIZE:
+                DailySales.objects.bulk_create(batch)
+                batch = []
+        DailySales.objects.bulk_create(batch)
+        deliveries = (
+            Order.objects.filter(status=True, delivery_crew__isnull=False)
+            .values('date', 'delivery_crew_id')
+            .annotate(delivered=Count('id'))
+            .order_by()
+        )
+        DailyCrewDeliveries.objects.bulk_create(
+            [DailyCrewDeliveries(**row) for row in deliveries], batch_size=BATCH_SIZE
+        )
@@ -0,0 +1,192 @@
+# LittleLemonAPI/search.py
+# Ranked full-text and type-ahead prefix search over menu item and category
+# titles, for the menu_item_search view.
+#
+# SQLite: an FTS5 table keyed by menu item id, kept in sync by triggers so that
+# bulk_create(), update() and raw SQL writes are indexed too. Prefix indexes
+# make 2 and 3 letter type-ahead terms index lookups, and rows are ranked by
+# bm25 with a title match weighted five times a category match.
+# PostgreSQL: GIN indexes on the tsvector of each title, ranked with ts_rank.
+# Other backends fall back to an unindexed LIKE search.
+#
+# Django rebuilds a SQLite table (dropping its triggers) when a migration alters
+# one of its columns; `manage.py rebuild_search_index` reinstalls them.
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Category, MenuItem
+
+SEARCH_TABLE = 'littlelemonapi_menuitem_search'
+MIN_QUERY_LENGTH = 2
+# bm25 costs a few microseconds per matching row, so a one or two letter
+# prefix matching most of a large menu would take tens of milliseconds to rank
+# in full. Such queries are ranked among their first RANK_CANDIDATES matches
+# (by id); anything more selective is ranked exactly.
+RANK_CANDIDATES = 1000
+
+_TERM = re.compile(r'\w+')
+
+# Statement templates: {menu} and {category} are the quoted menu item and
+# category tables (quote_name(db_table), which PostgreSQL needs for their mixed
+# case names); the search table and trigger names are lowercase and unquoted.
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 2.0)')",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_insert AFTER INSERT ON {{menu}} BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, category)
+        SELECT new.id, new.title, title FROM {{category}} WHERE id = new.category_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_update
+    AFTER UPDATE OF title, category_id ON {{menu}} BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        INSERT INTO {SEARCH_TABLE} (rowid, title, category)
+        SELECT new.id, new.title, title FROM {{category}} WHERE id = new.category_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_menuitem_search_delete AFTER DELETE ON {{menu}} BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS littlelemonapi_category_search_update
+    AFTER UPDATE OF title ON {{category}} BEGIN
+        UPDATE {SEARCH_TABLE} SET category = new.title
+        WHERE rowid IN (SELECT id FROM {{menu}} WHERE category_id = new.id);
+    END
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS littlelemonapi_category_search_update',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_delete',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_update',
+    'DROP TRIGGER IF EXISTS littlelemonapi_menuitem_search_insert',
+    f'DROP TABLE IF EXISTS {SEARCH_TABLE}',
+]
+
+SQLITE_REBUILD = [
+    f'DELETE FROM {SEARCH_TABLE}',
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, category)
+    SELECT m.id, m.title, c.title FROM {{menu}} m
+    INNER JOIN {{category}} c ON c.id = m.category_id
+    """,
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')",
+]
+
+SQLITE_SEARCH = f"""
+    SELECT rowid FROM (
+        SELECT rowid, rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT %s
+    ) ORDER BY rank, rowid LIMIT %s
+"""
+
+POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS menuitem_title_search_idx ON {menu} "
+    "USING gin (to_tsvector('simple', title))",
+    "CREATE INDEX IF NOT EXISTS category_title_search_idx ON {category} "
+    "USING gin (to_tsvector('simple', title))",
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS category_title_search_idx',
+    'DROP INDEX IF EXISTS menuitem_title_search_idx',
+]
+
+POSTGRES_REBUILD = [
+    'REINDEX INDEX menuitem_title_search_idx',
+    'REINDEX INDEX category_title_search_idx',
+]
+
+# A term matches within the item title or within the category title.
+POSTGRES_SEARCH = """
+    SELECT m.id FROM {menu} m
+    INNER JOIN {category} c ON c.id = m.category_id
+    WHERE to_tsvector('simple', m.title) @@ to_tsquery('simple', %s)
+       OR to_tsvector('simple', c.title) @@ to_tsquery('simple', %s)
+    ORDER BY 5 * ts_rank(to_tsvector('simple', m.title), to_tsquery('simple', %s))
+           + ts_rank(to_tsvector('simple', c.title), to_tsquery('simple', %s)) DESC, m.id
+    LIMIT %s
+"""
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL, SQLITE_REBUILD),
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_UNINSTALL, POSTGRES_REBUILD),
+}
+
+
+def tables(using=connection):
+    """The quoted table names the statement templates are formatted with."""
+    return {
+        'menu': using.ops.quote_name(MenuItem._meta.db_table),
+        'category': using.ops.quote_name(Category._meta.db_table),
+    }
+
+
+def terms(query):
+    return [term.lower() for term in _TERM.findall(query)]
+
+
+def _execute(statements, using=connection):
+    names = tables(using)
+    with using.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql.format(**names))
+
+
+def install(using=connection):
+    """Create the index and its triggers if they are missing."""
+    statements = STATEMENTS.get(using.vendor)
+    if statements:
+        _execute(statements[0], using)
+
+
+def uninstall(using=connection):
+    statements = STATEMENTS.get(using.vendor)
+    if statements:
+        _execute(statements[1], using)
+
+
+def rebuild(using=connection):
+    """Reinstall the index and reindex every menu item. Returns the item count."""
+    install(using)
+    statements = STATEMENTS.get(using.vendor)
+    if statements:
+        _execute(statements[2], using)
+    return MenuItem.objects.using(using.alias).count()
+
+
+def search(query, limit=20):
+    """
+    Ids of the menu items best matching `query`, best first. Every word must
+    match the start of a word in the item or category title, so partly typed
+    queries already find their items.
+    """
+    words = terms(query)
+    if not words or len(''.join(words)) < MIN_QUERY_LENGTH:
+        return []
+    if connection.vendor == 'sqlite':
+        # Quoted so that FTS5 operators in user input are taken literally.
+        params = [' '.join(f'"{word}"*' for word in words), RANK_CANDIDATES, limit]
+        sql = SQLITE_SEARCH
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        params = [tsquery] * 4 + [limit]
+        sql = POSTGRES_SEARCH.format(**tables())
+    else:
+        items = MenuItem.objects.all()
+        for word in words:
+            items = items.filter(Q(title__icontains=word) | Q(category__title__icontains=word))
+        return list(items.order_by('id').values_list('id', flat=True)[:limit])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,162 @@
+# LittleLemonAPI/seeding.py
+# Synthetic data generator used by `manage.py seed_data`, the benchmarks and
+# the query plan check. Everything is written with bulk inserts in batches.
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connection
+
+from . import rollups
+from .models import Cart, Category, MenuItem, Order, OrderItem
+from .permissions import DELIVERY_CREW, MANAGER
+
+PASSWORD = 'littlelemon'
+USERNAME_PREFIX = 'seed'
+BATCH_SIZE = 5000
+
+
+def seeded_users():
+    return User.objects.filter(username__startswith=f'{USERNAME_PREFIX}-')
+
+
+def _raw_delete(queryset):
+    # One DELETE without the per-row pre_delete signals; dependents go first.
+    ids, params = queryset.values('pk').query.sql_with_params()
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({ids})', params)
+        return cursor.rowcount
+
+
+def _batches(total, size=BATCH_SIZE):
+    start = 0
+    while start < total:
+        yield start, min(size, total - start)
+        start += size
+
+
+def seed(categories=20, menu_items=2000, customers=100000, crew=200, managers=5,
+         orders=1000000, max_items_per_order=5, carts=1000, days=730, seed=42, log=None):
+    """
+    Insert a synthetic dataset and return the number of rows written per model.
+    All seeded users share the password `PASSWORD` and are named
+    '<USERNAME_PREFIX>-<role>-<n>'.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    counts = {}
+    password = make_password(PASSWORD)  # hashed once, shared by every seeded user
+
+    def users(role, total):
+        ids = []
+        for start, size in _batches(total):
+            created = User.objects.bulk_create([
+                User(username=f'{USERNAME_PREFIX}-{role}-{start + n}', password=password)
+                for n in range(size)
+            ])
+            ids += [user.id for user in created]
+        counts[f'users:{role}'] = len(ids)
+        log(f'{len(ids)} {role} users')
+        return ids
+
+    manager_ids = users('manager', managers)
+    crew_ids = users('crew', crew)
+    customer_ids = users('customer', customers)
+    manager_group, _ = Group.objects.get_or_create(name=MANAGER)
+    crew_group, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+    through = User.groups.through
+    through.objects.bulk_create(
+        [through(user_id=user_id, group_id=manager_group.id) for user_id in manager_ids]
+        + [through(user_id=user_id, group_id=crew_group.id) for user_id in crew_ids],
+        batch_size=BATCH_SIZE,
+    )
+
+    category_objs = Category.objects.bulk_create([
+        Category(slug=f'seed-category-{n}', title=f'Category {n}') for n in range(categories)
+    ])
+    counts['categories'] = len(category_objs)
+    menu = []
+    for start, size in _batches(menu_items):
+        menu += MenuItem.objects.bulk_create([
+            MenuItem(
+                title=f'Menu item {start + n}',
+                price=Decimal(rng.randint(100, 4000)) / 100,
+                featured=rng.random() < 0.1,
+                category=rng.choice(category_objs),
+            )
+            for n in range(size)
+        ])
+    prices = {item.id: item.price for item in menu}
+    menu_ids = list(prices)
+    counts['menu_items'] = len(menu)
+    log(f'{len(menu)} menu items in {len(category_objs)} categories')
+
+    today = date.today()
+    order_total = item_total = 0
+    for start, size in _batches(orders):
+        batch = []
+        lines = []
+        for _ in range(size):
+            chosen = rng.sample(menu_ids, rng.randint(1, min(max_items_per_order, len(menu_ids))))
+            quantities = [rng.randint(1, 4) for _ in chosen]
+            total = sum(prices[item] * quantity for item, quantity in zip(chosen, quantities))
+            delivered = rng.random() < 0.8
+            batch.append(Order(
+                user_id=rng.choice(customer_ids),
+                delivery_crew_id=rng.choice(crew_ids) if crew_ids and (delivered or rng.random() < 0.5) else None,
+                status=delivered,
+                total=min(total, Decimal('9999.99')),
+                date=today - timedelta(days=rng.randrange(days)),
+            ))
+            lines.append(list(zip(chosen, quantities)))
+        created = Order.objects.bulk_create(batch)
+        # auto_now_add overwrote the dates; put the spread back.
+        for order, wanted in zip(created, batch):
+            order.date = wanted.date
+        Order.objects.bulk_update(created, ['date'], batch_size=BATCH_SIZE)
+        items = [
+            OrderItem(order_id=order.id, menuitem_id=item, quantity=quantity,
+                      unit_price=prices[item], price=prices[item] * quantity)
+            for order, order_lines in zip(created, lines) for item, quantity in order_lines
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        order_total += len(created)
+        item_total += len(items)
+        log(f'{order_total} orders, {item_total} order items')
+    counts['orders'] = order_total
+    counts['order_items'] = item_total
+
+    cart_rows = []
+    for user_id in rng.sample(customer_ids, min(carts, len(customer_ids))):
+        for item in rng.sample(menu_ids, min(3, len(menu_ids))):
+            quantity = rng.randint(1, 3)
+            cart_rows.append(Cart(user_id=user_id, menuitem_id=item, quantity=quantity,
+                                  unit_price=prices[item], price=prices[item] * quantity))
+    Cart.objects.bulk_create(cart_rows, batch_size=BATCH_SIZE)
+    counts['cart_rows'] = len(cart_rows)
+
+    rollups.rebuild()
+    log('rollups rebuilt')
+    return counts
+
+
+def clear(log=None):
+    """
+    Delete what seed() inserted: the seeded users with their orders and carts,
+    and the seeded categories with their menu items. Orders are deleted in bulk
+    rather than one by one through their signals, so the rollups are rebuilt.
+    """
+    log = log or (lambda message: None)
+    users = seeded_users()
+    items = MenuItem.objects.filter(category__slug__startswith='seed-category-')
+    OrderItem.objects.filter(order__user__in=users).delete()
+    log(f'{_raw_delete(Order.objects.filter(user__in=users))} seeded orders deleted')
+    Order.objects.filter(delivery_crew__in=users).update(delivery_crew=None)
+    users.delete()
+    items.delete()
+    Category.objects.filter(slug__startswith='seed-category-').delete()
+    rollups.rebuild()
+    log('seeded users, menu items and categories deleted')
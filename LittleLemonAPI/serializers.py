@@ -3,9 +3,42 @@ from rest_framework.validators import UniqueTogetherValidator
 from .models import Category, MenuItem, Cart, Order, OrderItem
 from django.contrib.auth.models import User
 from django.utils.timezone import now
+from .permissions import is_delivery_crew
+
+def _is_root(serializer):
+    parent = getattr(serializer, 'parent', None)
+    return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+# ?fields= / ?expand= support (see fieldsets.py). The root serializer reads the
+# Selection from context['selection'], nested serializers get theirs from the
+# parent. `collapsed` gives, for each nested relation, the field used in its
+# place when it is not expanded.
+class SelectableFieldsMixin:
+    collapsed = {}
+    selection = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        if selection is None and _is_root(self):
+            selection = self.context.get('selection')
+        if selection is None:
+            return fields
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if not selection.includes(name):
+                del fields[name]
+            elif name in self.collapsed and not selection.expands(name):
+                fields[name] = self.collapsed[name]()
+            else:
+                nested = getattr(field, 'child', field)
+                if isinstance(nested, SelectableFieldsMixin):
+                    nested.selection = selection.child(name)
+        return fields
 
 # Category Serializer
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'slug', 'title']
@@ -15,11 +48,12 @@ class CategorySerializer(serializers.ModelSerializer):
         }
 
 # MenuItem Serializer
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True) 
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source='category', write_only=True  
     )
+    collapsed = {'category': lambda: serializers.PrimaryKeyRelatedField(read_only=True)}
     class Meta:
         model = MenuItem
         fields = ['id', 'title', 'price', 'featured', 'category', 'category_id']
@@ -29,18 +63,30 @@ class MenuItemSerializer(serializers.ModelSerializer):
             'featured': {'default': False}
         }
 
+# One row of a bulk menu write (bulk.py). Validation never queries: the
+# categories of the whole batch are checked together afterwards.
+class MenuItemBulkSerializer(serializers.ModelSerializer):
+    category_id = serializers.IntegerField()
+    class Meta:
+        model = MenuItem
+        fields = ['title', 'price', 'featured', 'category_id']
+        extra_kwargs = {
+            'featured': {'default': False}
+        }
+
 # Cart Serializer
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         read_only=True,
         default=serializers.CurrentUserDefault()
     )
     menuitem = MenuItemSerializer(read_only=True)
     menuitem_id = serializers.PrimaryKeyRelatedField(
-        queryset=MenuItem.objects.all(),
+        queryset=MenuItem.objects.for_serializer(),
         source='menuitem',
         write_only=True
     )
+    collapsed = {'menuitem': lambda: serializers.PrimaryKeyRelatedField(read_only=True)}
     class Meta:
         model = Cart
         fields = ['id', 'user', 'menuitem', 'menuitem_id', 'quantity', 'unit_price', 'price']
@@ -64,11 +110,17 @@ class CartSerializer(serializers.ModelSerializer):
         validated_data['price'] = menuitem.price * quantity 
         return Cart.objects.create(**validated_data)
 
-class OrderItemSerializer(serializers.ModelSerializer):
+# One line of a batch cart update (bulk.update_cart): quantity 0 removes the item.
+class CartLineSerializer(serializers.Serializer):
+    menuitem_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+
+class OrderItemSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     menuitem = MenuItemSerializer(read_only=True)
     menuitem_id = serializers.PrimaryKeyRelatedField(
-        queryset=MenuItem.objects.all(), source='menuitem', write_only=True
+        queryset=MenuItem.objects.for_serializer(), source='menuitem', write_only=True
     )
+    collapsed = {'menuitem': lambda: serializers.PrimaryKeyRelatedField(read_only=True)}
     class Meta:
         model = OrderItem
         fields = ['id', 'order', 'menuitem', 'menuitem_id', 'quantity', 'unit_price', 'price']
@@ -93,7 +145,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         validated_data['price'] = menuitem.price * quantity
         return OrderItem.objects.create(**validated_data)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
     delivery_crew = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(groups__name='Delivery crew'),
@@ -101,7 +153,8 @@ class OrderSerializer(serializers.ModelSerializer):
         required=False
     )
     order_items = OrderItemSerializer(many=True, read_only=True)
-    date = serializers.DateTimeField(default=now, read_only=True)
+    date = serializers.DateField(read_only=True)
+    collapsed = {'order_items': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True)}
     class Meta:
         model = Order
         fields = ['id', 'user', 'delivery_crew', 'status', 'total', 'date', 'order_items']
@@ -117,8 +170,25 @@ class OrderSerializer(serializers.ModelSerializer):
         return value
 
     def update(self, instance, validated_data):
-        user = self.context['request'].user
-        if user.groups.filter(name='Delivery crew').exists():
+        if is_delivery_crew(self.context['request']):
             if 'delivery_crew' in validated_data or 'user' in validated_data or 'total' in validated_data:
                 raise serializers.ValidationError("Delivery crew can only update status.")
         return super().update(instance, validated_data)
+
+# Report Serializers (read-only, fed from the rollup tables)
+class RevenueByDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    quantity = serializers.IntegerField()
+
+class TopItemSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(source='menuitem_id')
+    title = serializers.CharField(source='menuitem__title')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    quantity = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+
+class CrewDeliveriesSerializer(serializers.Serializer):
+    delivery_crew = serializers.IntegerField(source='delivery_crew_id')
+    username = serializers.CharField(source='delivery_crew__username')
+    delivered = serializers.IntegerField()
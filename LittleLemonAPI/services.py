@@ -0,0 +1,39 @@
+# LittleLemonAPI/services.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from . import dispatch, rollups
+from .models import Cart, Order, OrderItem
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+def place_order(user):
+    """
+    Turn the user's cart into an order in one transaction: lock the cart rows,
+    price them with a single aggregate, give the order to the least loaded
+    delivery crew member (dispatch.py), write every OrderItem with one
+    bulk_create, clear the cart and queue the order's sales rollup update.
+    Raises EmptyCartError if there is nothing to order.
+    """
+    with transaction.atomic():
+        lines = list(
+            Cart.objects.select_for_update()
+            .filter(user=user)
+            .values_list('menuitem_id', 'quantity', 'unit_price', 'price')
+        )
+        if not lines:
+            raise EmptyCartError
+        total = Cart.objects.filter(user=user).aggregate(total=Sum('price'))['total']
+        crew_id = dispatch.pick() if getattr(settings, 'LITTLELEMON_DISPATCH_AUTO_ASSIGN', True) else None
+        order = Order.objects.create(user=user, total=total, status=0, delivery_crew_id=crew_id)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, unit_price=unit_price, price=price)
+            for menuitem_id, quantity, unit_price, price in lines
+        ])
+        Cart.objects.filter(user=user).delete()
+        rollups.record_order(order)
+    return order
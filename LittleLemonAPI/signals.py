@@ -0,0 +1,60 @@
+# LittleLemonAPI/signals.py
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import catalog, dispatch, events, rollups
+from .authentication import invalidate_token
+from .models import Category, MenuItem, Order
+from .permissions import invalidate_roles
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    catalog.bump_on_commit()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward: user.groups.add(...); reverse: group.user_set.add(user), as done
+    # by the manager_users and delivery_crew_users views.
+    dispatch.index.invalidate()
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_roles([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_roles(pk_set)
+    elif action == 'pre_clear':
+        invalidate_roles(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # Covers deactivation and any other change to the cached user object.
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
+
+
+@receiver(post_save, sender=Order)
+def update_delivery_rollup(sender, instance, created, **kwargs):
+    # All before the rollup, which resets instance._loaded.
+    events.order_saved(instance, created)
+    if not created:
+        dispatch.record_change(instance)
+        rollups.record_delivery_change(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    # pre_delete runs before the cascade, while the order's items still exist.
+    rollups.forget_order(instance)
@@ -0,0 +1,156 @@
+import re
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from . import catalog, seeding
+from .models import Cart, Category, MenuItem, Order, OrderItem
+
+# Tables that grow with traffic. A scan of one of these is a regression unless
+# it walks an index in ORDER BY order under a LIMIT (a keyset page), and so is
+# sorting their rows in a temporary b-tree instead of reading them in index order.
+HOT_TABLES = {
+    model._meta.db_table.lower() for model in (Order, OrderItem, Cart)
+} | {'littlelemonapi_dailysales', 'littlelemonapi_dailycrewdeliveries', 'authtoken_token'}
+
+# (role, url, exemptions: table names allowed to be fully scanned, or SORT)
+SORT = 'sort'
+
+CHECKS = [
+    ('customer', '/api/menu-items/', ()),
+    ('customer', '/api/menu-items/?category={category}&ordering=price', ()),
+    ('customer', '/api/menu-items/?featured=true&price_max=5', ()),
+    ('customer', '/api/menu-items/{menuitem}/', ()),
+    ('customer', '/api/menu-items/search/?q=menu+it', ()),
+    ('customer', '/api/cart/menu-items/', ()),
+    ('customer', '/api/orders/', ()),
+    ('customer', '/api/orders/?status=0&date_from={date_from}', ()),
+    ('customer', '/api/orders/{order}/', ()),
+    ('customer', '/api/orders/?fields=id,total,status', ()),
+    ('customer', '/api/orders/?expand=order_items', ()),
+    ('crew', '/api/orders/', ()),
+    ('crew', '/api/orders/?status=0', ()),
+    ('manager', '/api/orders/', ()),
+    ('manager', '/api/orders/?status=0&date_from={date_from}&date_to={date_to}', ()),
+    ('manager', '/api/orders/?delivery_crew={crew}', ()),
+    ('manager', '/api/orders/{order}/', ()),
+    ('manager', '/api/groups/manager/users/', ()),
+    ('manager', '/api/groups/delivery-crew/users/', ()),
+    ('manager', '/api/reports/revenue-by-day/?date_from={date_from}&date_to={date_to}', ()),
+    # Rankings sort the grouped rollup rows: one per menu item / crew member.
+    ('manager', '/api/reports/top-items/?date_from={date_from}&date_to={date_to}', (SORT,)),
+    ('manager', '/api/reports/crew-deliveries/?date_from={date_from}&date_to={date_to}', (SORT,)),
+    # Exports read every matching order by design.
+    ('manager', '/api/orders/export/', ('littlelemonapi_order', 'littlelemonapi_orderitem')),
+]
+
+# (role, url, index): the index each of these queries must be read through.
+USES_INDEX = [
+    ('manager', '/api/orders/?status=0&date_from={date_from}&date_to={date_to}', 'order_open_date_idx'),
+    ('manager', '/api/orders/?status=0', 'order_open_date_idx'),
+    ('crew', '/api/orders/?status=0', 'order_open_crew_idx'),
+]
+
+SQLITE_SCAN = re.compile(r'^SCAN (?P<table>\S+)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (?P<table>\S+)')
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def problems(sql, plan, allowed):
+    pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+    sorted_in_temp = any('TEMP B-TREE FOR ORDER BY' in line for line in plan)
+    bounded = ' LIMIT ' in sql.upper() and not sorted_in_temp
+    found = []
+    if sorted_in_temp and SORT not in allowed and any(table in sql.lower() for table in HOT_TABLES):
+        found.append('rows sorted in a temporary b-tree instead of read in index order')
+    for line in plan:
+        match = pattern.search(line.strip())
+        if not match:
+            continue
+        table = match.group('table').strip('"').lower()
+        if table in HOT_TABLES and table not in allowed and not bounded:
+            found.append(f'full scan of {table}: {line.strip()}')
+    return found
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    LITTLELEMON_THROTTLE=False,
+)
+class QueryPlanTests(TestCase):
+    """
+    Seeds a dataset large enough for the planner to prefer indexes, runs every
+    endpoint and EXPLAINs each SELECT it made: no hot table may be fully scanned
+    or sorted in a temporary b-tree unless the check exempts it.
+    """
+    ORDERS = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed(categories=10, menu_items=500, customers=200, crew=10, managers=1,
+                     orders=cls.ORDERS, carts=50, days=365)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.customer = User.objects.filter(
+            username__startswith=f'{seeding.USERNAME_PREFIX}-customer-', order__isnull=False,
+        ).first()
+        cls.crew = User.objects.get(username=f'{seeding.USERNAME_PREFIX}-crew-0')
+        cls.manager = User.objects.get(username=f'{seeding.USERNAME_PREFIX}-manager-0')
+        today = date.today()
+        cls.context = {
+            'category': Category.objects.filter(slug__startswith='seed-').first().id,
+            'menuitem': MenuItem.objects.filter(title__startswith='Menu item').first().id,
+            'order': Order.objects.filter(user=cls.customer).first().id,
+            'crew': cls.crew.id,
+            'date_from': (today - timedelta(days=30)).isoformat(),
+            'date_to': today.isoformat(),
+        }
+
+    def setUp(self):
+        catalog.clear_local()
+
+    def plans(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if sql.lstrip().upper().startswith('SELECT'):
+                yield sql, explain(sql)
+
+    def test_no_full_scans_of_hot_tables(self):
+        users = {'customer': self.customer, 'crew': self.crew, 'manager': self.manager}
+        for role, url, allowed in CHECKS:
+            url = url.format(**self.context)
+            with self.subTest(role=role, url=url):
+                for sql, plan in self.plans(users[role], url):
+                    self.assertEqual(problems(sql, plan, allowed), [], f'{sql}\n  ' + '\n  '.join(plan))
+
+    def test_partial_indexes_are_used(self):
+        users = {'customer': self.customer, 'crew': self.crew, 'manager': self.manager}
+        for role, url, index in USES_INDEX:
+            url = url.format(**self.context)
+            with self.subTest(role=role, url=url):
+                plans = [
+                    (sql, plan) for sql, plan in self.plans(users[role], url) if 'littlelemonapi_order"' in sql.lower()
+                ]
+                self.assertTrue(
+                    any(index in line for sql, plan in plans for line in plan),
+                    '\n'.join(f'{sql}\n  ' + '\n  '.join(plan) for sql, plan in plans),
+                )
@@ -1,3 +1,1151 @@
-from django.test import TestCase
+import csv
+import json
+import re
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import (
+    async_views, bulk, catalog, dispatch, events, exports, fastpaths, fieldsets, jobs, replicas, rollups, search,
+    seeding, throttling,
+)
+from .authentication import CachedTokenAuthentication, aauthenticate
+from .handlers import StreamingASGIHandler
+from .models import Cart, Category, DailySales, DeadJob, IdempotencyKey, Job, MenuItem, Order, OrderItem
+from .permissions import DELIVERY_CREW, MANAGER, IsCustomer, IsDeliveryCrew, IsManager
+from .renderers import FastJSONRenderer
+from .retry import retry_on_lock
+from .serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+
+
+class APITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='lemon')
+        cls.manager.groups.add(Group.objects.create(name=MANAGER))
+        cls.crew = User.objects.create_user('crew', password='lemon')
+        cls.crew.groups.add(Group.objects.create(name=DELIVERY_CREW))
+        cls.customer = User.objects.create_user('customer', password='lemon')
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Item {i}', price=Decimal(i + 1), featured=i % 2 == 0, category=cls.category)
+            for i in range(6)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        catalog.clear_local()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+def cursor(ordering, value, pk=1, reverse=0):
+    payload = json.dumps({'o': ordering, 'v': value, 'i': pk, 'r': reverse})
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+class CursorTests(APITestCase):
+    def test_tampered_cursor_is_not_found(self):
+        Order.objects.create(user=self.customer, total=1, status=False)
+        client = self.client_for(self.manager)
+        for url, ordering, value in [
+            ('/api/menu-items/', 'price', 'abc'),
+            ('/api/menu-items/', 'price', [1]),
+            ('/api/menu-items/', '-price', None),
+            ('/api/orders/', '-date', 'zzz'),
+            ('/api/orders/', 'date', None),
+            ('/api/orders/', 'date', {'a': 1}),
+        ]:
+            response = client.get(url, {'ordering': ordering, 'cursor': cursor(ordering, value)})
+            self.assertEqual(response.status_code, 404, (url, ordering, value))
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_cursor_follows_on(self):
+        client = self.client_for(self.customer)
+        first = client.get('/api/menu-items/', {'ordering': 'price', 'page_size': 4}).data
+        second = client.get(first['next']).data
+        titles = [row['title'] for row in first['results'] + second['results']]
+        self.assertEqual(titles, [f'Item {i}' for i in range(6)])
+
+
+class FilterTests(APITestCase):
+    def test_invalid_values_are_rejected(self):
+        client = self.client_for(self.customer)
+        for params in [{'price_min': 'abc'}, {'price_min': 'nan'}, {'price_max': 'Infinity'},
+                       {'price_max': '-inf'}, {'featured': 'maybe'}, {'category': 'x'}]:
+            response = client.get('/api/menu-items/', params)
+            self.assertEqual(response.status_code, 400, params)
+        response = client.get('/api/menu-items/', {'price_min': '2.5', 'price_max': '4'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Item 2', 'Item 3'])
+
+
+class FastPathTests(APITestCase):
+    """
+    fastpaths and FastJSONRenderer return the bytes that the serializers and
+    JSONRenderer return for the same rows, for every kind of field selection.
+    """
+    MENU_SELECTIONS = ['', 'fields=id,title', 'expand=', 'fields=id,category.title', 'fields=price,category']
+    ORDER_SELECTIONS = [
+        '', 'expand=', 'fields=id,total,date', 'expand=order_items', 'fields=id,order_items.menuitem.title',
+        'fields=order_items.quantity,order_items.price&expand=order_items.menuitem',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        odd = MenuItem.objects.create(title='Café \u2028"crème" 🍋', price=Decimal('12.5'), featured=True,
+                                      category=cls.category)
+        first = Order.objects.create(user=cls.customer, delivery_crew=cls.crew, total=Decimal('27.5'), status=True)
+        for item, quantity in ((cls.items[0], 3), (odd, 2)):
+            OrderItem.objects.create(order=first, menuitem=item, quantity=quantity,
+                                     unit_price=item.price, price=item.price * quantity)
+        Order.objects.create(user=cls.customer, total=0, status=False)
+
+    def assertSameBytes(self, fast, serializer_class, queryset, selections):
+        for raw in selections:
+            selection = fieldsets.from_params(QueryDict(raw), serializer_class)
+            with self.subTest(selection=raw):
+                rows, data = fast(queryset, selection)
+                expected = serializer_class(
+                    queryset.for_serializer(selection).order_by('id'), many=True, context={'selection': selection},
+                ).data
+                self.assertEqual(
+                    FastJSONRenderer().render(data(list(rows.order_by('id')))),
+                    JSONRenderer().render(expected),
+                )
+
+    def test_menu_items(self):
+        self.assertSameBytes(fastpaths.menu_items, MenuItemSerializer, MenuItem.objects.all(), self.MENU_SELECTIONS)
+
+    def test_orders(self):
+        self.assertSameBytes(fastpaths.orders, OrderSerializer, Order.objects.all(), self.ORDER_SELECTIONS)
+
+
+class QueryCountTests(APITestCase):
+    """
+    Every list and detail endpoint runs the same number of queries with N and
+    with 2N rows: relations are joined or prefetched, never loaded per row.
+    Caches are cleared before each request, so the counts include the role
+    lookup and building the cached menu payloads.
+    """
+    N = 8
+
+    def grow(self, n):
+        # n more menu items, orders of three items, cart rows and crew members.
+        start = MenuItem.objects.count()
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Item {start + i}', price=Decimal(i + 1), featured=False, category=self.category)
+            for i in range(n)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, delivery_crew=self.crew, total=Decimal(6), status=False) for _ in range(n)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for order in orders for item in items[:3]
+        ])
+        Cart.objects.bulk_create([
+            Cart(user=self.customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for item in items
+        ])
+        crew = Group.objects.get(name=DELIVERY_CREW)
+        for i in range(n):
+            User.objects.create(username=f'crew-{start + i}').groups.add(crew)
+
+    def endpoints(self):
+        order = Order.objects.filter(user=self.customer).latest('id').id
+        item = MenuItem.objects.latest('id').id
+        many = '?page_size=100'
+        # (user, url, queries); the order and group endpoints include the role lookup.
+        return [
+            (self.customer, '/api/menu-items/' + many, 1),
+            (self.customer, f'/api/menu-items/{item}/', 1),
+            (self.customer, '/api/menu-items/search/?q=item&limit=50', 2),
+            (self.customer, '/api/cart/menu-items/' + many, 2),
+            (self.customer, '/api/orders/' + many, 3),
+            (self.crew, '/api/orders/' + many, 3),
+            (self.manager, '/api/orders/' + many, 3),
+            (self.customer, f'/api/orders/{order}/', 3),
+            (self.manager, f'/api/orders/{order}/', 4),
+            (self.manager, '/api/orders/export/', 2),
+            (self.manager, '/api/groups/manager/users/', 2),
+            (self.manager, '/api/groups/delivery-crew/users/', 2),
+            (self.manager, '/api/reports/revenue-by-day/', 2),
+            (self.manager, '/api/reports/top-items/', 2),
+            (self.manager, '/api/reports/crew-deliveries/', 2),
+        ]
+
+    def assert_counts(self, rows):
+        for user, url, queries in self.endpoints():
+            cache.clear()
+            catalog.clear_local()
+            client = self.client_for(user)
+            with self.subTest(url=url, user=user.username, rows=rows), self.assertNumQueries(queries):
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_constant_query_counts(self):
+        self.grow(self.N)
+        self.assert_counts(self.N)
+        self.grow(self.N)
+        self.assert_counts(2 * self.N)
+        # Both sizes fit in one page, so every row was serialized.
+        response = self.client_for(self.manager).get('/api/orders/?page_size=100')
+        self.assertEqual(len(response.data['results']), 2 * self.N)
+        self.assertEqual(len(response.data['results'][0]['order_items']), 3)
+
+
+
+class ConditionalTests(APITestCase):
+    def fill_cart(self, client, items):
+        for item in items:
+            response = client.post('/api/cart/menu-items/', {'menuitem_id': item.id, 'quantity': 2}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def test_cart_changes_after_delete(self):
+        client = self.client_for(self.customer)
+        self.fill_cart(client, self.items[:2])
+        response = client.get('/api/cart/menu-items/')
+        self.assertNotIn('Last-Modified', response)
+        Cart.objects.filter(user=self.customer, menuitem=self.items[1]).delete()
+        response = client.get('/api/cart/menu-items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_menu_changes_invalidate_cart_and_order(self):
+        client = self.client_for(self.customer)
+        manager = self.client_for(self.manager)
+        self.fill_cart(client, self.items[2:3])
+        order = client.post('/api/orders/').data['id']
+        self.fill_cart(client, self.items[:2])
+        cart = client.get('/api/cart/menu-items/')
+        detail = client.get(f'/api/orders/{order}/')
+        self.assertNotIn('Last-Modified', detail)
+        for item in (self.items[0], self.items[2]):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = manager.patch(f'/api/menu-items/{item.id}/', {'title': f'{item.title} (new)'}, format='json')
+            self.assertEqual(response.status_code, 200)
+        response = client.get('/api/cart/menu-items/', HTTP_IF_NONE_MATCH=cart['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['menuitem']['title'], 'Item 0 (new)')
+        response = client.get(f'/api/orders/{order}/', HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class IdempotencyTests(APITestCase):
+    def post(self, client, item, key='k'):
+        return client.post(
+            '/api/cart/menu-items/', {'menuitem_id': item.id, 'quantity': 1}, format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def reserve(self, client, age):
+        # Leave what a worker that died mid-request would: a reservation
+        # without a response, and no cart row.
+        self.post(client, self.items[0])
+        Cart.objects.all().delete()
+        IdempotencyKey.objects.update(status_code=None, response=None, created_at=timezone.now() - age)
+
+    def test_running_request_conflicts(self):
+        client = self.client_for(self.customer)
+        self.reserve(client, timedelta(seconds=1))
+        response = self.post(client, self.items[0])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_abandoned_request_is_taken_over(self):
+        client = self.client_for(self.customer)
+        self.reserve(client, timedelta(minutes=5))
+        response = self.post(client, self.items[0])
+        self.assertEqual(response.status_code, 201)
+        replay = self.post(client, self.items[0])
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 1)
+
+
+class RoleQueryTests(APITestCase):
+    """
+    A request loads its user's groups at most once, and not at all while the
+    shared cache holds them; adding or removing a member drops that user's entry.
+    """
+    def check(self, user):
+        # Each permission class once, on one fresh request.
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        return tuple(permission().has_permission(request, None) for permission in (IsManager, IsDeliveryCrew, IsCustomer))
+
+    def test_cold_and_warm_cache(self):
+        for user, roles in [
+            (self.manager, (True, False, False)),
+            (self.crew, (False, True, False)),
+            (self.customer, (False, False, True)),
+        ]:
+            with self.subTest(user=user.username):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.check(user), roles)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.check(user), roles)
+
+    def test_membership_changes_invalidate(self):
+        self.check(self.customer)
+        self.check(self.crew)
+        manager = self.client_for(self.manager)
+        response = manager.post('/api/groups/manager/users/', {'username': 'customer'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check(self.customer), (True, False, False))
+        response = manager.delete(f'/api/groups/delivery-crew/users/{self.crew.id}/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check(self.crew), (False, False, True))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check(self.crew), (False, False, True))
+
+
+class TokenCacheTests(APITestCase):
+    def test_requests_get_their_own_user(self):
+        token = Token.objects.create(user=self.customer)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        authentication = CachedTokenAuthentication()
+        first, first_token = authentication.authenticate(request)
+        first.first_name = 'changed'
+        with self.assertNumQueries(0):
+            users = [
+                authentication.authenticate(request)[0],
+                authentication.authenticate(request)[0],
+                async_to_sync(aauthenticate)(request),
+            ]
+        self.assertIs(first_token.user, first)
+        for user in users:
+            self.assertEqual(user.pk, self.customer.pk)
+            self.assertEqual(user.first_name, '')
+            self.assertIsNot(user, first)
+        self.assertIsNot(users[0], users[1])
+
+
+class SeedDataTests(APITestCase):
+    SMALL = {'categories': 2, 'menu_items': 5, 'customers': 4, 'crew': 2, 'managers': 1, 'orders': 20, 'carts': 2}
+
+    def seed_data(self, **options):
+        call_command('seed_data', stdout=StringIO(), **{**self.SMALL, **options})
+
+    def test_invalid_counts(self):
+        with self.assertRaisesMessage(CommandError, 'at least one customer'):
+            self.seed_data(customers=0)
+        with self.assertRaisesMessage(CommandError, 'cannot be negative'):
+            self.seed_data(orders=-1)
+
+    def test_rerun_needs_reset(self):
+        self.seed_data()
+        with self.assertRaisesMessage(CommandError, '--reset'):
+            self.seed_data()
+        self.seed_data(reset=True, orders=30)
+        seeded = seeding.seeded_users()
+        self.assertEqual(seeded.count(), 7)
+        self.assertEqual(Order.objects.filter(user__in=seeded).count(), 30)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertEqual(MenuItem.objects.count(), len(self.items) + 5)
+
+
+@override_settings(LITTLELEMON_INSTRUMENTATION=True)
+class BulkTests(APITestCase):
+    def row(self, title, **fields):
+        return {'title': title, 'price': '2.50', 'category_id': self.category.id, **fields}
+
+    def assertRowErrors(self, exc, expected):
+        # expected: {row index: field with an error}
+        self.assertEqual({error['index']: list(error['errors']) for error in exc.errors},
+                         {index: [field] for index, field in expected.items()})
+
+    def test_one_bad_row_rejects_the_batch(self):
+        client = self.client_for(self.manager)
+        count = MenuItem.objects.count()
+        response = client.post('/api/menu-items/', [
+            self.row('Soup'), self.row('Salad', price='x'), self.row('Stew', category_id=99999),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        self.assertEqual(MenuItem.objects.count(), count)
+        response = client.patch('/api/menu-items/', [
+            {'id': self.items[0].id, 'price': '9.00'}, {'id': 99999, 'price': '9.00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'id': ['Not found.']}}])
+        self.assertEqual(MenuItem.objects.get(id=self.items[0].id).price, self.items[0].price)
+
+    def test_category_slugs(self):
+        items = bulk.create_items([{'title': 'Soup', 'price': '3', 'category': 'mains'}])
+        self.assertEqual(items[0].category_id, self.category.id)
+        Category.objects.create(slug='mains', title='More mains')
+        with self.assertRaises(bulk.BulkError) as caught:
+            bulk.create_items([
+                {'title': 'Stew', 'price': '3', 'category': 'mains'},
+                {'title': 'Pie', 'price': '3', 'category': 'pies'},
+            ])
+        self.assertEqual(caught.exception.errors, [
+            {'index': 0, 'errors': {'category': ['Category slug "mains" matches several categories.']}},
+            {'index': 1, 'errors': {'category': ['Category slug "pies" does not exist.']}},
+        ])
+
+    def test_ids_are_checked(self):
+        first, second = self.items[0].id, self.items[1].id
+        with self.assertRaises(bulk.BulkError) as caught:
+            bulk.update_items([{'id': first, 'title': 'A'}, {'id': first, 'title': 'B'}, {'title': 'C'}])
+        self.assertRowErrors(caught.exception, {1: 'id', 2: 'id'})
+        with self.assertRaises(bulk.BulkError) as caught:
+            bulk.delete_items([first, second, second, 'x', 99999])
+        self.assertRowErrors(caught.exception, {2: 'id', 3: 'id'})
+        with self.assertRaises(bulk.BulkError) as caught:
+            bulk.delete_items([first, 99999])
+        self.assertRowErrors(caught.exception, {1: 'id'})
+        self.assertTrue(MenuItem.objects.filter(id=first).exists())
+
+    def test_catalog_version_is_bumped_once_per_batch(self):
+        for write in [
+            lambda: bulk.create_items([self.row(f'New {i}') for i in range(3)]),
+            lambda: bulk.update_items([{'id': item.id, 'featured': True} for item in self.items[:3]]),
+            lambda: bulk.delete_items([item.id for item in self.items[:3]]),
+        ]:
+            version = catalog.get_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertEqual(catalog.get_version(), version + 1)
+
+    def test_import_menu(self):
+        count = MenuItem.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/menu.csv'
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('title,price,featured,category\nSoup,3.50,,mains\nStew,4,true,mains\n')
+            out = StringIO()
+            call_command('import_menu', path, dry_run=True, stdout=out)
+            self.assertIn('2 rows are valid', out.getvalue())
+            self.assertEqual(MenuItem.objects.count(), count)
+            call_command('import_menu', path, stdout=StringIO())
+            self.assertEqual(MenuItem.objects.count(), count + 2)
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write('Pie,abc,,mains\n')
+            err = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('import_menu', path, stdout=StringIO(), stderr=err)
+            self.assertIn('line 4: price:', err.getvalue())
+        self.assertEqual(MenuItem.objects.count(), count + 2)
+
+
+class CartPatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.customer)
+        self.client.post('/api/cart/menu-items/', {'menuitem_id': self.items[0].id, 'quantity': 2}, format='json')
+        self.client.post('/api/cart/menu-items/', {'menuitem_id': self.items[1].id, 'quantity': 1}, format='json')
+
+    def lines(self):
+        return dict(Cart.objects.filter(user=self.customer).values_list('menuitem_id', 'quantity'))
+
+    def test_upserts_and_removes(self):
+        first, second, third = (item.id for item in self.items[:3])
+        response = self.client.patch('/api/cart/menu-items/', [
+            {'menuitem_id': first, 'quantity': 5},
+            {'menuitem_id': second, 'quantity': 0},
+            {'menuitem_id': third, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {first: 5, third: 1})
+        self.assertEqual(Cart.objects.get(user=self.customer, menuitem_id=first).price, Decimal('5.00'))
+        # 5 x 1.00 + 1 x 3.00
+        self.assertEqual(response.data['total'], '8.00')
+        self.assertEqual(sorted(line['menuitem']['id'] for line in response.data['items']), [first, third])
+
+    def test_invalid_rows_change_nothing(self):
+        first, second = self.items[0].id, self.items[1].id
+        before = self.lines()
+        for rows, index, field in [
+            ([{'menuitem_id': first, 'quantity': 1}, {'menuitem_id': first, 'quantity': 2}], 1, 'menuitem_id'),
+            ([{'menuitem_id': second, 'quantity': 3}, {'menuitem_id': 99999, 'quantity': 1}], 1, 'menuitem_id'),
+            ([{'menuitem_id': first, 'quantity': -1}], 0, 'quantity'),
+            # 10000 x 1.00 is over bulk.MAX_LINE_PRICE.
+            ([{'menuitem_id': second, 'quantity': 0}, {'menuitem_id': first, 'quantity': 10000}], 1, 'quantity'),
+        ]:
+            with self.subTest(rows=rows):
+                response = self.client.patch('/api/cart/menu-items/', rows, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual([(error['index'], list(error['errors'])) for error in response.data['errors']],
+                                 [(index, [field])])
+                self.assertEqual(self.lines(), before)
+        response = self.client.patch('/api/cart/menu-items/', {'menuitem_id': first}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_total_of_an_emptied_cart(self):
+        self.assertEqual(bulk.update_cart(self.customer, [
+            {'menuitem_id': self.items[0].id, 'quantity': 0}, {'menuitem_id': self.items[1].id, 'quantity': 0},
+        ]), Decimal('0.00'))
+        self.assertEqual(self.lines(), {})
+
+
+class DispatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.get(name=DELIVERY_CREW)
+        self.second = User.objects.create_user('crew-2')
+        self.third = User.objects.create_user('crew-3')
+        self.group.user_set.add(self.second, self.third)
+        dispatch.index.invalidate()
+
+    def open_orders(self, crew, count):
+        Order.objects.bulk_create([Order(user=self.customer, delivery_crew=crew, total=1, status=False)] * count)
+
+    def test_pick_takes_the_least_loaded(self):
+        self.open_orders(self.crew, 2)
+        self.open_orders(self.third, 1)
+        Order.objects.create(user=self.customer, delivery_crew=self.second, total=1, status=True)
+        self.assertEqual(dispatch.pick(), self.second.id)
+        self.assertEqual(dispatch.index.loads(), {self.crew.id: 2, self.second.id: 1, self.third.id: 1})
+        # Orders the index has not seen (another worker's) are found by the recount.
+        self.open_orders(self.second, 3)
+        self.assertEqual(dispatch.pick(), self.third.id)
+        self.assertEqual(dispatch.index.loads()[self.second.id], 3)
+
+    def test_index_follows_group_membership(self):
+        self.open_orders(self.crew, 2)
+        self.open_orders(self.third, 1)
+        dispatch.refresh()
+        self.second.groups.remove(self.group)
+        self.assertTrue(dispatch.index.stale(3600))
+        self.assertEqual(dispatch.pick(), self.third.id)
+        self.assertNotIn(self.second.id, dispatch.index.loads())
+        newcomer = User.objects.create_user('crew-4')
+        self.group.user_set.add(newcomer)
+        self.assertEqual(dispatch.pick(), newcomer.id)
+        self.group.user_set.clear()
+        self.assertIsNone(dispatch.pick())
+
+    def test_rebalance(self):
+        self.open_orders(self.crew, 4)
+        self.open_orders(None, 2)
+        self.assertEqual(len(dispatch.rebalance(dry_run=True)), 4)
+        self.assertEqual(dispatch.current_loads(), {self.crew.id: 4, self.second.id: 0, self.third.id: 0})
+        with mock.patch('LittleLemonAPI.events.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                moves = dispatch.rebalance()
+                publish.assert_not_called()
+        self.assertEqual(sorted(dispatch.current_loads().values()), [2, 2, 2])
+        self.assertEqual(len(moves), 4)
+        published = {payload['id']: payload for (payload,), _ in publish.call_args_list}
+        self.assertEqual(
+            {(order_id, before, after) for order_id, before, after in moves},
+            {(order_id, payload['previous_delivery_crew'], payload['delivery_crew'])
+             for order_id, payload in published.items()},
+        )
+        self.assertEqual(dispatch.rebalance(), [])
+
+
+class JobTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        self.failures = 0
+        patcher = mock.patch.dict(jobs._handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @jobs.handler('tests.flaky')
+        def flaky(n):
+            self.calls.append(n)
+            if len(self.calls) <= self.failures:
+                raise ValueError('boom')
+
+    def due(self):
+        Job.objects.update(run_at=timezone.now())
+
+    def test_expired_leases_are_reclaimed(self):
+        jobs.enqueue('tests.flaky', {'n': 1})
+        [first] = jobs.claim(10)
+        self.assertEqual(jobs.claim(10), [])
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [second] = jobs.claim(10)
+        self.assertEqual(second.attempts, 2)
+        # The first worker lost its lease: its run does nothing.
+        self.assertEqual(jobs.run(first), 'skipped')
+        self.assertEqual(jobs.run(second), 'done')
+        self.assertEqual(self.calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(LITTLELEMON_JOBS_BACKOFF=10, LITTLELEMON_JOBS_MAX_ATTEMPTS=3)
+    def test_retries_with_backoff_then_dead(self):
+        self.failures = 3
+        jobs.enqueue('tests.flaky', {'n': 1}, key='k')
+        with self.assertLogs('LittleLemonAPI.jobs', 'WARNING') as logs:
+            for attempt, (low, high) in enumerate([(5, 15), (10, 30)], 1):
+                started = timezone.now()
+                [job] = jobs.claim(10)
+                self.assertEqual(jobs.run(job), 'retry')
+                job = Job.objects.get()
+                self.assertEqual((job.attempts, job.locked_until), (attempt, None))
+                self.assertIn('boom', job.last_error)
+                delay = (job.run_at - started).total_seconds()
+                self.assertTrue(low <= delay <= high + 1, delay)
+                self.assertEqual(jobs.claim(10), [])
+                self.due()
+            [job] = jobs.claim(10)
+            self.assertEqual(jobs.run(job), 'dead')
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'WARNING', 'ERROR'])
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.name, dead.payload, dead.key, dead.attempts), ('tests.flaky', {'n': 1}, 'k', 3))
+        self.assertIn('ValueError: boom', dead.error)
+
+        self.assertEqual(jobs.retry_dead(), 1)
+        self.assertFalse(DeadJob.objects.exists())
+        self.assertEqual(Job.objects.get().attempts, 0)
+        self.assertEqual(jobs.Worker(threads=1).run(once=True)['done'], 1)
+        self.assertEqual(self.calls, [1, 1, 1, 1])
+
+    def test_deleting_an_order_cancels_its_rollup_job(self):
+        client = self.client_for(self.customer)
+        manager = self.client_for(self.manager)
+        for quantity in (1, 2):
+            client.post('/api/cart/menu-items/', {'menuitem_id': self.items[0].id, 'quantity': quantity}, format='json')
+            client.post('/api/orders/')
+        first, second = Order.objects.order_by('id')
+        self.assertEqual(Job.objects.filter(name=rollups.RECORD_ORDER).count(), 2)
+        manager.delete(f'/api/orders/{second.id}/')
+        # Never added, so nothing is subtracted.
+        self.assertEqual(Job.objects.get().payload['order_id'], first.id)
+        self.assertEqual(jobs.Worker(threads=1).run(once=True)['done'], 1)
+        self.assertEqual(DailySales.objects.get().quantity, 1)
+        manager.delete(f'/api/orders/{first.id}/')
+        self.assertEqual(DailySales.objects.get().quantity, 0)
+
+
+@override_settings(LITTLELEMON_READ_REPLICAS=['replica'], LITTLELEMON_REPLICA_PATHS=['/api/menu-items/', '/api/orders/'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The alias each read is routed to under ReplicaMiddleware, read off the
+    querysets (QuerySet.db asks the router), so the replica need not exist.
+    Not a TestCase: the router keeps reads inside a transaction on the primary.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User(id=1, username='customer')
+        self.manager = User(id=2, username='manager')
+        self.addCleanup(replicas._route.set, None)
+
+    def request(self, method, path, user, status=200, reads=()):
+        # Runs the middleware around a view that records where `reads` go.
+        routed = {}
+
+        def view(request):
+            for name, read in reads:
+                routed[name] = read()
+            return HttpResponse(status=status)
+        request = getattr(APIRequestFactory(), method)(path)
+        request.user = user
+        replicas.ReplicaMiddleware(view)(request)
+        return routed
+
+    def menu_read(self, user, path='/api/menu-items/'):
+        return self.request('get', path, user, reads=[('menu', lambda: MenuItem.objects.all().db)])['menu']
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.assertEqual(self.menu_read(self.customer), 'replica')
+        self.request('post', '/api/orders/', self.customer, status=400)
+        self.assertEqual(self.menu_read(self.customer), 'replica')
+        self.request('post', '/api/orders/', self.customer, status=201)
+        self.assertEqual(self.menu_read(self.customer), 'default')
+        self.assertEqual(self.menu_read(self.manager), 'replica')
+        cache.clear()  # the sticky window has passed
+        self.assertEqual(self.menu_read(self.customer), 'replica')
+
+    def test_primary_overrides_the_route(self):
+        def in_primary():
+            with replicas.primary():
+                return MenuItem.objects.all().db
+
+        def in_transaction():
+            with transaction.atomic():
+                return Order.objects.all().db
+        routed = self.request('get', '/api/menu-items/', self.customer, reads=[
+            ('primary', in_primary), ('atomic', in_transaction), ('after', lambda: MenuItem.objects.all().db),
+        ])
+        self.assertEqual(routed, {'primary': 'default', 'atomic': 'default', 'after': 'replica'})
+
+    def test_only_this_apps_reads_on_listed_paths(self):
+        routed = self.request('get', '/api/orders/', self.customer, reads=[
+            ('order', lambda: Order.objects.all().db), ('user', lambda: User.objects.all().db),
+            ('group', lambda: Group.objects.all().db), ('token', lambda: Token.objects.all().db),
+        ])
+        self.assertEqual(routed, {'order': 'replica', 'user': 'default', 'group': 'default', 'token': 'default'})
+        self.assertEqual(self.menu_read(self.customer, '/api/groups/manager/users/'), 'default')
+        self.assertEqual(self.request('post', '/api/menu-items/', self.manager, reads=[
+            ('menu', lambda: MenuItem.objects.all().db),
+        ]), {'menu': 'default'})
+        self.assertFalse(replicas.ReplicaRouter().allow_migrate('replica', 'LittleLemonAPI'))
+
+
+class SerializationFailure(Exception):
+    sqlstate = '40001'
+
+
+@override_settings(LITTLELEMON_DB_RETRIES=2)
+class RetryTests(TransactionTestCase):
+    """Not a TestCase: its transaction would turn retries off."""
+
+    def call(self, *outcomes):
+        # A view raising each exception of `outcomes` in turn, or returning it.
+        calls = []
+
+        @retry_on_lock
+        def view(request):
+            outcome = outcomes[len(calls)]
+            calls.append(outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        with mock.patch('LittleLemonAPI.retry.time') as clock:
+            try:
+                return view(APIRequestFactory().post('/x')), len(calls)
+            finally:
+                self.sleeps = [sleep.args[0] for sleep in clock.sleep.call_args_list]
+
+    def test_lock_contention_is_retried(self):
+        locked = OperationalError('database is locked')
+        serialization = OperationalError('could not serialize access')
+        serialization.__cause__ = SerializationFailure()
+        with self.assertLogs('LittleLemonAPI.retry', 'WARNING'):
+            self.assertEqual(self.call(locked, serialization, 'ok'), ('ok', 3))
+        # LITTLELEMON_DB_RETRY_BACKOFF (0.05s) doubled per attempt, randomized by +-50%.
+        self.assertTrue(0.025 <= self.sleeps[0] <= 0.075 and 0.05 <= self.sleeps[1] <= 0.15, self.sleeps)
+        with self.assertLogs('LittleLemonAPI.retry', 'WARNING'), self.assertRaises(OperationalError):
+            self.call(locked, locked, locked, 'never')
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_other_errors_are_not_retried(self):
+        for error in (OperationalError('no such table: x'), IntegrityError('locked'), ValueError('locked')):
+            with self.subTest(error=error), self.assertRaises(type(error)):
+                self.call(error, 'never')
+            self.assertEqual(self.sleeps, [])
+
+    def test_not_retried_inside_a_transaction(self):
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            self.call(OperationalError('database is locked'), 'never')
+        self.assertEqual(self.sleeps, [])
+
+
+class CatalogTests(APITestCase):
+    def test_version_is_bumped_on_commit_only(self):
+        item = self.items[0]
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError), transaction.atomic():
+                item.title = 'Renamed'
+                item.save()
+                raise ValueError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(catalog.get_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+            self.assertEqual(catalog.get_version(), version)
+        self.assertEqual(catalog.get_version(), version + 1)
+
+    def test_batch_bumps_once(self):
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic(), catalog.batch():
+                for item in self.items[:3]:
+                    item.featured = not item.featured
+                    item.save()
+                with catalog.batch():
+                    self.items[3].delete()
+                self.category.save()
+        self.assertEqual(catalog.get_version(), version + 1)
+
+    def test_stats(self):
+        built = []
+
+        def builder(payload):
+            def build():
+                built.append(payload)
+                return payload
+            return build
+        before = catalog.stats()
+        self.assertEqual(catalog.menu_item(1, builder('one')), 'one')  # miss
+        self.assertEqual(catalog.menu_item(1, builder('two')), 'one')  # local hit
+        catalog.clear_local()
+        self.assertEqual(catalog.menu_item(1, builder('three')), 'one')  # shared hit
+        self.assertIsNone(catalog.menu_item(2, builder(None)))  # miss, not cached
+        self.assertIsNone(catalog.menu_item(2, builder(None)))  # miss again
+        after = catalog.stats()
+        self.assertEqual(built, ['one', None, None])
+        self.assertEqual(
+            {name: after[name] - before[name] for name in ('local_hits', 'shared_hits', 'misses')},
+            {'local_hits': 1, 'shared_hits': 1, 'misses': 3},
+        )
+        self.assertEqual(after['size'], 1)
+
+
+class CheckoutTests(APITestCase):
+    def test_cart_becomes_the_order(self):
+        client = self.client_for(self.customer)
+        for item, quantity in ((self.items[1], 3), (self.items[4], 1)):
+            client.post('/api/cart/menu-items/', {'menuitem_id': item.id, 'quantity': quantity}, format='json')
+        response = client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['id'])
+        # 3 x 2.00 + 1 x 5.00
+        self.assertEqual(order.total, Decimal('11.00'))
+        self.assertEqual((order.user_id, order.status, order.delivery_crew_id), (self.customer.id, False, self.crew.id))
+        self.assertEqual(
+            sorted(order.order_items.values_list('menuitem_id', 'quantity', 'unit_price', 'price')),
+            [(self.items[1].id, 3, Decimal('2.00'), Decimal('6.00')), (self.items[4].id, 1, Decimal('5.00'), Decimal('5.00'))],
+        )
+        self.assertEqual(response.data['total'], '11.00')
+        self.assertEqual(len(response.data['order_items']), 2)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        self.assertTrue(Job.objects.filter(name=rollups.RECORD_ORDER, payload__order_id=order.id).exists())
+
+    def test_empty_cart(self):
+        response = self.client_for(self.customer).post('/api/orders/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Cart is empty'})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client_for(self.crew).post('/api/orders/').status_code, 403)
+
+
+class ExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first = Order.objects.create(user=cls.customer, delivery_crew=cls.crew, total=Decimal('7.00'), status=True)
+        cls.empty = Order.objects.create(user=cls.customer, total=0, status=False)
+        cls.last = Order.objects.create(user=cls.customer, total=Decimal('3.00'), status=False)
+        # Created out of order, so grouping can't rely on insertion order.
+        for order, item, quantity in ((cls.last, cls.items[2], 1), (cls.first, cls.items[0], 2),
+                                      (cls.first, cls.items[4], 1)):
+            OrderItem.objects.create(order=order, menuitem=item, quantity=quantity,
+                                     unit_price=item.price, price=item.price * quantity)
+
+    def export(self, output):
+        response = self.client_for(self.manager).get('/api/orders/export/', {'output': output})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], exports.FORMATS[output][1])
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        orders = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([order['id'] for order in orders], [self.first.id, self.empty.id, self.last.id])
+        self.assertEqual(orders[0]['total'], '7.00')
+        self.assertEqual(
+            [(row['menuitem'], row['quantity'], row['price']) for row in orders[0]['order_items']],
+            [(self.items[0].id, 2, '2.00'), (self.items[4].id, 1, '5.00')],
+        )
+        self.assertEqual(orders[1]['order_items'], [])
+        self.assertEqual([row['menuitem'] for row in orders[2]['order_items']], [self.items[2].id])
+
+    def test_csv(self):
+        header, *rows = csv.reader(StringIO(self.export('csv')))
+        self.assertEqual(header, list(exports.CSV_HEADER))
+        self.assertEqual(len(header), len(exports.COLUMNS))
+        self.assertTrue(all(len(row) == len(header) for row in rows))
+        # One row per item, and a single row with empty item columns for the order without items.
+        self.assertEqual([row[0] for row in rows], [str(self.first.id)] * 2 + [str(self.empty.id), str(self.last.id)])
+        self.assertEqual(rows[1][6:], [str(self.first.order_items.order_by('id')[1].id), str(self.items[4].id),
+                                       '1', '5.00', '5.00'])
+        self.assertEqual(rows[2][6:], [''] * 5)
+
+    def test_unknown_output(self):
+        response = self.client_for(self.manager).get('/api/orders/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SelectionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.order = Order.objects.create(user=cls.customer, total=Decimal('5.00'), status=False)
+        cls.lines = OrderItem.objects.bulk_create([
+            OrderItem(order=cls.order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for item in cls.items[:2]
+        ])
+
+    def test_unknown_fields_are_rejected(self):
+        client = self.client_for(self.customer)
+        for url, params in [
+            ('/api/menu-items/', {'fields': 'id,colour'}),
+            ('/api/menu-items/', {'fields': 'category.colour'}),
+            ('/api/menu-items/', {'fields': 'category_id'}),  # write only
+            ('/api/menu-items/', {'fields': 'title.length'}),
+            ('/api/menu-items/', {'expand': 'price'}),
+            ('/api/menu-items/search/', {'q': 'item', 'fields': 'total'}),
+            (f'/api/menu-items/{self.items[0].id}/', {'fields': 'id.title'}),
+            ('/api/cart/menu-items/', {'expand': 'menuitem.nothing'}),
+            ('/api/orders/', {'fields': 'id,order_items.colour'}),
+            (f'/api/orders/{self.order.id}/', {'expand': 'order_items..menuitem'}),
+        ]:
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, 400, (url, params))
+            self.assertEqual(list(response.data), list(params)[-1:], (url, params))
+        # A trailing comma is just an empty name.
+        self.assertEqual(client.get('/api/menu-items/', {'fields': 'id,'}).status_code, 200)
+
+    def test_collapsed_relations_are_ids(self):
+        selection = fieldsets.Selection(expand=frozenset())
+        order = Order.objects.for_serializer(selection).get(id=self.order.id)
+        data = OrderSerializer(order, context={'selection': selection}).data
+        self.assertEqual(data['order_items'], [line.id for line in self.lines])
+        response = self.client_for(self.customer).get(
+            f'/api/orders/{self.order.id}/', {'fields': 'id,order_items', 'expand': 'order_items'},
+        )
+        self.assertEqual([line['menuitem'] for line in response.data['order_items']],
+                         [item.id for item in self.items[:2]])
+        item = MenuItemSerializer(self.items[0], context={'selection': selection}).data
+        self.assertEqual(item['category'], self.category.id)
+
+    def test_only_selected_relations_are_loaded(self):
+        Cart.objects.create(user=self.customer, menuitem=self.items[0], quantity=1, unit_price=1, price=1)
+        # (model, selection, queries, tables joined to the last query)
+        for model, raw, queries, joins in [
+            (Order, '', 2, {'menuitem', 'category'}),
+            (Order, 'expand=order_items.menuitem', 2, {'menuitem'}),
+            (Order, 'expand=order_items', 2, set()),
+            (Order, 'expand=', 2, set()),  # the item ids
+            (Order, 'fields=id,total', 1, set()),
+            (Cart, '', 1, {'menuitem', 'category'}),
+            (Cart, 'fields=id,menuitem.title', 1, {'menuitem'}),
+            (Cart, 'expand=', 1, set()),
+        ]:
+            serializer_class = OrderSerializer if model is Order else CartSerializer
+            selection = fieldsets.from_params(QueryDict(raw), serializer_class)
+            with self.subTest(model=model.__name__, selection=raw), self.assertNumQueries(queries) as captured:
+                serializer_class(model.objects.for_serializer(selection), many=True, context={'selection': selection}).data
+            joined = set(re.findall(r'JOIN "LittleLemonAPI_(\w+)"', captured.captured_queries[-1]['sql']))
+            self.assertEqual(joined, joins, raw)
+
+
+class InstrumentationTests(APITestCase):
+    def timings(self, response):
+        return {name: float(dur) for name, dur in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])}
+
+    def test_serialize_is_timed_where_views_serialize(self):
+        client = self.client_for(self.customer)
+        client.post('/api/cart/menu-items/', {'menuitem_id': self.items[0].id, 'quantity': 1}, format='json')
+        for url in ('/api/menu-items/', '/api/cart/menu-items/', '/api/orders/'):
+            timings = self.timings(client.get(url))
+            self.assertLessEqual(timings['serialize'] + timings['db'], timings['total'], url)
+        self.assertNotIn('serialize', self.timings(client.delete('/api/cart/menu-items/')))
+
+
+class SearchTests(APITestCase):
+    def test_limit_is_clamped(self):
+        client = self.client_for(self.customer)
+        for limit, count in [('0', 1), ('-5', 1), ('3', 3), ('1000', 6)]:
+            response = client.get('/api/menu-items/search/', {'q': 'item', 'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+            self.assertEqual(len(response.data['results']), count, limit)
+        response = client.get('/api/menu-items/search/', {'q': 'item', 'limit': 'many'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_statements_use_the_quoted_tables(self):
+        names = search.tables()
+        self.assertEqual(names['menu'], connection.ops.quote_name(MenuItem._meta.db_table))
+        for statements in search.STATEMENTS.values():
+            for sql in (s for group in statements for s in group):
+                sql = sql.format(**names)
+                self.assertNotRegex(sql, r'\blittlelemonapi_(menuitem|category)\b(?!_)')
+        self.assertEqual(search.rebuild(), len(self.items))
+        self.assertEqual(len(search.search('item')), len(self.items))
+        # The triggers, also created from the quoted names, follow renames.
+        self.category.title = 'Pastries'
+        self.category.save()
+        self.assertEqual(len(search.search('pastr')), len(self.items))
+
+
+class ReportTests(APITestCase):
+    def test_top_items_limit_is_clamped(self):
+        client = self.client_for(self.manager)
+        for limit in ('0', '-1'):
+            response = client.get('/api/reports/top-items/', {'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+
+
+class ThrottleTests(APITestCase):
+    def test_local_bucket_bursts_then_refills(self):
+        buckets = throttling.LocalBuckets()
+        with mock.patch('LittleLemonAPI.throttling.time') as clock:
+            clock.monotonic.return_value = 100.0
+            waits = [buckets.take('k', 3, 60).wait for _ in range(4)]
+            self.assertEqual(waits[:3], [0, 0, 0])
+            self.assertAlmostEqual(waits[3], 20)  # a token every 20s
+            self.assertEqual(buckets.take('other', 3, 60).wait, 0)
+            clock.monotonic.return_value = 120.0
+            self.assertEqual(buckets.take('k', 3, 60).wait, 0)
+            self.assertAlmostEqual(buckets.take('k', 3, 60).wait, 20)
+
+    def test_cache_buckets_slide(self):
+        buckets = throttling.CacheBuckets()
+        with mock.patch('LittleLemonAPI.throttling.time') as clock:
+            clock.time.return_value = 600.0
+            waits = [buckets.take('k', 3, 60).wait for _ in range(4)]
+            self.assertEqual(waits, [0, 0, 0, 60])
+            clock.time.return_value = 630.0
+            self.assertEqual(buckets.take('k', 3, 60).wait, 30)
+            # Half of the previous window's 5 requests still count.
+            clock.time.return_value = 690.0
+            self.assertAlmostEqual(buckets.take('k', 3, 60).wait, 6)
+            clock.time.return_value = 720.0
+            self.assertEqual(buckets.take('k', 3, 60).wait, 0)
+
+    def test_anonymous_writes_are_limited(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        for _ in range(30):
+            self.assertEqual(client.post('/api/cart/menu-items/', {}).status_code, 401)
+        response = client.post('/api/cart/menu-items/', {})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(response['RateLimit-Limit'], '30')
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+
+    @override_settings(LITTLELEMON_THROTTLE_RULES=[
+        ('writes', '/api/', 'POST', {'manager': '5/min'}),
+        ('api', '/api/', '*', {'anon': '1/min'}),
+    ])
+    def test_unlisted_role_falls_through(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/cart/menu-items/', {}).status_code, 401)
+        self.assertEqual(client.post('/api/cart/menu-items/', {}).status_code, 429)
+
+
+class AsyncViewTests(APITestCase):
+    """The async read views answer exactly as the DRF views they stand in for."""
+
+    def test_same_responses(self):
+        client = self.client_for(self.customer)
+        for item in self.items[:2]:
+            client.post('/api/cart/menu-items/', {'menuitem_id': item.id, 'quantity': 2}, format='json')
+        order = client.post('/api/orders/').data['id']
+        client.post('/api/cart/menu-items/', {'menuitem_id': self.items[3].id, 'quantity': 1}, format='json')
+        key = Token.objects.create(user=self.customer).key
+        item = self.items[0].id
+        for view, url, kwargs in [
+            (async_views.menu_items, '/api/menu-items/?ordering=-price&page_size=4', {}),
+            (async_views.single_menu_item, f'/api/menu-items/{item}/?fields=id,title', {'menuItem': item}),
+            (async_views.menu_item_search, '/api/menu-items/search/?q=item&limit=3', {}),
+            (async_views.cart_items, '/api/cart/menu-items/', {}),
+            (async_views.orders, '/api/orders/?fields=id,total', {}),
+            (async_views.single_order, f'/api/orders/{order}/', {'orderId': order}),
+            (async_views.single_order, f'/api/orders/{order + 1}/', {'orderId': order + 1}),
+        ]:
+            with self.subTest(url=url):
+                expected = client.get(url)
+                request = AsyncRequestFactory().get(url, headers={'Authorization': f'Token {key}'})
+                response = async_to_sync(view)(request, **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), expected.json())
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+
+class EventStreamTests(TransactionTestCase):
+    """order_events through the ASGI handler, which keeps no thread per stream."""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer', password='lemon')
+        self.other = User.objects.create_user('other', password='lemon')
+        self.order = Order.objects.create(user=self.customer, total=1, status=False)
+        self.other_order = Order.objects.create(user=self.other, total=1, status=False)
+        self.key = Token.objects.create(user=self.customer).key
+        self.application = StreamingASGIHandler()
+
+    async def open(self, query='', key=None):
+        path = '/api/orders/events/'
+        headers = [(b'host', b'testserver'), (b'accept', b'text/event-stream')]
+        if key:
+            headers.append((b'authorization', f'Token {key}'.encode()))
+        communicator = ApplicationCommunicator(self.application, {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 50000), 'headers': headers,
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b'', 'more_body': False})
+        start = await communicator.receive_output(5)
+        return communicator, start['status']
+
+    async def body(self, communicator):
+        return (await communicator.receive_output(5))['body'].decode()
+
+    async def close(self, communicator):
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    def publish(self, order):
+        events.publish(events.order_payload(order.id, order.user_id, None, True, timezone.now()))
+
+    def test_streams_the_users_orders(self):
+        async def run():
+            communicator, status = await self.open(key=self.key)
+            self.assertEqual(status, 200)
+            self.assertTrue((await self.body(communicator)).startswith('retry: '))
+            self.publish(self.other_order)
+            self.publish(self.order)
+            event = await self.body(communicator)
+            self.assertIn('event: order', event)
+            self.assertEqual(json.loads(event.split('data: ')[1])['id'], self.order.id)
+            await self.close(communicator)
+        async_to_sync(run)()
+        self.assertEqual(events.hub.subscriber_count(), 0)
+
+    def test_rejected_before_streaming(self):
+        async def run():
+            for query, key, expected in [
+                ('', None, 401),
+                ('', 'bad', 401),
+                ('order=abc', self.key, 400),
+                (f'order={self.other_order.id}', self.key, 403),
+                (f'order={self.other_order.id + 100}', self.key, 404),
+            ]:
+                communicator, status = await self.open(query, key)
+                self.assertEqual(status, expected, (query, key))
+                await communicator.wait(5)
+        async_to_sync(run)()
+
+    def test_idle_streams_hold_no_thread(self):
+        async def run():
+            streams = []
+            for _ in range(3):
+                communicator, _ = await self.open(key=self.key)
+                await self.body(communicator)
+                streams.append(communicator)
+            before = threading.active_count()
+            for _ in range(20):
+                communicator, _ = await self.open(f'order={self.order.id}', self.key)
+                await self.body(communicator)
+                streams.append(communicator)
+            self.assertLess(threading.active_count() - before, 5)
+            for communicator in streams:
+                await self.close(communicator)
+        async_to_sync(run)()
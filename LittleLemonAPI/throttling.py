@@ -0,0 +1,263 @@
+# LittleLemonAPI/throttling.py
+# Request rate limits, as token buckets.
+#
+# ThrottleMiddleware matches each request against the rules in
+# settings.LITTLELEMON_THROTTLE_RULES. A rule names a scope, the path prefix
+# and methods it covers and a rate per role: manager, crew, customer or anon.
+# The first matching rule with a rate for the caller's role wins; a role no
+# matching rule gives a rate is not limited. The request takes a
+# token from the bucket of (scope, user), or (scope, client IP) when it is not
+# authenticated. A bucket holds `num` tokens and refills at num/period, so a
+# client can burst up to its rate and then continue at it. An empty bucket
+# answers 429 with Retry-After; limited responses carry RateLimit-Limit,
+# RateLimit-Remaining and RateLimit-Reset (seconds until the bucket is full).
+#
+# Buckets live in the process (LITTLELEMON_THROTTLE_BACKEND = 'local'), so with
+# N workers a client gets up to N times its rate. 'cache' keeps the counts in
+# LITTLELEMON_THROTTLE_CACHE, which must then be shared (Redis, Memcached).
+# Django's cache API has an atomic incr but no compare-and-set, so that mode
+# counts requests per period-long window and adds the part of the previous
+# window that still falls within the last period: a sliding window, which
+# approximates the bucket's steady refill.
+#
+# Each process remembers a user's role for LITTLELEMON_THROTTLE_ROLE_TTL
+# seconds, so the limits of a promoted user can lag by that much; permission
+# checks read the roles afresh (permissions.py).
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.throttling import BaseThrottle
+
+from .authentication import CachedTokenAuthentication, aauthenticate
+from .lru import LRUCache
+from .permissions import DELIVERY_CREW, MANAGER, aload_roles, load_roles
+
+ANON = 'anon'
+CACHE_PREFIX = 'littlelemon:throttle:'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# limit: the bucket size; wait: seconds until the next token, 0 if allowed.
+Decision = namedtuple('Decision', 'limit remaining reset wait')
+
+
+def parse_rate(rate):
+    """'100/min' -> (100, 60), as DRF's throttles read their rates."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+_roles = LRUCache(
+    maxsize=getattr(settings, 'LITTLELEMON_THROTTLE_LOCAL_SIZE', 10000),
+    ttl=getattr(settings, 'LITTLELEMON_THROTTLE_ROLE_TTL', 30),
+)
+
+
+def role_of(roles):
+    if MANAGER in roles:
+        return 'manager'
+    if DELIVERY_CREW in roles:
+        return 'crew'
+    return 'customer'
+
+
+class Rule:
+    def __init__(self, scope, prefix, methods, rates):
+        self.scope = scope
+        self.prefix = prefix
+        self.methods = None if methods == '*' else frozenset(methods.split())
+        self.rates = {role: parse_rate(rate) for role, rate in rates.items()}
+
+    def matches(self, request):
+        return request.path.startswith(self.prefix) and (self.methods is None or request.method in self.methods)
+
+
+class LocalBuckets:
+    """Token buckets in this process; the least recently used are dropped past `maxsize`."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, num, period):
+        now = time.monotonic()
+        refill = num / period
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = num
+            else:
+                tokens = min(num, bucket[0] + (now - bucket[1]) * refill)
+                self._buckets.move_to_end(key)
+            wait = 0 if tokens >= 1 else (1 - tokens) / refill
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                # A dropped bucket starts full again, as an idle one would be.
+                self._buckets.popitem(last=False)
+        return Decision(num, int(tokens), (num - tokens) / refill, wait)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    """Sliding window counts in a shared Django cache."""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def _keys(self, key, period):
+        now = time.time()
+        window, elapsed = divmod(now, period)
+        current = f'{CACHE_PREFIX}{key}:{int(window)}'
+        previous = f'{CACHE_PREFIX}{key}:{int(window) - 1}'
+        return current, previous, elapsed
+
+    def _decide(self, num, period, count, before, elapsed):
+        # Refused requests are counted too, so a client that keeps retrying
+        # early stays limited.
+        weight = 1 - elapsed / period
+        used = before * weight + count
+        if used <= num:
+            wait = 0
+        elif count > num or not before:
+            wait = period - elapsed
+        else:
+            # When the previous window's share has fallen to num - count.
+            wait = period * (1 - (num - count) / before) - elapsed
+        return Decision(num, max(0, int(num - used)), used * period / num, wait)
+
+    def take(self, key, num, period):
+        current, previous, elapsed = self._keys(key, period)
+        self.cache.add(current, 0, period * 2)
+        try:
+            count = self.cache.incr(current)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.set(current, 1, period * 2)
+            count = 1
+        return self._decide(num, period, count, self.cache.get(previous, 0), elapsed)
+
+    async def atake(self, key, num, period):
+        # Django's cache backends run their async methods in a thread anyway;
+        # one hop for the three calls, to any thread since caches are thread-safe.
+        return await sync_to_async(self.take, thread_sensitive=False)(key, num, period)
+
+
+def buckets():
+    if getattr(settings, 'LITTLELEMON_THROTTLE_BACKEND', 'local') == 'cache':
+        return CacheBuckets(getattr(settings, 'LITTLELEMON_THROTTLE_CACHE', 'default'))
+    return LocalBuckets(getattr(settings, 'LITTLELEMON_THROTTLE_LOCAL_SIZE', 10000))
+
+
+def throttled_response(decision):
+    wait = math.ceil(decision.wait)
+    response = JsonResponse({'detail': str(exceptions.Throttled(wait).detail)}, status=429)
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def set_headers(response, decision):
+    response['RateLimit-Limit'] = str(decision.limit)
+    response['RateLimit-Remaining'] = str(decision.remaining)
+    response['RateLimit-Reset'] = str(math.ceil(decision.reset))
+    return response
+
+
+class ThrottleMiddleware:
+    """
+    Goes after AuthenticationMiddleware. Token users are identified through the
+    same caches as CachedTokenAuthentication, so the view's own authentication
+    costs nothing more; an invalid token is limited by IP and left to the view
+    to reject.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        rules = getattr(settings, 'LITTLELEMON_THROTTLE_RULES', [])
+        if not getattr(settings, 'LITTLELEMON_THROTTLE', True) or not rules:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rules = [Rule(*rule) for rule in rules]
+        self.buckets = buckets()
+        self.authentication = CachedTokenAuthentication()
+        # DRF's client address, which honours REST_FRAMEWORK['NUM_PROXIES'].
+        self.client_ip = BaseThrottle().get_ident
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _rules(self, request):
+        return [rule for rule in self.rules if rule.matches(request)]
+
+    def _limit(self, rules, ident, role):
+        # (bucket key, rate) of the first rule with a rate for `role`, else None.
+        for rule in rules:
+            if role in rule.rates:
+                return f'{rule.scope}:{ident}', rule.rates[role]
+        return None
+
+    def _identify(self, request):
+        try:
+            authenticated = self.authentication.authenticate(request)
+        except exceptions.AuthenticationFailed:
+            return f'ip:{self.client_ip(request)}', ANON
+        user = authenticated[0] if authenticated else request.user
+        if not user.is_authenticated:
+            return f'ip:{self.client_ip(request)}', ANON
+        role = _roles.get(user.id)
+        if role is None:
+            role = role_of(load_roles(user))
+            _roles.set(user.id, role)
+        return f'user:{user.id}', role
+
+    async def _aidentify(self, request):
+        try:
+            user = await aauthenticate(request)
+        except exceptions.AuthenticationFailed:
+            user = None
+        if user is None:
+            return f'ip:{self.client_ip(request)}', ANON
+        role = _roles.get(user.id)
+        if role is None:
+            role = role_of(await aload_roles(user))
+            _roles.set(user.id, role)
+        return f'user:{user.id}', role
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        rules = self._rules(request)
+        limit = rules and self._limit(rules, *self._identify(request))
+        if not limit:
+            return self.get_response(request)
+        key, rate = limit
+        decision = self.buckets.take(key, *rate)
+        if decision.wait:
+            return set_headers(throttled_response(decision), decision)
+        return set_headers(self.get_response(request), decision)
+
+    async def __acall__(self, request):
+        rules = self._rules(request)
+        limit = rules and self._limit(rules, *await self._aidentify(request))
+        if not limit:
+            return await self.get_response(request)
+        key, rate = limit
+        if isinstance(self.buckets, CacheBuckets):
+            decision = await self.buckets.atake(key, *rate)
+        else:
+            decision = self.buckets.take(key, *rate)
+        if decision.wait:
+            return set_headers(throttled_response(decision), decision)
+        return set_headers(await self.get_response(request), decision)
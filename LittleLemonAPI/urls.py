@@ -1,14 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI the read-heavy GETs are served by native async views.
+if settings.LITTLELEMON_ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
 
 urlpatterns=[
-    path('menu-items/',views.menu_items),
-    path('menu-items/<int:menuItem>/',views.single_menu_item),
+    path('menu-items/',read_views.menu_items),
+    path('menu-items/<int:menuItem>/',read_views.single_menu_item),
+    path('menu-items/search/',read_views.menu_item_search),
+    path('catalog/cache-stats/',views.catalog_cache_stats),
+    path('metrics/',views.metrics),
     path('groups/manager/users/',views.manager_users),
     path('groups/manager/users/<int:userId>/',views.manager_user_remove),
     path('groups/delivery-crew/users/',views.delivery_crew_users),
     path('groups/delivery-crew/users/<int:userId>/',views.delivery_crew_user_remove),
-    path('cart/menu-items/',views.cart_items),
-    path('orders/',views.orders),
-    path('orders/<int:orderId>/',views.single_order),
+    path('cart/menu-items/',read_views.cart_items),
+    path('orders/',read_views.orders),
+    path('orders/export/',views.orders_export),
+    path('orders/events/',async_views.order_events),
+    path('orders/<int:orderId>/',read_views.single_order),
+    path('reports/revenue-by-day/',views.report_revenue_by_day),
+    path('reports/top-items/',views.report_top_items),
+    path('reports/crew-deliveries/',views.report_crew_deliveries),
 ]
\ No newline at end of file
@@ -3,49 +3,109 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from django.db.models import Sum
+from .models import Category, MenuItem, Cart, Order, OrderItem, DailySales, DailyCrewDeliveries
 from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer
+from .serializers import RevenueByDaySerializer, TopItemSerializer, CrewDeliveriesSerializer
+from .filters import filter_orders, filter_report_dates, filter_sales
+from . import bulk, catalog, reads, search
+from .services import EmptyCartError, place_order
+from .idempotency import idempotent
+from .retry import retry_on_lock
+from . import exports, fastpaths, fieldsets, instrumentation
+from .permissions import IsManager, is_customer, is_delivery_crew, is_manager
+from .conditional import not_modified, set_validators
 from django.contrib.auth.models import User, Group
+from django.conf import settings
 
 # Category Add (Manager Only)
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManager])
+@retry_on_lock
 def add_category(request):
-    if not request.user.groups.filter(name='Manager').exists():
-        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     serializer = CategorySerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Menu Items
-@api_view(['GET', 'POST'])
+# Menu Items. A list body on POST, PATCH ({"id": ..., <fields>} rows) or
+# DELETE (ids) is a bulk write of the whole batch, see bulk.py.
+@api_view(['GET', 'POST', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
 def menu_items(request):
     if request.method == 'GET':
-        items = MenuItem.objects.all()
-        serializer = MenuItemSerializer(items, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build():
+            paginator, rows, data = reads.menu_list(request)
+            page = paginator.paginate_queryset(rows, request)
+            with instrumentation.serializing(request):
+                return paginator.get_paginated_response(data(page)).data
+        url = request.build_absolute_uri()
+        etag = catalog.etag('list', url)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response = Response(catalog.menu_list(url, build), status=status.HTTP_200_OK)
+        return set_validators(response, etag)
+    elif not is_manager(request):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+    elif isinstance(request.data, list):
+        return bulk_menu_items(request)
     elif request.method == 'POST':
-        if not request.user.groups.filter(name='Manager').exists():
-            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         serializer = MenuItemSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'error': 'Expected a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+def bulk_menu_items(request):
+    rows = request.data
+    limit = getattr(settings, 'LITTLELEMON_BULK_MAX_ROWS', 1000)
+    if len(rows) > limit:
+        return Response({'error': f'At most {limit} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        if request.method == 'DELETE':
+            deleted = bulk.delete_items(rows)
+            return Response({'message': 'Deleted', 'deleted': deleted}, status=status.HTTP_200_OK)
+        elif request.method == 'POST':
+            items, code = bulk.create_items(rows), status.HTTP_201_CREATED
+        else:
+            items, code = bulk.update_items(rows), status.HTTP_200_OK
+    except bulk.BulkError as exc:
+        return Response({'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+    # Re-read with the category, in the order of the request.
+    rows, data = fastpaths.menu_items(MenuItem.objects.filter(id__in=[item.id for item in items]))
+    found = {row.id: row for row in rows}
+    return Response(data([found[item.id] for item in items]), status=code)
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
 def single_menu_item(request, menuItem):
-    item = get_object_or_404(MenuItem, id=menuItem)
     if request.method == 'GET':
-        serializer = MenuItemSerializer(item, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    elif request.method in ['PUT', 'PATCH']:
-        if not request.user.groups.filter(name='Manager').exists():
+        selection = fieldsets.from_params(request.query_params, MenuItemSerializer)
+        key, queryset = reads.menu_item(menuItem, selection)
+        def build():
+            item = queryset.first()
+            if item is None:
+                return None
+            with instrumentation.serializing(request):
+                return MenuItemSerializer(item, context={'request': request, 'selection': selection}).data
+        etag = catalog.etag('item', key)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        data = catalog.menu_item(key, build)
+        if data is None:
+            raise Http404
+        return set_validators(Response(data, status=status.HTTP_200_OK), etag)
+    item = get_object_or_404(MenuItem.objects.for_serializer(), id=menuItem)
+    if request.method in ['PUT', 'PATCH']:
+        if not is_manager(request):
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         serializer = MenuItemSerializer(item, data=request.data, partial=(request.method == 'PATCH'), context={'request': request})
         if serializer.is_valid():
@@ -53,20 +113,49 @@ def single_menu_item(request, menuItem):
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     elif request.method == 'DELETE':
-        if not request.user.groups.filter(name='Manager').exists():
+        if not is_manager(request):
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         item.delete()
         return Response({'message': 'Deleted'}, status=status.HTTP_200_OK)
 
+# ?q=<words>&limit=<n>: menu items ranked by how well their title and category match.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def menu_item_search(request):
+    try:
+        query, limit, selection, key = reads.search_params(request)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    def build():
+        ids = search.search(query, limit)
+        rows, data = reads.search_rows(ids, selection)
+        with instrumentation.serializing(request):
+            return reads.search_results(query, ids, rows, data)
+    etag = catalog.etag('search', key)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return set_validators(Response(catalog.menu_search(key, build), status=status.HTTP_200_OK), etag)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def catalog_cache_stats(request):
+    return Response(catalog.stats(), status=status.HTTP_200_OK)
+
+# Prometheus text exposition of the per-route request metrics.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def metrics(request):
+    return HttpResponse(instrumentation.registry.render(), content_type='text/plain; version=0.0.4')
+
 # Group Management
 @api_view(['GET', 'POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManager])
+@retry_on_lock
 def manager_users(request):
-    if not request.user.groups.filter(name='Manager').exists():
-        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     if request.method == 'GET':
-        managers = User.objects.filter(groups__name='Manager')
-        return Response({'managers': [user.username for user in managers]}, status=status.HTTP_200_OK)
+        managers = User.objects.filter(groups__name='Manager').values_list('username', flat=True)
+        return Response({'managers': list(managers)}, status=status.HTTP_200_OK)
     elif request.method == 'POST':
         username = request.data.get('username')
         user = get_object_or_404(User, username=username)
@@ -74,22 +163,20 @@ def manager_users(request):
         return Response({'message': f'{username} added to Manager'}, status=status.HTTP_201_CREATED)
 
 @api_view(['DELETE'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManager])
+@retry_on_lock
 def manager_user_remove(request, userId):
-    if not request.user.groups.filter(name='Manager').exists():
-        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     user = get_object_or_404(User, id=userId)
     Group.objects.get(name='Manager').user_set.remove(user)
     return Response({'message': f'User {userId} removed'}, status=status.HTTP_200_OK)
 
 @api_view(['GET', 'POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManager])
+@retry_on_lock
 def delivery_crew_users(request):
-    if not request.user.groups.filter(name='Manager').exists():
-        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     if request.method == 'GET':
-        crew = User.objects.filter(groups__name='Delivery crew')
-        return Response({'delivery_crew': [user.username for user in crew]}, status=status.HTTP_200_OK)
+        crew = User.objects.filter(groups__name='Delivery crew').values_list('username', flat=True)
+        return Response({'delivery_crew': list(crew)}, status=status.HTTP_200_OK)
     elif request.method == 'POST':
         username = request.data.get('username')
         user = get_object_or_404(User, username=username)
@@ -97,28 +184,49 @@ def delivery_crew_users(request):
         return Response({'message': f'{username} added to Delivery crew'}, status=status.HTTP_201_CREATED)
 
 @api_view(['DELETE'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManager])
+@retry_on_lock
 def delivery_crew_user_remove(request, userId):
-    if not request.user.groups.filter(name='Manager').exists():
-        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     user = get_object_or_404(User, id=userId)
     Group.objects.get(name='Delivery crew').user_set.remove(user)
     return Response({'message': f'User {userId} removed'}, status=status.HTTP_200_OK)
 
-# Cart
-@api_view(['GET', 'POST', 'DELETE'])
+# Cart. PATCH takes a list of {"menuitem_id": ..., "quantity": ...} and sets
+# those quantities (0 removes the item); it returns the cart and its total.
+@api_view(['GET', 'POST', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
+@idempotent
 def cart_items(request):
     if request.method == 'GET':
-        cart = Cart.objects.filter(user=request.user)
-        serializer = CartSerializer(cart, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        cart = reads.cart(request)
+        selection = fieldsets.from_params(request.query_params, CartSerializer)
+        etag = reads.cart_tag(request, cart.aggregate(**reads.CART_SUMMARY), catalog.get_version(), selection)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        serializer = CartSerializer(cart.for_serializer(selection), many=True, context={'request': request, 'selection': selection})
+        with instrumentation.serializing(request):
+            data = serializer.data
+        return set_validators(Response(data, status=status.HTTP_200_OK), etag)
     elif request.method == 'POST':
         serializer = CartSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(user=request.user)  # User auto-set hai serializer mein, context se validation
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    elif request.method == 'PATCH':
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, 'LITTLELEMON_BULK_MAX_ROWS', 1000)
+        if len(request.data) > limit:
+            return Response({'error': f'At most {limit} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            total = bulk.update_cart(request.user, request.data)
+        except bulk.BulkError as exc:
+            return Response({'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CartSerializer(Cart.objects.filter(user=request.user).for_serializer(), many=True, context={'request': request})
+        return Response({'items': serializer.data, 'total': f'{total:.2f}'}, status=status.HTTP_200_OK)
     elif request.method == 'DELETE':
         Cart.objects.filter(user=request.user).delete()
         return Response({'message': 'Cart cleared'}, status=status.HTTP_200_OK)
@@ -126,50 +234,67 @@ def cart_items(request):
 # Orders
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
+@idempotent
 def orders(request):
     if request.method == 'GET':
-        if request.user.groups.filter(name='Manager').exists():
-            orders = Order.objects.all()
-        elif request.user.groups.filter(name='Delivery crew').exists():
-            orders = Order.objects.filter(delivery_crew=request.user)
-        else:
-            orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator, rows, data = reads.order_list(request)
+        page = paginator.paginate_queryset(rows, request)
+        with instrumentation.serializing(request):
+            return paginator.get_paginated_response(data(page))
     elif request.method == 'POST':
-        if request.user.groups.filter(name='Manager').exists() or request.user.groups.filter(name='Delivery crew').exists():
+        if not is_customer(request):
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
-        cart_items = Cart.objects.filter(user=request.user)
-        if not cart_items:
+        try:
+            order = place_order(request.user)
+        except EmptyCartError:
             return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        total = sum(item.price for item in cart_items)
-        order = Order.objects.create(user=request.user, total=total, status=0)
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order, menuitem=item.menuitem, quantity=item.quantity,
-                unit_price=item.unit_price, price=item.price
-            )
-        cart_items.delete()
+        order = Order.objects.for_serializer().get(id=order.id)
         serializer = OrderSerializer(order, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+# ?output=ndjson|csv plus the filters accepted by the order list.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def orders_export(request):
+    output = request.query_params.get('output', 'ndjson')
+    if output not in exports.FORMATS:
+        return Response({'error': 'output must be ndjson or csv'}, status=status.HTTP_400_BAD_REQUEST)
+    orders = filter_orders(Order.objects.all(), request.query_params)
+    generate, content_type = exports.FORMATS[output]
+    response = StreamingHttpResponse(generate(orders), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+    return response
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
 def single_order(request, orderId):
-    order = get_object_or_404(Order, id=orderId)
     if request.method == 'GET':
-        if order.user != request.user and not request.user.groups.filter(name='Manager').exists():
+        header = reads.order_header(orderId).first()
+        if header is None:
+            raise Http404
+        if not reads.can_read_order(request, header):
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
-        serializer = OrderSerializer(order, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    elif request.method in ['PUT', 'PATCH']:
-        if request.user.groups.filter(name='Manager').exists():
+        selection = fieldsets.from_params(request.query_params, OrderSerializer)
+        etag = reads.order_tag(orderId, header, catalog.get_version(), selection)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        order = get_object_or_404(Order.objects.for_serializer(selection), id=orderId)
+        serializer = OrderSerializer(order, context={'request': request, 'selection': selection})
+        with instrumentation.serializing(request):
+            data = serializer.data
+        return set_validators(Response(data, status=status.HTTP_200_OK), etag)
+    order = get_object_or_404(Order.objects.for_serializer(), id=orderId)
+    if request.method in ['PUT', 'PATCH']:
+        if is_manager(request):
             serializer = OrderSerializer(order, data=request.data, partial=(request.method == 'PATCH'), context={'request': request})
             if serializer.is_valid():
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        elif request.user.groups.filter(name='Delivery crew').exists() and order.delivery_crew == request.user:
+        elif is_delivery_crew(request) and order.delivery_crew_id == request.user.id:
             serializer = OrderSerializer(order, data=request.data, partial=True, context={'request': request})
             if serializer.is_valid():
                 status_val = request.data.get('status')
@@ -180,7 +305,50 @@ def single_order(request, orderId):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     elif request.method == 'DELETE':
-        if not request.user.groups.filter(name='Manager').exists():
+        if not is_manager(request):
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         order.delete()
-        return Response({'message': 'Order deleted'}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({'message': 'Order deleted'}, status=status.HTTP_200_OK)
+
+# Reports (Manager Only). These read the rollup tables only, never Order/OrderItem.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def report_revenue_by_day(request):
+    rows = filter_sales(DailySales.objects.all(), request.query_params)
+    rows = rows.values('date').annotate(revenue=Sum('revenue'), quantity=Sum('quantity')).order_by('date')
+    with instrumentation.serializing(request):
+        data = RevenueByDaySerializer(rows, many=True).data
+    return Response(data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def report_top_items(request):
+    order_by = request.query_params.get('by', 'revenue')
+    if order_by not in ('revenue', 'quantity'):
+        return Response({'error': 'by must be revenue or quantity'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    rows = (
+        filter_sales(DailySales.objects.all(), request.query_params)
+        .values('menuitem_id', 'menuitem__title')
+        .annotate(revenue=Sum('revenue'), quantity=Sum('quantity'), order_count=Sum('order_count'))
+        .order_by('-' + order_by)[:limit]
+    )
+    with instrumentation.serializing(request):
+        data = TopItemSerializer(rows, many=True).data
+    return Response(data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+def report_crew_deliveries(request):
+    rows = (
+        filter_report_dates(DailyCrewDeliveries.objects.all(), request.query_params)
+        .values('delivery_crew_id', 'delivery_crew__username')
+        .annotate(delivered=Sum('delivered'))
+        .order_by('-delivered')
+    )
+    with instrumentation.serializing(request):
+        data = CrewDeliveriesSerializer(rows, many=True).data
+    return Response(data, status=status.HTTP_200_OK)